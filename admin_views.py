@@ -0,0 +1,266 @@
+"""Admin blueprint: dashboard, analytics, user roles and content moderation."""
+import os
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file, abort
+from flask_login import login_required, current_user
+from werkzeug.security import generate_password_hash
+
+import maintenance
+import moderation
+import profiler
+import server
+from background import runner
+from likes import likes
+from models import db, User, Blog, Product, ForumPost, ForumReply, ArchivedForumReply, Expert, Consultation, ModerationJob
+from pricing import pricing
+from responses import render_page
+from trending import trending
+
+bp = Blueprint('admin', __name__)
+
+MAX_REPORT_DAYS = 3650  # /admin/analytics?days=; far larger values overflow the date arithmetic
+
+
+# -------------------- ADMIN DASHBOARD --------------------
+@bp.route('/admin/dashboard')
+@login_required
+def admin_dashboard():
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    users = User.query.all()
+    experts = Expert.query.all()
+    consults = Consultation.query.order_by(Consultation.created_at.desc()).all()
+    blogs = Blog.query.all()
+    products = Product.query.all()
+    forums = ForumPost.query.all()
+
+    return render_page(
+        'admin_dashboard.html',
+        users=users,
+        experts=experts,
+        consults=consults,
+        blogs=blogs,
+        products=products,
+        forums=forums
+    )
+
+
+@bp.route('/admin/analytics')
+@login_required
+def admin_analytics():
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    import analytics  # pandas is only loaded when an admin opens this page
+
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_REPORT_DAYS)
+    analytics.refresh_summaries()
+    report = analytics.build_report(days=days)
+    return render_template('admin_analytics.html', report=report)
+
+
+@bp.route('/admin/server')
+@login_required
+def admin_server():
+    """Per-worker stats from the preforking server, plus this worker's caches and background jobs."""
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    compressor = current_app.extensions.get('compression')
+    fragments = current_app.extensions.get('fragment_cache')
+    admission = current_app.extensions.get('admission')
+    return jsonify({
+        'workers': server.worker_stats(),
+        'this_worker': {'pid': os.getpid(), 'pricing': pricing.stats(), 'likes': likes.stats(),
+                        'trending': trending.stats(),
+                        'compression': compressor.stats() if compressor else None,
+                        'fragments': fragments.stats() if fragments else None,
+                        'admission': admission.stats() if admission else None,
+                        'background': runner.stats(), 'maintenance': maintenance.stats()},
+    })
+
+
+@bp.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Request profiles written by profiler.py, newest first."""
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    profiles = profiler.list_profiles(current_app.config['PROFILE_DIR'])
+    return render_template('admin_profiles.html', profiles=profiles,
+                           sample_rate=current_app.config['PROFILE_SAMPLE_RATE'])
+
+
+@bp.route('/admin/profiles/<name>.folded')
+@login_required
+def admin_profile_download(name):
+    if current_user.role != 'admin':
+        abort(403)
+    path = profiler.profile_path(current_app.config['PROFILE_DIR'], name)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f'{name}.folded')
+
+
+# -------------------- ADMIN FUNCTIONS --------------------
+@bp.route('/admin/promote/<int:user_id>', methods=['POST'])
+@login_required
+def promote_user(user_id):
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    user = User.query.get_or_404(user_id)
+    user.role = 'expert'
+
+    if not Expert.query.filter_by(email=user.email).first():
+        new_expert = Expert(name=user.name, email=user.email, specialization='', is_verified=True)
+        db.session.add(new_expert)
+
+    db.session.commit()
+    flash(f'✅ {user.name} promoted to Expert.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+@bp.route('/admin/demote/<int:user_id>', methods=['POST'])
+@login_required
+def demote_user(user_id):
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    user = User.query.get_or_404(user_id)
+    user.role = 'farmer'
+
+    exp = Expert.query.filter_by(email=user.email).first()
+    if exp:
+        db.session.delete(exp)
+
+    db.session.commit()
+    flash(f'⚠️ {user.name} demoted to Farmer.', 'info')
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+@bp.route('/admin/delete/blog/<int:blog_id>', methods=['POST'])
+@login_required
+def admin_delete_blog(blog_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    Blog.query.get_or_404(blog_id)
+    moderation.delete_rows('blogs', [blog_id])
+    flash('🗑️ Blog deleted successfully.', 'success')
+    return redirect(request.referrer or url_for('admin.admin_dashboard'))
+
+
+@bp.route('/admin/delete/product/<int:product_id>', methods=['POST'])
+@login_required
+def admin_delete_product(product_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    Product.query.get_or_404(product_id)
+    moderation.delete_rows('products', [product_id])  # cart rows too
+    flash('🗑️ Product deleted successfully.', 'success')
+    return redirect(request.referrer or url_for('admin.admin_dashboard'))
+
+
+@bp.route('/admin/delete/forum/<int:post_id>', methods=['POST'])
+@login_required
+def admin_delete_forum(post_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    ForumPost.query.get_or_404(post_id)
+    moderation.delete_rows('threads', [post_id])  # replies and likes in set-based deletes
+    flash('🗑️ Forum post deleted successfully.', 'success')
+    return redirect(request.referrer or url_for('admin.admin_dashboard'))
+
+
+@bp.route('/admin/delete/reply/<int:reply_id>', methods=['POST'])
+@login_required
+def admin_delete_reply(reply_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    if db.session.get(ForumReply, reply_id) is None and db.session.get(ArchivedForumReply, reply_id) is None:
+        abort(404)
+    moderation.delete_rows('replies', [reply_id])
+    flash('🗑️ Reply deleted successfully.', 'success')
+    return redirect(request.referrer or url_for('admin.admin_dashboard'))
+
+
+# -------------------- BULK MODERATION --------------------
+@bp.route('/admin/moderation')
+@login_required
+def admin_moderation():
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    jobs = ModerationJob.query.order_by(ModerationJob.id.desc()).limit(20).all()
+    return render_template('admin_moderation.html', jobs=jobs, kinds=list(moderation.KINDS))
+
+
+@bp.route('/admin/moderation/delete', methods=['POST'])
+@login_required
+def admin_bulk_delete():
+    """Queue a bulk delete. Form or JSON: kind, plus ids and/or user_id, since, until (YYYY-MM-DD)."""
+    if current_user.role != 'admin':
+        if request.is_json:
+            return jsonify({'error': 'admin only'}), 403
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+
+    data = (request.get_json(silent=True) or {}) if request.is_json else request.form
+    try:
+        criteria = moderation.parse_criteria(ids=data.get('ids'), user_id=data.get('user_id'),
+                                             since=data.get('since'), until=data.get('until'))
+        job = moderation.queue(data.get('kind'), criteria, user_id=current_user.id)
+    except moderation.ModerationError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'⚠️ {e}', 'danger')
+        return redirect(url_for('admin.admin_moderation'))
+
+    if not current_app.config['BACKGROUND_TASKS']:  # nothing would pick it up
+        moderation.run_job(job, budget=None)
+    if request.is_json:
+        return jsonify({**moderation.job_status(job),
+                        'status_url': url_for('admin.admin_moderation_job', job_id=job.id)}), 202
+    flash(f'🧹 Deleting {job.total} {job.kind} in the background (job #{job.id}).', 'success')
+    return redirect(url_for('admin.admin_moderation'))
+
+
+@bp.route('/admin/moderation/jobs/<int:job_id>')
+@login_required
+def admin_moderation_job(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'admin only'}), 403
+    return jsonify(moderation.job_status(ModerationJob.query.get_or_404(job_id)))
+
+
+# -------------------- ADMIN SETUP --------------------
+@bp.route('/setup-admin')
+def setup_admin():
+    existing_admin = User.query.filter_by(email='syedasadkazmi41@gmail.com').first()
+    if existing_admin:
+        return "<h3>✅ Admin already exists: syedasadkazmi41@gmail.com</h3>"
+
+    admin = User(
+        name='Site Admin',
+        email='syedasadkazmi41@gmail.com',
+        password_hash=generate_password_hash('asad123'),
+        role='admin',
+        profession='Administrator',
+        expertise='System Management'
+    )
+    db.session.add(admin)
+    db.session.commit()
+    return "<h3>🎉 Admin created successfully!<br>Email: syedasadkazmi41@gmail.com<br>Password: asad123</h3>"
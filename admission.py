@@ -0,0 +1,233 @@
+"""
+Admission control for the expensive endpoints.
+
+/api/chat waits seconds on Gemini, /search scans the text columns and
+/order/place writes several tables. When they spike together they hold
+every thread of a worker, and cheap pages queue behind them. Each of them
+belongs to a class (CLASSES; ADMISSION_CLASSES overrides fields or adds
+classes). A request in a class is checked in this order:
+
+1. busy cap: requests running or queued, over all classes, stay below
+   ADMISSION_MAX_BUSY (by default SERVER_THREADS - 1, so one thread is
+   always left for cheap pages). A class of priority p stops
+   ADMISSION_RESERVE slots per level earlier (0 is the highest priority),
+   so chat is shed before search and search before checkout. A class's
+   threshold is never below its own `limit`, so an idle worker always
+   admits. Over the threshold gets 503.
+2. queue: at most `limit` requests of a class run at once, and up to
+   `queue` more wait. A full queue gets 503.
+3. rate: a token bucket per class and user (per IP when logged out,
+   which needs TRUSTED_PROXIES behind a load balancer so the IP is the
+   client's, not the balancer's), refilled at `rate` requests a second,
+   holding up to `burst` tokens.
+   An empty bucket gets 429. Requests shed by 1 or 2 don't use a token.
+4. wait: a queued request waits at most ADMISSION_QUEUE_TIMEOUT seconds
+   for a free slot, then gets 503 and its token back.
+
+init_app() refuses limits a class can't reach: `limit` + `queue` must fit
+under the class's threshold. Rejections are answered straight away with
+Retry-After. Everything is in memory and per worker process, so the
+limits multiply by SERVER_WORKERS. Counts per class and outcome are shown
+in /admin/server and metrics.ADMISSION.
+"""
+import math
+import threading
+import time
+
+from flask import current_app, g, jsonify, make_response, request
+from flask_login import current_user
+
+import metrics
+
+# sized for the default 4 threads (busy cap 3); raise them with ADMISSION_CLASSES on bigger workers
+CLASSES = {
+    'checkout': {'endpoints': ['main.checkout', 'main.place_order'], 'priority': 0, 'limit': 2, 'queue': 1,
+                 'rate': 1.0, 'burst': 5},
+    'search': {'endpoints': ['main.search'], 'priority': 1, 'limit': 1, 'queue': 1, 'rate': 2.0, 'burst': 10},
+    'chat': {'endpoints': ['chat.chat'], 'priority': 2, 'limit': 1, 'queue': 0, 'rate': 0.2, 'burst': 3},
+}
+OUTCOMES = ('admitted', 'queued', 'rate_limited', 'shed', 'queue_full', 'timeout')
+SHED_RETRY_AFTER = 2  # seconds a shed client is told to wait
+MAX_BUCKETS = 10000  # per class; full (idle) buckets are dropped beyond this
+MESSAGES = {429: 'Too many requests, please slow down.', 503: 'The server is busy, please try again shortly.'}
+
+
+# -------------------- LIMITS --------------------
+class TokenBuckets:
+    """One token bucket per client, all with the same rate and burst."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # client -> (tokens, refilled at)
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Take a token. Returns 0, or the seconds until the client's next token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, refilled = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - refilled) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[client] = (tokens - 1, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+            return 0
+
+    def refund(self, client):
+        """Give back the token of a request that was not served after all."""
+        with self._lock:
+            tokens, refilled = self._buckets.get(client, (self.burst - 1, time.monotonic()))
+            self._buckets[client] = (min(self.burst, tokens + 1), refilled)
+
+    def _prune(self, now):
+        for client, (tokens, refilled) in list(self._buckets.items()):
+            if tokens + (now - refilled) * self.rate >= self.burst:
+                del self._buckets[client]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionClass:
+    def __init__(self, name, endpoints, priority, limit, queue, rate, burst):
+        self.name = name
+        self.endpoints = endpoints
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.rate = rate
+        self.burst = burst
+        self.buckets = TokenBuckets(rate, burst) if rate else None
+        self.threshold = limit  # busy count from which the class is shed, set by Admission
+        self.running = 0
+        self.waiting = 0
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+
+
+class Admission:
+    """The classes of one app, and the busy count they share."""
+
+    def __init__(self, classes, max_busy, reserve=1, queue_timeout=2.0):
+        self.classes = {name: AdmissionClass(name, **spec) for name, spec in classes.items()}
+        self.by_endpoint = {endpoint: cls for cls in self.classes.values() for endpoint in cls.endpoints}
+        self.max_busy = max_busy
+        self.reserve = reserve
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        for cls in self.classes.values():
+            cls.threshold = max(max_busy - cls.priority * reserve, cls.limit)
+            if cls.limit < 1 or cls.limit + cls.queue > cls.threshold:
+                raise ValueError(
+                    f"admission class {cls.name!r}: limit {cls.limit} + queue {cls.queue} does not fit under its "
+                    f"busy threshold {cls.threshold} (ADMISSION_MAX_BUSY {max_busy} - priority {cls.priority} "
+                    f"x ADMISSION_RESERVE {reserve}); lower them or raise ADMISSION_MAX_BUSY")
+
+    def busy(self):
+        return sum(cls.running + cls.waiting for cls in self.classes.values())
+
+    def admit(self, cls, client):
+        """Returns None once the request may run (call release() after it), else (status, retry_after)."""
+        outcome, rejection = self._decide(cls, client)
+        with self._cond:
+            cls.counts[outcome] += 1
+        metrics.ADMISSION.inc(cls.name, outcome)
+        return rejection
+
+    def _decide(self, cls, client):
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            if self.busy() >= cls.threshold:
+                return 'shed', (503, SHED_RETRY_AFTER)
+            if cls.running >= cls.limit and cls.waiting >= cls.queue:
+                return 'queue_full', (503, SHED_RETRY_AFTER)
+            if cls.buckets is not None:
+                wait = cls.buckets.take(client)
+                if wait:
+                    return 'rate_limited', (429, math.ceil(wait))
+            if cls.running < cls.limit:
+                cls.running += 1
+                return 'admitted', None
+            cls.waiting += 1
+            try:
+                while cls.running >= cls.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if cls.buckets is not None:
+                            cls.buckets.refund(client)
+                        return 'timeout', (503, SHED_RETRY_AFTER)
+                    self._cond.wait(remaining)
+            finally:
+                cls.waiting -= 1
+            cls.running += 1
+            return 'queued', None
+
+    def release(self, cls):
+        with self._cond:
+            cls.running -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_busy': self.max_busy,
+                'busy': self.busy(),
+                'classes': {name: {
+                    'priority': cls.priority, 'threshold': cls.threshold, 'limit': cls.limit, 'queue': cls.queue,
+                    'rate': cls.rate,
+                    'burst': cls.burst, 'running': cls.running, 'waiting': cls.waiting,
+                    'clients': len(cls.buckets) if cls.buckets is not None else 0, **cls.counts,
+                } for name, cls in self.classes.items()},
+            }
+
+
+# -------------------- FLASK --------------------
+def _client():
+    if current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+def _rejected(status, retry_after):
+    if request.path.startswith('/api/') or request.is_json:
+        response = jsonify({'error': MESSAGES[status], 'retry_after': retry_after})
+    else:
+        response = make_response(f'⏳ {MESSAGES[status]}')
+        response.mimetype = 'text/plain'
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _before_request():
+    controller = current_app.extensions['admission']
+    cls = controller.by_endpoint.get(request.endpoint)
+    if cls is None:
+        return None
+    rejection = controller.admit(cls, _client())
+    if rejection is not None:
+        return _rejected(*rejection)
+    g.admission_class = cls
+    return None
+
+
+def _teardown_request(exc):
+    cls = g.pop('admission_class', None)
+    if cls is not None:
+        current_app.extensions['admission'].release(cls)
+
+
+def init_app(app):
+    """Register the admission hooks (unless ADMISSION is off). Call after metrics.init_app()."""
+    if not app.config['ADMISSION']:
+        return
+    classes = {name: dict(spec) for name, spec in CLASSES.items()}
+    for name, overrides in app.config['ADMISSION_CLASSES'].items():  # single fields, or whole new classes
+        classes[name] = dict(classes.get(name, {}), **overrides)
+    max_busy = app.config['ADMISSION_MAX_BUSY'] or max(app.config['SERVER_THREADS'] - 1, 1)
+    app.extensions['admission'] = Admission(classes, max_busy, app.config['ADMISSION_RESERVE'],
+                                            app.config['ADMISSION_QUEUE_TIMEOUT'])
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
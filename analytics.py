@@ -0,0 +1,280 @@
+"""
+Sales analytics for the admin panel.
+
+Order history is read in chunks of Order.id ranges into pandas frames,
+aggregated with vectorized operations and folded into the SalesDaily
+summary table. Only orders newer than the last processed Order.id are read
+on each refresh, so reports never have to scan Order/OrderItem again.
+
+Every order that isn't Failed counts as a sale, Pending ones included
+(the shop never moves an order on by itself). An order is folded in with
+the status it has at the time. A later change is logged by a trigger in
+OrderStatusChange, and the next refresh adds the order (it stopped being
+Failed) or subtracts it (it failed), so late settlements are reflected.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Order, OrderItem, OrderStatusChange, Product, SalesDaily, AnalyticsState
+
+CHECKPOINT_KEY = 'sales_last_order_id'
+CHUNK_ORDERS = 50000          # Order.id range read per chunk
+EXCLUDED_STATUSES = ('Failed',)
+SUMMARY_COLUMNS = ['units', 'revenue', 'gross_revenue', 'order_count']
+DISCOUNT_BANDS = [-np.inf, 0, 10, 25, np.inf]
+DISCOUNT_LABELS = ['No discount', '1-10%', '10-25%', '25%+']
+
+
+# -------------------- INCREMENTAL REFRESH --------------------
+def _items(*conditions):
+    """Order items (with their order's day and product facts) of the orders matching `conditions`."""
+    return (
+        select(
+            Order.id.label('order_id'),
+            Order.created_at,
+            OrderItem.product_id,
+            OrderItem.quantity,
+            OrderItem.price,
+            Product.price.label('list_price'),
+            Product.category,
+            Product.user_id.label('seller_id'),
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(*conditions)
+    )
+
+
+def _items_between(low_id, high_id):
+    """Order items of the counted orders with low_id < Order.id <= high_id."""
+    return _items(Order.id > low_id, Order.id <= high_id, Order.status.notin_(EXCLUDED_STATUSES))
+
+
+def aggregate_chunk(frame):
+    """Collapse raw order-item rows into (day, product_id) summary rows."""
+    if frame.empty:
+        return frame
+    quantity = frame['quantity'].fillna(1).to_numpy(dtype=np.int64)
+    price = frame['price'].to_numpy(dtype=np.float64)
+    list_price = frame['list_price'].fillna(frame['price']).to_numpy(dtype=np.float64)
+
+    frame = frame.assign(
+        day=pd.to_datetime(frame['created_at']).dt.date,
+        units=quantity,
+        revenue=quantity * price,
+        gross_revenue=quantity * list_price,
+    )
+    grouped = frame.groupby(['day', 'product_id'], sort=False).agg(
+        category=('category', 'first'),
+        seller_id=('seller_id', 'first'),
+        units=('units', 'sum'),
+        revenue=('revenue', 'sum'),
+        gross_revenue=('gross_revenue', 'sum'),
+        order_count=('order_id', 'nunique'),
+    )
+    return grouped.reset_index()
+
+
+UPSERT_SQL = """
+INSERT INTO sales_daily (day, product_id, category, seller_id, units, revenue, gross_revenue, order_count)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, product_id) DO UPDATE SET
+    units = units + excluded.units,
+    revenue = revenue + excluded.revenue,
+    gross_revenue = gross_revenue + excluded.gross_revenue,
+    order_count = order_count + excluded.order_count,
+    category = excluded.category,
+    seller_id = excluded.seller_id
+"""
+
+
+def _upsert(summary, sign=1):
+    """Add (sign=-1: subtract) a chunk's aggregates onto the existing SalesDaily rows (one executemany)."""
+    if summary.empty:
+        return
+    if sign != 1:
+        summary = summary.assign(**{column: summary[column] * sign for column in SUMMARY_COLUMNS})
+    columns = ['day', 'product_id', 'category', 'seller_id', 'units', 'revenue', 'gross_revenue', 'order_count']
+    summary = summary[columns].astype(object).where(summary[columns].notna(), None)
+    summary['day'] = summary['day'].map(date.isoformat)
+    db.session.connection().exec_driver_sql(UPSERT_SQL, list(summary.itertuples(index=False, name=None)))
+
+
+def _claim(low, high):
+    """Move the checkpoint from low to high, unless another refresh already has. Takes the write lock."""
+    claimed = db.session.execute(
+        update(AnalyticsState)
+        .where(AnalyticsState.key == CHECKPOINT_KEY, AnalyticsState.value == low)
+        .values(value=high)
+        .execution_options(synchronize_session=False)
+    )
+    return claimed.rowcount == 1
+
+
+def _counted(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def apply_status_changes():
+    """
+    Correct SalesDaily for summarized orders whose status changed since:
+    add the ones that became counted, subtract the ones that stopped.
+    The change rows are claimed with DELETE ... RETURNING, which takes the
+    write lock first, so concurrent refreshes never apply one twice.
+    Returns the number of orders added or subtracted.
+    """
+    summarized = select(AnalyticsState.value).where(AnalyticsState.key == CHECKPOINT_KEY).scalar_subquery()
+    changes = db.session.execute(
+        delete(OrderStatusChange)
+        .where(OrderStatusChange.order_id <= summarized)
+        .returning(OrderStatusChange.order_id, OrderStatusChange.old_status)
+    ).all()
+    status = dict(db.session.query(Order.id, Order.status).filter(
+        Order.id.in_([order_id for order_id, _ in changes])))
+    flipped = {1: [], -1: []}
+    for order_id, old_status in changes:
+        if order_id in status and _counted(old_status) != _counted(status[order_id]):
+            flipped[1 if _counted(status[order_id]) else -1].append(order_id)
+    for sign, order_ids in flipped.items():
+        if order_ids:
+            frame = pd.read_sql(_items(Order.id.in_(order_ids)), db.session.connection())
+            _upsert(aggregate_chunk(frame), sign)
+    db.session.commit()
+    return len(flipped[1]) + len(flipped[-1])
+
+
+def refresh_summaries(chunk_orders=CHUNK_ORDERS):
+    """
+    Fold every order placed since the last refresh into SalesDaily, after
+    applying status changes of the orders folded before (apply_status_changes).
+    Each chunk claims its Order.id range by moving the checkpoint with a
+    compare-and-set, in the same transaction as its upsert. Concurrent
+    refreshes (two admins loading the page) therefore never fold a range
+    twice, and an interrupted refresh resumes where it stopped. Returns the
+    number of orders processed by this call.
+    """
+    state = db.session.get(AnalyticsState, CHECKPOINT_KEY)
+    if state is None:
+        db.session.add(AnalyticsState(key=CHECKPOINT_KEY, value=0))
+        try:
+            db.session.commit()
+        except IntegrityError:  # created by a concurrent refresh
+            db.session.rollback()
+        state = db.session.get(AnalyticsState, CHECKPOINT_KEY)
+
+    start = state.value
+    last_order_id = db.session.query(func.max(Order.id)).scalar() or 0
+    db.session.commit()  # end the read, so a claim waits for the write lock instead of failing on a stale snapshot
+    apply_status_changes()
+    low = start
+    while low < last_order_id:
+        high = min(low + chunk_orders, last_order_id)
+        if not _claim(low, high):
+            db.session.rollback()  # another refresh is ahead of us and will fold the rest
+            break
+        # folded with their current status, so earlier changes of these orders are moot
+        db.session.execute(delete(OrderStatusChange).where(
+            OrderStatusChange.order_id > low, OrderStatusChange.order_id <= high))
+        frame = pd.read_sql(_items_between(low, high), db.session.connection())
+        _upsert(aggregate_chunk(frame))
+        db.session.commit()
+        low = high
+    return low - start
+
+
+# -------------------- REPORTS --------------------
+def _summary_frame(days=None):
+    stmt = select(SalesDaily.__table__)
+    if days:
+        stmt = stmt.where(SalesDaily.day >= date.today() - timedelta(days=days))
+    return pd.read_sql(stmt, db.session.connection())
+
+
+def revenue_by_day(frame):
+    if frame.empty:
+        return []
+    daily = frame.groupby('day', sort=True)[['revenue', 'units', 'order_count']].sum()
+    return daily.reset_index().to_dict('records')
+
+
+def revenue_by(frame, column, limit=20):
+    """Revenue rolled up by 'category' or 'seller_id', largest first."""
+    if frame.empty:
+        return []
+    rolled = frame.fillna({column: 'Uncategorized' if column == 'category' else 0})
+    rolled = rolled.groupby(column)[['revenue', 'units']].sum()
+    return rolled.nlargest(limit, 'revenue').reset_index().to_dict('records')
+
+
+def top_products(frame, limit=10):
+    if frame.empty:
+        return []
+    totals = frame.groupby('product_id')[['units', 'revenue']].sum().nlargest(limit, 'revenue')
+    names = dict(
+        db.session.query(Product.id, Product.name).filter(Product.id.in_(totals.index.tolist())).all()
+    )
+    totals['name'] = [names.get(pid, f'#{pid} (deleted)') for pid in totals.index]
+    return totals.reset_index().to_dict('records')
+
+
+def stock_turnover(frame, days, limit=10):
+    """Units sold vs. stock on hand: turnover ratio and days of cover left."""
+    if frame.empty:
+        return []
+    sold = frame.groupby('product_id')['units'].sum()
+    stock = pd.read_sql(
+        select(Product.id.label('product_id'), Product.name, Product.stock), db.session.connection()
+    ).set_index('product_id')
+    stock = stock.join(sold, how='inner')
+    on_hand = np.maximum(stock['stock'].to_numpy(dtype=np.float64), 0)
+    per_day = stock['units'].to_numpy(dtype=np.float64) / max(days, 1)
+    stock['turnover'] = stock['units'] / np.maximum(on_hand, 1)
+    stock['days_of_cover'] = np.where(per_day > 0, on_hand / np.where(per_day > 0, per_day, 1), np.inf)
+    return stock.nlargest(limit, 'turnover').reset_index().to_dict('records')
+
+
+def discount_effectiveness(frame):
+    """Units and revenue per product grouped by each product's current discount band."""
+    if frame.empty:
+        return []
+    sold = frame.groupby('product_id')[['units', 'revenue', 'gross_revenue']].sum()
+    discounts = pd.read_sql(
+        select(Product.id.label('product_id'), Product.discount), db.session.connection()
+    ).set_index('product_id')
+    discounts = discounts.join(sold, how='left').fillna(0)
+    discounts['band'] = pd.cut(discounts['discount'], DISCOUNT_BANDS, labels=DISCOUNT_LABELS)
+    bands = discounts.groupby('band', observed=False).agg(
+        products=('units', 'size'),
+        units=('units', 'sum'),
+        revenue=('revenue', 'sum'),
+        gross_revenue=('gross_revenue', 'sum'),
+    )
+    bands['units_per_product'] = bands['units'] / bands['products'].replace(0, np.nan)
+    bands['discount_given'] = bands['gross_revenue'] - bands['revenue']
+    return bands.fillna(0).reset_index().to_dict('records')
+
+
+def build_report(days=30):
+    """Everything /admin/analytics renders, computed from the summary table only."""
+    frame = _summary_frame(days)
+    by_seller = revenue_by(frame, 'seller_id')
+    sellers = dict(
+        db.session.query(User.id, User.name).filter(User.id.in_([row['seller_id'] for row in by_seller])).all()
+    )
+    for row in by_seller:
+        row['seller'] = sellers.get(row['seller_id'], f"#{row['seller_id']}")
+    return {
+        'days': days,
+        'total_revenue': float(frame['revenue'].sum()) if not frame.empty else 0.0,
+        'total_units': int(frame['units'].sum()) if not frame.empty else 0,
+        'by_day': revenue_by_day(frame),
+        'by_category': revenue_by(frame, 'category'),
+        'by_seller': by_seller,
+        'top_products': top_products(frame),
+        'turnover': stock_turnover(frame, days),
+        'discounts': discount_effectiveness(frame),
+    }
@@ -0,0 +1,253 @@
+"""
+Versioned JSON API for the mobile app (/api/v1), built for slow connections.
+
+Each resource is a change feed:
+
+    GET /api/v1/products?since=0            everything, oldest change first
+    GET /api/v1/products?since=<next>       only rows changed since the last call
+
+A response carries the changed rows (`items`), the ids deleted since
+(`deleted`), `next` to pass as `since` on the following call and `more`
+when another page is waiting. Changes come from the sync_change log kept by
+SQLite triggers (see models.SyncChange), so a feed is one indexed range scan
+joined to the resource table.
+
+`?fields=id,name,price` returns only those fields (id is always included)
+and only reads those columns; `?shape=rows` sends a field list plus value
+arrays instead of repeating the keys in every object; `?ids=1,2,3` limits
+the feed to given rows. Bodies are compact JSON (compressed by
+responses.Compressor). POST /api/v1/batch answers several feeds in one round trip.
+
+Tombstones older than `flask api-prune-tombstones --days N` are dropped; a
+client whose cursor predates the pruned ones gets 410 and must resync from
+since=0, replacing its local copy.
+"""
+import json
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import func
+
+from models import db, AnalyticsState, Blog, Expert, ForumPost, Product, SyncChange
+from pricing import final_price_expr
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+MAX_IDS = 500
+
+# resource -> (model, {field: column}); keys match models.SYNCED_TABLES
+RESOURCES = {
+    'products': (Product, {
+        'id': Product.id,
+        'name': Product.name,
+        'summary': Product.summary,
+        'description': Product.description,
+        'category': Product.category,
+        'price': Product.price,
+        'discount': Product.discount,
+        'final_price': final_price_expr(),
+        'stock': Product.stock,
+        'image': Product.image,
+        'seller_id': Product.user_id,
+        'created_at': Product.created_at,
+    }),
+    'blogs': (Blog, {
+        'id': Blog.id,
+        'title': Blog.title,
+        'summary': Blog.summary,
+        'content': Blog.content,
+        'image': Blog.image,
+        'author_id': Blog.user_id,
+        'created_at': Blog.created_at,
+    }),
+    'threads': (ForumPost, {
+        'id': ForumPost.id,
+        'title': ForumPost.title,
+        'summary': ForumPost.summary,
+        'content': ForumPost.content,
+        'image': ForumPost.image_filename,
+        'author_id': ForumPost.user_id,
+        'like_count': ForumPost.likes_count,
+        'created_at': ForumPost.created_at,
+    }),
+    # contact details stay behind login on the profile page
+    'experts': (Expert, {
+        'id': Expert.id,
+        'name': Expert.name,
+        'specialization': Expert.specialization,
+        'education': Expert.education,
+        'experience_years': Expert.experience_years,
+        'bio': Expert.bio,
+        'image': Expert.image_filename,
+        'is_verified': Expert.is_verified,
+        'created_at': Expert.created_at,
+    }),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+# -------------------- FEEDS --------------------
+def change_feed(resource, since=0, fields=None, limit=PAGE_SIZE, ids=None, shape='objects'):
+    """One page of a resource's changes after `since`, as a JSON-ready dict. Raises ApiError."""
+    if resource not in RESOURCES:
+        raise ApiError(f'unknown resource {resource!r}', 404)
+    model, columns = RESOURCES[resource]
+    names = _pick_fields(columns, fields)
+    if since < 0:
+        raise ApiError('since must be >= 0')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    if shape not in ('objects', 'rows'):
+        raise ApiError("shape must be 'objects' or 'rows'")
+    if since and since < tombstone_floor(resource):
+        raise ApiError('cursor expired, resync from since=0', 410)
+
+    query = (
+        db.session.query(SyncChange.seq, SyncChange.op, SyncChange.item_id, model.id,
+                         *[columns[name] for name in names])
+        .outerjoin(model, model.id == SyncChange.item_id)
+        .filter(SyncChange.kind == resource, SyncChange.seq > since)
+    )
+    if ids is not None:
+        query = query.filter(SyncChange.item_id.in_(ids))
+    rows = query.order_by(SyncChange.seq).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    items, deleted = [], []
+    for seq, op, item_id, row_id, *values in rows:
+        if op == 'delete' or row_id is None:
+            deleted.append(item_id)
+        elif shape == 'rows':
+            items.append([_plain(v) for v in values])
+        else:
+            items.append({name: _plain(v) for name, v in zip(names, values)})
+
+    page = {'items': items, 'deleted': deleted, 'next': rows[-1].seq if rows else since, 'more': more}
+    if shape == 'rows':
+        page['fields'] = names
+    return page
+
+
+def _pick_fields(columns, fields):
+    if not fields:
+        return list(columns)
+    if not all(isinstance(name, str) for name in fields):
+        raise ApiError('fields must be field names')
+    unknown = [name for name in fields if name not in columns]
+    if unknown:
+        raise ApiError(f"unknown field(s): {', '.join(unknown)}")
+    return ['id'] + [name for name in dict.fromkeys(fields) if name != 'id']
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def tombstone_floor(resource):
+    """Highest pruned tombstone seq; cursors below it may have missed deletes."""
+    state = db.session.get(AnalyticsState, f'sync_floor:{resource}')
+    return state.value if state else 0
+
+
+def prune_tombstones(days):
+    """Drop tombstones older than `days` and raise the resync floor. Returns how many were removed."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = 0
+    for resource in RESOURCES:
+        floor = db.session.query(func.max(SyncChange.seq)).filter(
+            SyncChange.kind == resource, SyncChange.op == 'delete', SyncChange.changed_at < cutoff
+        ).scalar()
+        if floor is None:
+            continue
+        removed += SyncChange.query.filter(
+            SyncChange.kind == resource, SyncChange.op == 'delete', SyncChange.seq <= floor
+        ).delete()
+        key = f'sync_floor:{resource}'
+        state = db.session.get(AnalyticsState, key) or AnalyticsState(key=key, value=0)
+        state.value = max(state.value, floor)
+        db.session.add(state)
+    db.session.commit()
+    return removed
+
+
+# -------------------- RESPONSES --------------------
+def compact_response(payload):
+    """Minified JSON; compression is left to responses.Compressor."""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def _int_list(value, name):
+    try:
+        return [int(part) for part in value.split(',') if part]
+    except ValueError:
+        raise ApiError(f'{name} must be comma-separated integers')
+
+
+def _feed_args(args):
+    """change_feed() keyword arguments from query-string args or a batch entry."""
+    def as_list(value, name, parse):
+        if value is None or isinstance(value, list):
+            return value
+        if not isinstance(value, str):
+            raise ApiError(f'{name} must be a list or a comma-separated string')
+        return parse(value, name)
+
+    try:
+        since = int(args.get('since', 0))
+        limit = int(args.get('limit', PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ApiError('since and limit must be integers')
+    ids = as_list(args.get('ids'), 'ids', _int_list)
+    if ids is not None and not all(type(i) is int for i in ids):
+        raise ApiError('ids must be integers')
+    if ids is not None and len(ids) > MAX_IDS:
+        raise ApiError(f'at most {MAX_IDS} ids per request')
+    return {
+        'since': since,
+        'limit': limit,
+        'fields': as_list(args.get('fields'), 'fields', lambda v, _: [f for f in v.split(',') if f]),
+        'ids': ids,
+        'shape': args.get('shape', 'objects'),
+    }
+
+
+# -------------------- ROUTES --------------------
+@bp.route('/<resource>')
+def feed(resource):
+    return compact_response(change_feed(resource, **_feed_args(request.args)))
+
+
+@bp.route('/batch', methods=['POST'])
+def batch():
+    """Several feeds in one round trip.
+
+    Body: {"products": {"since": 120, "fields": ["id", "stock"]}, "threads": {"since": 40}}.
+    Each resource gets its own page or {"error": ..., "status": ...}.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not body:
+        raise ApiError('expected a JSON object of {resource: {since, fields, ids, limit, shape}}')
+    results = {}
+    for resource, args in body.items():
+        try:
+            if not isinstance(args, dict):
+                raise ApiError('each entry must be an object')
+            results[resource] = change_feed(resource, **_feed_args(args))
+        except ApiError as e:
+            results[resource] = {'error': e.message, 'status': e.status}
+    return compact_response(results)
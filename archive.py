@@ -0,0 +1,189 @@
+"""
+Hot/cold archival of consultations, orders and forum replies.
+
+Old rows move from the hot tables into same-named tables in a second
+SQLite file, ATTACHed to every connection as schema `archive`
+(ARCHIVE_DATABASE; by default <main db>_archive.db next to the main
+database). Both files are on one connection, so each batch is a single
+transaction: INSERT INTO archive.x SELECT ... FROM x, then DELETE FROM x.
+
+What moves (ages from config, in days):
+
+- consultations: Resolved and untouched for ARCHIVE_CONSULTATION_DAYS
+- orders and their items: placed more than ARCHIVE_ORDER_DAYS ago, in one
+  of ARCHIVE_ORDER_STATUSES (Paid or Failed), and only once analytics
+  has summarized them, status changes included
+- forum replies: every reply of a thread with no new reply for
+  ARCHIVE_THREAD_DAYS (the thread itself stays in the forum)
+
+SQLite would hand out max(id) + 1 of the hot table as the next id, and
+that can be an archived id once the newest hot rows are gone. New hot rows
+therefore get max(id) + 1 over both tables, computed inside their INSERT
+(_floor_id). The copy is a plain INSERT, so a collision fails instead of
+overwriting an archived row.
+
+Reads fall back to the archive: find_consultation() and find_order() for
+the detail pages. Thread pages and reply counts read both reply tables.
+Archived rows are read-only.
+"""
+import os
+import time
+import weakref
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, select, union_all
+
+from models import (db, ARCHIVE_SCHEMA, AnalyticsState, ArchivedConsultation, ArchivedForumReply, ArchivedOrder,
+                    ArchivedOrderItem, Consultation, ForumReply, Order, OrderItem, OrderStatusChange)
+
+ARCHIVED = {Consultation: ArchivedConsultation, Order: ArchivedOrder, OrderItem: ArchivedOrderItem,
+            ForumReply: ArchivedForumReply}
+BATCH_SIZE = 500
+RUN_BUDGET = 10.0  # seconds of moving rows per background run
+SALES_CHECKPOINT_KEY = 'sales_last_order_id'  # analytics.CHECKPOINT_KEY, without importing pandas
+
+
+# -------------------- SETUP --------------------
+def archive_path(app, engine):
+    """ARCHIVE_DATABASE, or <main db>_archive.db beside the main database (in memory for in-memory ones)."""
+    if app.config['ARCHIVE_DATABASE']:
+        return app.config['ARCHIVE_DATABASE']
+    main = engine.url.database
+    if not main or main == ':memory:':
+        return ':memory:'
+    root, ext = os.path.splitext(main)
+    return f'{root}_archive{ext or ".db"}'
+
+
+def init_app(app):
+    """ATTACH the archive file to every new SQLite connection. Call right after db.init_app()."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    path = archive_path(app, engine)
+    app.extensions['archive_path'] = path
+    _attached.add(engine)
+
+    @event.listens_for(engine, 'connect')
+    def attach_archive(dbapi_connection, connection_record):
+        dbapi_connection.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+
+
+# -------------------- IDS --------------------
+_attached = weakref.WeakSet()  # engines with the archive ATTACHed
+
+
+def _next_id(model):
+    """max(id) + 1 over the hot and archive tables, as a subquery evaluated by the INSERT itself."""
+    ids = union_all(select(func.max(model.id).label('id')),
+                    select(func.max(ARCHIVED[model].id).label('id'))).subquery()
+    return select(func.coalesce(func.max(ids.c.id), 0) + 1).scalar_subquery()
+
+
+def _floor_id(mapper, connection, target):
+    if target.id is None and connection.engine in _attached:
+        target.id = _next_id(mapper.class_)
+
+
+for _model in ARCHIVED:
+    event.listen(_model, 'before_insert', _floor_id)
+
+
+# -------------------- MOVING --------------------
+def _move(model, archived_model, where):
+    """Copy the rows matching `where` into the archive and delete them from the hot table. Returns rows moved."""
+    hot, cold = model.__table__, archived_model.__table__
+    names = [column.name for column in hot.columns]
+    db.session.execute(cold.insert().from_select(
+        names, select(*[hot.c[name] for name in names]).where(where)))
+    return db.session.execute(hot.delete().where(where)).rowcount
+
+
+def _consultation_batch(config, limit):
+    cutoff = datetime.utcnow() - timedelta(days=config['ARCHIVE_CONSULTATION_DAYS'])
+    ids = [row[0] for row in db.session.query(Consultation.id).filter(
+        Consultation.status == 'Resolved',
+        func.coalesce(Consultation.updated_at, Consultation.created_at) < cutoff,
+    ).order_by(Consultation.id).limit(limit)]
+    if not ids:
+        return 0
+    return _move(Consultation, ArchivedConsultation, Consultation.id.in_(ids))
+
+
+def _order_batch(config, limit):
+    cutoff = datetime.utcnow() - timedelta(days=config['ARCHIVE_ORDER_DAYS'])
+    summarized = db.session.get(AnalyticsState, SALES_CHECKPOINT_KEY)
+    query = db.session.query(Order.id).filter(
+        Order.created_at < cutoff,
+        Order.id <= (summarized.value if summarized else 0),  # the sales summaries read hot orders only
+        Order.id.notin_(select(OrderStatusChange.order_id)),  # nor a status change analytics has yet to apply
+    )
+    if config['ARCHIVE_ORDER_STATUSES']:
+        query = query.filter(Order.status.in_(config['ARCHIVE_ORDER_STATUSES']))
+    ids = [row[0] for row in query.order_by(Order.id).limit(limit)]
+    if not ids:
+        return 0
+    _move(OrderItem, ArchivedOrderItem, OrderItem.order_id.in_(ids))
+    return _move(Order, ArchivedOrder, Order.id.in_(ids))
+
+
+def _reply_batch(config, limit):
+    """Replies of up to `limit` quiet threads (a thread's replies always move together)."""
+    cutoff = datetime.utcnow() - timedelta(days=config['ARCHIVE_THREAD_DAYS'])
+    post_ids = [row[0] for row in db.session.query(ForumReply.post_id)
+                .group_by(ForumReply.post_id)
+                .having(func.max(ForumReply.created_at) < cutoff)
+                .order_by(ForumReply.post_id).limit(limit)]
+    if not post_ids:
+        return 0
+    return _move(ForumReply, ArchivedForumReply, ForumReply.post_id.in_(post_ids))
+
+
+BATCHES = {
+    'consultations': _consultation_batch,
+    'orders': _order_batch,
+    'replies': _reply_batch,
+}
+
+
+def run(budget=RUN_BUDGET, batch_size=BATCH_SIZE):
+    """Move old rows in batches, one transaction each, for up to `budget` seconds (None = all).
+
+    Returns {kind: rows moved}.
+    """
+    started = time.monotonic()
+    config = current_app.config
+    moved = dict.fromkeys(BATCHES, 0)
+    for kind, batch in BATCHES.items():
+        while budget is None or time.monotonic() - started < budget:
+            count = batch(config, batch_size)
+            db.session.commit()
+            moved[kind] += count
+            if not count:
+                break
+    return moved
+
+
+def stats():
+    """Rows in the hot and archive tables."""
+    pairs = {'consultations': Consultation, 'orders': Order, 'replies': ForumReply}
+    return {kind: {'hot': db.session.query(func.count(model.id)).scalar(),
+                   'archived': db.session.query(func.count(ARCHIVED[model].id)).scalar()}
+            for kind, model in pairs.items()}
+
+
+# -------------------- READING --------------------
+def find_consultation(cid):
+    """The consultation, from the hot table or else the archive; None if neither has it."""
+    return db.session.get(Consultation, cid) or db.session.get(ArchivedConsultation, cid)
+
+
+def find_order(order_id):
+    """The order, from the hot table or else the archive; None if neither has it."""
+    return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+
+
+def is_archived(obj):
+    return isinstance(obj, (ArchivedConsultation, ArchivedOrder, ArchivedOrderItem, ArchivedForumReply))
@@ -0,0 +1,116 @@
+"""
+Periodic background jobs.
+
+Tasks are registered at import time and run on one daemon thread per
+process, each inside an app context. The thread is started lazily from the
+first request, so under a preforking server every worker starts its own
+after the fork rather than inheriting a dead thread from the parent.
+
+Most tasks should run once per deployment, not once per worker: those only
+run where BACKGROUND_PRIMARY is set (server.py sets it on one worker).
+Tasks registered with per_process=True, such as flushing a process's own
+in-memory state, run in every process.
+"""
+import os
+import threading
+import time
+
+TICK_SECONDS = 1.0
+
+
+class PeriodicTask:
+    def __init__(self, name, interval, func, per_process=False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.per_process = per_process
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = None
+        self.last_error = None
+
+    def __repr__(self):
+        return f"<PeriodicTask {self.name} every {self.interval}s>"
+
+
+class BackgroundRunner:
+    def __init__(self, tick=TICK_SECONDS):
+        self.tick = tick
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def register(self, name, interval, func, per_process=False):
+        """Run func() every interval seconds (first run one interval after start)."""
+        with self._lock:
+            self.tasks[name] = PeriodicTask(name, interval, func, per_process)
+
+    def start(self, app):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            now = time.monotonic()
+            for task in self.tasks.values():
+                task.next_run = now + task.interval
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, args=(app,), name='agrifarma-background', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_now(self, app, name):
+        """Run one task synchronously (used by CLI commands and tests)."""
+        self._run(app, self.tasks[name])
+
+    def _loop(self, app):
+        primary = app.config.get('BACKGROUND_PRIMARY', True)
+        while not self._stop.wait(self.tick):
+            now = time.monotonic()
+            for task in list(self.tasks.values()):
+                if (primary or task.per_process) and now >= task.next_run:
+                    self._run(app, task)
+                    task.next_run = time.monotonic() + task.interval
+
+    def _run(self, app, task):
+        from models import db
+
+        started = time.perf_counter()
+        with app.app_context():
+            try:
+                task.func()
+                task.last_error = None
+            except Exception as e:
+                db.session.rollback()
+                task.failures += 1
+                task.last_error = str(e)
+                app.logger.exception("Background task %s failed", task.name)
+            finally:
+                db.session.remove()
+        task.runs += 1
+        task.last_duration = time.perf_counter() - started
+
+    def stats(self):
+        return {
+            name: {
+                'interval': task.interval,
+                'per_process': task.per_process,
+                'runs': task.runs,
+                'failures': task.failures,
+                'last_duration': task.last_duration,
+                'last_error': task.last_error,
+            }
+            for name, task in self.tasks.items()
+        }
+
+
+runner = BackgroundRunner()
@@ -0,0 +1,135 @@
+"""
+Benchmark for analytics.refresh_summaries() / build_report() on a synthetic
+order history.
+
+    python benchmarks/bench_analytics.py --items 1000000
+
+Creates a throwaway SQLite database, bulk-loads products and orders with
+numpy-generated data, then times a full refresh, an incremental refresh
+after a batch of new orders, and report generation from the summary table.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import archive  # noqa: E402
+from models import db  # noqa: E402
+
+CATEGORIES = ['Seeds', 'Fertilizer', 'Pesticide', 'Tools', 'Irrigation', 'Feed', 'Machinery', None]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['ARCHIVE_DATABASE'] = None  # bench_archive.db beside it; the archive tables share the metadata
+    db.init_app(app)
+    archive.init_app(app)
+    return app
+
+
+def seed(path, n_items, n_products, n_users, first_order_id=1, rng=None):
+    """Bulk-insert orders with 1-6 items each until n_items rows exist. Returns last order id."""
+    rng = rng or np.random.default_rng(42)
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    if first_order_id == 1:
+        now = datetime.utcnow()
+        cur.executemany(
+            "INSERT INTO user (id, name, email, password_hash, role, join_date) VALUES (?, ?, ?, 'x', 'farmer', ?)",
+            [(i, f'User {i}', f'user{i}@example.com', now) for i in range(1, n_users + 1)],
+        )
+        prices = rng.uniform(50, 5000, n_products).round(2)
+        discounts = rng.choice([0, 0, 0, 5, 10, 15, 20, 30], n_products)
+        stock = rng.integers(0, 500, n_products)
+        sellers = rng.integers(1, n_users + 1, n_products)
+        cur.executemany(
+            "INSERT INTO product (id, name, description, price, discount, category, stock, user_id, created_at) "
+            "VALUES (?, ?, 'synthetic', ?, ?, ?, ?, ?, ?)",
+            [
+                (i + 1, f'Product {i + 1}', float(prices[i]), float(discounts[i]),
+                 CATEGORIES[i % len(CATEGORIES)], int(stock[i]), int(sellers[i]), now)
+                for i in range(n_products)
+            ],
+        )
+
+    sizes = rng.integers(1, 7, n_items // 3 + 1)
+    sizes = sizes[np.cumsum(sizes) <= n_items]
+    n_orders = len(sizes)
+    order_ids = np.arange(first_order_id, first_order_id + n_orders)
+    start = datetime.utcnow() - timedelta(days=365)
+    offsets = np.sort(rng.integers(0, 365 * 86400, n_orders))
+    statuses = rng.choice(['Pending', 'Paid', 'Paid', 'Paid', 'Failed'], n_orders)
+
+    item_order = np.repeat(order_ids, sizes)
+    item_product = rng.integers(1, n_products + 1, len(item_order))
+    item_qty = rng.integers(1, 10, len(item_order))
+    item_price = rng.uniform(40, 5000, len(item_order)).round(2)
+
+    cur.executemany(
+        "INSERT INTO \"order\" (id, user_id, total_amount, status, created_at) VALUES (?, ?, 0, ?, ?)",
+        (
+            (int(oid), int(oid % n_users) + 1, str(st), start + timedelta(seconds=int(off)))
+            for oid, st, off in zip(order_ids, statuses, offsets)
+        ),
+    )
+    cur.executemany(
+        "INSERT INTO order_item (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+        zip(item_order.tolist(), item_product.tolist(), item_qty.tolist(), item_price.tolist()),
+    )
+    conn.commit()
+    conn.close()
+    return int(order_ids[-1]) if n_orders else first_order_id - 1
+
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<32} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=1_000_000, help='order items to generate')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--increment', type=int, default=10_000, help='order items added before the incremental run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = make_app(path)
+        with app.app_context():
+            db.create_all()
+
+        rng = np.random.default_rng(42)
+        last_id, _ = timed(f'seed {args.items:,} items', lambda: seed(path, args.items, args.products, args.users, rng=rng))
+
+        with app.app_context():
+            processed, full = timed('full refresh', analytics.refresh_summaries)
+            print(f"  {processed:,} orders -> {processed / full:,.0f} orders/s")
+
+        seed(path, args.increment, args.products, args.users, first_order_id=last_id + 1, rng=rng)
+        with app.app_context():
+            processed, _ = timed('incremental refresh', analytics.refresh_summaries)
+            print(f"  {processed:,} new orders")
+            timed('build_report(30 days)', lambda: analytics.build_report(days=30))
+            timed('build_report(365 days)', lambda: analytics.build_report(days=365))
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
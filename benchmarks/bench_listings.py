@@ -0,0 +1,137 @@
+"""
+Benchmark for listing pages over tables with large posts.
+
+    python benchmarks/bench_listings.py --rows 2000 --text-kb 20
+
+Creates a throwaway SQLite database with blogs, products and forum threads
+whose bodies are --text-kb kilobytes each, then compares loading a listing
+the old way (full ORM objects, author and reply count lazy-loaded per card)
+with the listings.py projections. Reports median time, peak Python memory
+(tracemalloc) and SQL statements for each, plus p50 latency of the real
+/forum, /blog, /products and /home pages.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import listings  # noqa: E402
+from app import create_app  # noqa: E402
+from benchmarks.datagen import WORDS  # noqa: E402
+from models import db, Blog, ForumPost, ForumReply, Product, User  # noqa: E402
+
+
+def seed(rows, text_kb, users=200):
+    rng = random.Random(7)
+    words = max(text_kb * 1024 // 7, 1)
+    body = lambda: ' '.join(rng.choice(WORDS) for _ in range(words))  # noqa: E731
+    db.session.add_all(User(id=i, name=f'User {i}', email=f'u{i}@bench.local', password_hash='x')
+                       for i in range(1, users + 1))
+    for i in range(1, rows + 1):
+        author = rng.randint(1, users)
+        db.session.add(Blog(title=f'Blog {i}', content=body(), user_id=author))
+        db.session.add(Product(name=f'Product {i}', description=body(), price=100.0 + i, discount=i % 3 * 5,
+                               category=rng.choice(['Seeds', 'Tools', 'Feed']), user_id=author))
+        db.session.add(ForumPost(title=f'Thread {i}', content=body(), user_id=author))
+        if i % 200 == 0:
+            db.session.commit()
+    db.session.commit()
+    db.session.add_all(ForumReply(post_id=rng.randint(1, rows), user_id=rng.randint(1, users), content='Agreed.')
+                       for _ in range(rows * 3))
+    db.session.commit()
+
+
+# (name, old way, listing projection); each builds what the listing card renders
+CASES = [
+    ('forum',
+     lambda: [(p.title, p.content[:150], p.user.name if p.user else None, p.reply_count(), p.likes_count)
+              for p in ForumPost.query.order_by(ForumPost.created_at.desc()).all()],
+     lambda: [(p.title, p.summary, p.user.name if p.user else None, p.reply_count(), p.likes_count)
+              for p in listings.threads().order_by(ForumPost.created_at.desc()).all()]),
+    ('blog',
+     lambda: [(b.title, b.content[:120], b.user.name if b.user else None)
+              for b in Blog.query.order_by(Blog.created_at.desc()).all()],
+     lambda: [(b.title, b.summary, b.user.name if b.user else None)
+              for b in listings.blogs().order_by(Blog.created_at.desc()).all()]),
+    ('products',
+     lambda: [(p.name, p.description[:80], p.price, p.user.name if p.user else None)
+              for p in Product.query.order_by(Product.created_at.desc()).all()],
+     lambda: [(p.name, p.summary, p.price, p.user.name if p.user else None)
+              for p in listings.products().order_by(Product.created_at.desc()).all()]),
+]
+
+PAGES = ['/forum', '/blog', '/products', '/home']
+
+
+def measure(app, fn, runs):
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    times = []
+    for _ in range(runs):
+        with app.app_context():
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+            db.session.remove()
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        event.remove(db.engine, 'before_cursor_execute', count)
+        db.session.remove()
+    return statistics.median(times) * 1000, peak / 2**20, len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=2000, help='blogs, products and threads each')
+    parser.add_argument('--text-kb', type=int, default=20, help='size of each body')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                          'BACKGROUND_TASKS': False})
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            seed(args.rows, args.text_kb)
+            print(f"Seeded {args.rows:,} blogs/products/threads of {args.text_kb} KB in "
+                  f"{time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'listing':<10} {'mode':<9} {'median ms':>10} {'peak MB':>9} {'queries':>8}")
+        for name, old, new in CASES:
+            for mode, fn in (('full', old), ('listing', new)):
+                ms, mb, queries = measure(app, fn, args.runs)
+                print(f"{name:<10} {mode:<9} {ms:10.1f} {mb:9.1f} {queries:8}")
+
+        print(f"\n{'page':<10} {'p50 ms':>10}")
+        client = app.test_client()
+        for path in PAGES:
+            times = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                assert client.get(path).status_code == 200, path
+                times.append(time.perf_counter() - started)
+            print(f"{path:<10} {statistics.median(times) * 1000:10.1f}")
+
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Queue simulation for routing.route_batch().
+
+    python benchmarks/bench_routing.py --experts 200 --arrivals 40 --ticks 2000
+
+Consultations arrive each tick (Poisson), the router runs every
+--route-every ticks on up to --batch of the oldest unassigned ones, and each
+expert resolves its pending queue at a random service rate. Reports the wait
+from filing to assignment and to resolution, per-batch routing cost and
+expert load spread, for keyword+heap routing against a round-robin baseline.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing  # noqa: E402
+
+TOPICS = {
+    'Soil Science': ['soil', 'ph', 'salinity', 'compost', 'nitrogen', 'erosion'],
+    'Plant Pathology': ['rust', 'blight', 'fungus', 'wilt', 'leaves', 'spots'],
+    'Entomology': ['aphid', 'locust', 'bollworm', 'pest', 'insects', 'larvae'],
+    'Irrigation': ['water', 'drip', 'canal', 'tubewell', 'drainage', 'sprinkler'],
+    'Livestock': ['cattle', 'buffalo', 'milk', 'fodder', 'vaccine', 'poultry'],
+    'Horticulture': ['mango', 'citrus', 'orchard', 'pruning', 'grafting', 'tomato'],
+}
+
+
+def round_robin(pending, experts, loads, max_load=routing.MAX_PENDING_PER_EXPERT):
+    """Baseline: ignore specialization, rotate through experts with spare capacity."""
+    ids = [expert_id for expert_id, _ in experts]
+    loads = dict(loads)
+    out = []
+    start = round_robin.cursor
+    for consultation_id, _ in pending:
+        for step in range(len(ids)):
+            expert_id = ids[(start + step) % len(ids)]
+            if loads.get(expert_id, 0) < max_load:
+                loads[expert_id] = loads.get(expert_id, 0) + 1
+                out.append((consultation_id, expert_id))
+                start = (start + step + 1) % len(ids)
+                break
+        else:
+            break
+    round_robin.cursor = start
+    return out
+
+
+round_robin.cursor = 0
+
+
+def simulate(policy, args, seed=7):
+    rng = np.random.default_rng(seed)
+    topics = list(TOPICS)
+    expert_topics = rng.integers(0, len(topics), args.experts)
+    # specializations read like "Plant Pathology: rust, wilt, spots"
+    experts = [
+        (i, f"{topics[t]}: {', '.join(rng.choice(TOPICS[topics[t]], 3, replace=False))}")
+        for i, t in enumerate(expert_topics)
+    ]
+    expert_topic = dict(enumerate(expert_topics))
+    service = rng.uniform(0.05, 0.4, args.experts)  # resolutions per tick
+
+    queue = deque()  # (cid, problem), oldest first
+    filed = {}
+    topic_of = {}
+    assigned_queues = {i: deque() for i in range(args.experts)}
+    loads = {i: 0 for i in range(args.experts)}
+    wait_assign, wait_resolve, batch_cost, off_topic = [], [], [], 0
+    next_id = 0
+
+    for tick in range(args.ticks):
+        for _ in range(rng.poisson(args.arrivals)):
+            t = rng.integers(0, len(topics))
+            words = rng.choice(TOPICS[topics[t]], 3)
+            problem = f"my crop has {' and '.join(words)} issues"
+            queue.append((next_id, problem))
+            filed[next_id] = tick
+            topic_of[next_id] = t
+            next_id += 1
+
+        if tick % args.route_every == 0 and queue:
+            batch = [queue[i] for i in range(min(args.batch, len(queue)))]
+            started = time.perf_counter()
+            assignments = policy(batch, experts, loads)
+            batch_cost.append(time.perf_counter() - started)
+            done = {cid for cid, _ in assignments}
+            queue = deque(item for item in queue if item[0] not in done)
+            for cid, expert_id in assignments:
+                loads[expert_id] += 1
+                assigned_queues[expert_id].append(cid)
+                wait_assign.append(tick - filed[cid])
+                off_topic += expert_topic[expert_id] != topic_of[cid]
+
+        for expert_id, pending in assigned_queues.items():
+            if pending and rng.random() < service[expert_id]:
+                cid = pending.popleft()
+                loads[expert_id] -= 1
+                # an off-topic expert takes twice as long (modelled as a requeue on their own list)
+                if expert_topic[expert_id] != topic_of[cid] and rng.random() < 0.5:
+                    pending.append(cid)
+                    loads[expert_id] += 1
+                    continue
+                wait_resolve.append(tick - filed[cid])
+
+    return {
+        'filed': next_id,
+        'unassigned': len(queue),
+        'assign': np.array(wait_assign or [0]),
+        'resolve': np.array(wait_resolve or [0]),
+        'batch_ms': np.array(batch_cost or [0]) * 1000,
+        'off_topic': off_topic / max(len(wait_assign), 1),
+        'load_std': float(np.std(list(loads.values()))),
+    }
+
+
+def report(name, r):
+    pct = lambda a: ' / '.join(f"{np.percentile(a, p):6.1f}" for p in (50, 95, 99))  # noqa: E731
+    print(f"\n{name}")
+    print(f"  filed {r['filed']:,}, still unassigned {r['unassigned']:,}, off-topic {r['off_topic']:.1%}")
+    print(f"  wait to assignment (ticks) p50/p95/p99: {pct(r['assign'])}")
+    print(f"  wait to resolution (ticks) p50/p95/p99: {pct(r['resolve'])}")
+    print(f"  routing cost per batch (ms) p50/p95/p99: {pct(r['batch_ms'])}")
+    print(f"  final pending-per-expert std dev: {r['load_std']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--experts', type=int, default=200)
+    parser.add_argument('--arrivals', type=float, default=30, help='mean consultations filed per tick')
+    parser.add_argument('--ticks', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=routing.BATCH_SIZE)
+    parser.add_argument('--route-every', type=int, default=1, help='ticks between routing runs')
+    args = parser.parse_args()
+
+    report('keyword match + least-loaded heap', simulate(routing.route_batch, args))
+    report('round-robin baseline', simulate(round_robin, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Cold-start benchmark for web and CLI entry points.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --save main
+    python benchmarks/bench_startup.py --compare main
+
+Each scenario runs in a fresh interpreter with `python -X importtime`.
+Reports median wall time, total import time, the slowest top-level imports,
+and whether heavy optional dependencies (google.genai, pandas, alembic) were
+loaded on that path.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+HEAVY = ('google.genai', 'pandas', 'alembic')
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+SCENARIOS = {
+    'web': [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+    'cli_help': [sys.executable, '-X', 'importtime', '-m', 'flask', '--app', 'app', '--help'],
+    'cli_db_init': [sys.executable, '-X', 'importtime', '-m', 'flask', '--app', 'app', 'db-init'],
+}
+
+
+def parse_importtime(stderr):
+    """Return (total self-time us, {top-level module: cumulative us}, set of all modules)."""
+    total, top, modules = 0, {}, set()
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total += int(self_us)
+        modules.add(name)
+        if len(indent) == 1:
+            top[name] = top.get(name, 0) + int(cumulative_us)
+    return total, top, modules
+
+
+def run_scenario(name, command, runs):
+    walls, totals, tops, modules = [], [], [], set()
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+                       PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+            started = time.perf_counter()
+            proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+            walls.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            raise SystemExit(f"{name} failed:\n{proc.stderr[-2000:]}")
+        total, top, mods = parse_importtime(proc.stderr)
+        totals.append(total)
+        tops.append(top)
+        modules |= mods
+
+    slowest = {}
+    for top in tops:
+        for module, us in top.items():
+            slowest.setdefault(module, []).append(us)
+    slowest = sorted(((statistics.median(v) / 1000, m) for m, v in slowest.items()), reverse=True)[:8]
+    return {
+        'wall_ms': statistics.median(walls) * 1000,
+        'import_ms': statistics.median(totals) / 1000,
+        'slowest_imports': [[module, round(ms, 1)] for ms, module in slowest],
+        'heavy_loaded': sorted(h for h in HEAVY if any(m == h or m.startswith(h + '.') for m in modules)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--only', nargs='*', choices=list(SCENARIOS))
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/baselines/startup-NAME.json')
+    parser.add_argument('--compare', metavar='NAME')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    for name, command in SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        r = results[name] = run_scenario(name, command, args.runs)
+        print(f"\n{name}: wall {r['wall_ms']:.0f} ms, imports {r['import_ms']:.0f} ms, "
+              f"heavy deps loaded: {', '.join(r['heavy_loaded']) or 'none'}")
+        for module, ms in r['slowest_imports']:
+            print(f"    {ms:8.1f} ms  {module}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(os.path.join(BASELINE_DIR, f'startup-{args.save}.json'), 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f'startup-{args.compare}.json')) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with '{args.compare}':")
+        for name, r in results.items():
+            if name in baseline:
+                base = baseline[name]
+                print(f"  {name:<12} wall {r['wall_ms'] - base['wall_ms']:+7.0f} ms"
+                      f"  imports {r['import_ms'] - base['import_ms']:+7.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Time to first byte and bytes on the wire for the big HTML pages.
+
+    python benchmarks/bench_ttfb.py --scale small --runs 5
+
+Seeds a throwaway database with benchmarks/datagen.py and serves the app
+over HTTP twice, once rendering pages in one piece and once with
+STREAM_TEMPLATES on. Each page is fetched with a raw socket for every
+Accept-Encoding the app can produce. Reported per page, mode and encoding:
+p50 time to the first response byte, p50 time to the last byte, and the
+bytes received (headers and chunk framing included).
+"""
+import argparse
+import http.client
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from benchmarks.datagen import ADMIN_EMAIL, BENCH_PASSWORD, SCALES, seed  # noqa: E402
+from models import db  # noqa: E402
+
+PAGES = [('/forum', False), ('/products', False), ('/blog', False), ('/admin/dashboard', True)]
+
+
+def fetch(port, path, encoding, cookie=None):
+    """(seconds to first byte, seconds to last byte, bytes received) for one GET."""
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost", f"Accept-Encoding: {encoding}", "Connection: close"]
+    if cookie:
+        lines.append(f"Cookie: {cookie}")
+    request = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        started = time.perf_counter()
+        sock.sendall(request)
+        first = None
+        received = 0
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            if first is None:
+                first = time.perf_counter() - started
+            received += len(data)
+        return first, time.perf_counter() - started, received
+
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    body = urllib.parse.urlencode({'email': ADMIN_EMAIL, 'password': BENCH_PASSWORD})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def serve(app):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log lines in the table
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        setup = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'BACKGROUND_TASKS': False})
+        with setup.app_context():
+            db.create_all()
+            seed(**SCALES[args.scale])
+            db.engine.dispose()
+
+        print(f"{'page':<18} {'mode':<9} {'encoding':<9} {'ttfb ms':>9} {'total ms':>9} {'wire KB':>9}")
+        for mode, stream in (('buffered', False), ('streamed', True)):
+            app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'BACKGROUND_TASKS': False, 'STREAM_TEMPLATES': stream})
+            compressor = app.extensions.get('compression')
+            encodings = ['identity', 'gzip'] + (['br'] if compressor and compressor.brotli else [])
+            server = serve(app)
+            port = server.server_port
+            cookie = login(port)
+            for path, needs_login in PAGES:
+                fetch(port, path, 'identity', cookie if needs_login else None)  # warm up
+                for encoding in encodings:
+                    runs = [fetch(port, path, encoding, cookie if needs_login else None) for _ in range(args.runs)]
+                    ttfb = statistics.median(r[0] for r in runs) * 1000
+                    total = statistics.median(r[1] for r in runs) * 1000
+                    print(f"{path:<18} {mode:<9} {encoding:<9} {ttfb:9.1f} {total:9.1f} {runs[0][2] / 1024:9.1f}")
+            server.shutdown()
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
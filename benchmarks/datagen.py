@@ -0,0 +1,149 @@
+"""
+Synthetic data for benchmarks, inserted through the app's models.
+
+    from benchmarks.datagen import seed, SCALES
+    seed(**SCALES['small'])
+
+Every generated user has the password BENCH_PASSWORD. User 1 is an admin,
+users 2..n are farmers, and every 20th farmer also has a verified Expert
+profile. Generation is deterministic for a given random seed.
+"""
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import likes as like_service
+from models import db, User, Blog, Product, ForumPost, ForumReply, Like, Expert, Consultation, Cart, Order, OrderItem
+
+BENCH_PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'admin@bench.local'
+BATCH = 2000
+
+SCALES = {
+    'small': dict(users=200, products=500, posts=500, replies=3000, likes=5000, orders=1000, blogs=200),
+    'medium': dict(users=2000, products=5000, posts=5000, replies=50000, likes=100000, orders=20000, blogs=2000),
+    'large': dict(users=10000, products=20000, posts=20000, replies=300000, likes=600000, orders=100000, blogs=10000),
+}
+
+WORDS = (
+    'wheat rice maize cotton sugarcane mango citrus potato tomato onion soil water drip canal fertilizer urea '
+    'compost seed pesticide rust blight aphid locust harvest tractor sprayer yield irrigation organic dairy '
+    'cattle fodder poultry greenhouse market price weather rain drought frost nursery pruning'
+).split()
+CATEGORIES = ['Seeds', 'Fertilizer', 'Pesticide', 'Tools', 'Irrigation', 'Feed', 'Machinery']
+SPECIALIZATIONS = ['Soil Science', 'Plant Pathology', 'Entomology', 'Irrigation', 'Livestock', 'Horticulture']
+
+
+def _text(rng, n_words):
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + '.'
+
+
+def _add_in_batches(objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= BATCH:
+            db.session.add_all(batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.add_all(batch)
+        db.session.commit()
+
+
+def seed(users, products, posts, replies, likes, orders, blogs, random_seed=1):
+    """Populate the current app's database. Must run inside an app context on an empty schema."""
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    ago = lambda: now - timedelta(seconds=rng.randint(0, 180 * 86400))  # noqa: E731
+    password_hash = generate_password_hash(BENCH_PASSWORD)  # hashed once, it's deliberately slow
+
+    def gen_users():
+        yield User(id=1, name='Bench Admin', email=ADMIN_EMAIL, password_hash=password_hash, role='admin')
+        for i in range(2, users + 1):
+            yield User(id=i, name=f'Farmer {i}', email=f'farmer{i}@bench.local', password_hash=password_hash,
+                       role='expert' if i % 20 == 0 else 'farmer', join_date=ago())
+
+    def gen_experts():
+        for i in range(20, users + 1, 20):
+            yield Expert(name=f'Farmer {i}', email=f'farmer{i}@bench.local', is_verified=True,
+                         specialization=rng.choice(SPECIALIZATIONS), experience_years=rng.randint(0, 30),
+                         bio=_text(rng, 40))
+
+    def gen_products():
+        for i in range(1, products + 1):
+            yield Product(id=i, name=f'{rng.choice(WORDS).title()} {rng.choice(CATEGORIES)} {i}',
+                          description=_text(rng, 80), price=round(rng.uniform(50, 5000), 2),
+                          discount=rng.choice([0, 0, 0, 5, 10, 20]), category=rng.choice(CATEGORIES),
+                          stock=rng.randint(10_000, 100_000), user_id=rng.randint(2, users), created_at=ago())
+
+    def gen_blogs():
+        for i in range(1, blogs + 1):
+            yield Blog(title=_text(rng, 6), content=_text(rng, 300), user_id=rng.randint(2, users), created_at=ago())
+
+    def gen_posts():
+        for i in range(1, posts + 1):
+            yield ForumPost(id=i, title=_text(rng, 8), content=_text(rng, 120), user_id=rng.randint(2, users),
+                            created_at=ago())
+
+    def gen_replies():
+        # skewed so a few threads are very popular
+        for i in range(1, replies + 1):
+            post_id = min(int(rng.paretovariate(1.2)), posts)
+            yield ForumReply(id=i, content=_text(rng, 30), user_id=rng.randint(2, users), post_id=post_id,
+                             created_at=ago())
+
+    def gen_likes():
+        seen = set()
+        for _ in range(likes):
+            user_id = rng.randint(2, users)
+            if rng.random() < 0.5:
+                key = (user_id, 'p', min(int(rng.paretovariate(1.2)), posts))
+            else:
+                key = (user_id, 'r', rng.randint(1, replies)) if replies else None
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            if key[1] == 'p':
+                yield Like(user_id=user_id, post_id=key[2], created_at=ago())
+            else:
+                yield Like(user_id=user_id, reply_id=key[2], created_at=ago())
+
+    def gen_orders():
+        item_id = 0
+        for i in range(1, orders + 1):
+            order = Order(id=i, user_id=rng.randint(2, users), total_amount=0.0,
+                          status=rng.choice(['Pending', 'Paid', 'Paid']), created_at=ago())
+            yield order
+            for _ in range(rng.randint(1, 5)):
+                item_id += 1
+                qty = rng.randint(1, 5)
+                price = round(rng.uniform(50, 5000), 2)
+                order.total_amount += qty * price
+                yield OrderItem(id=item_id, order_id=i, product_id=rng.randint(1, products), quantity=qty, price=price)
+
+    def gen_consultations():
+        for _ in range(users // 2):
+            yield Consultation(farmer_name='Farmer', farmer_email=f'farmer{rng.randint(2, users)}@bench.local',
+                               problem=_text(rng, 25), status=rng.choice(['Pending', 'Resolved']), created_at=ago())
+
+    for generator in (gen_users, gen_experts, gen_products, gen_blogs, gen_posts, gen_replies, gen_likes,
+                      gen_orders, gen_consultations):
+        _add_in_batches(generator())
+    like_service.likes.recount()  # likes were inserted directly, bring the likes_count counters in line
+
+    return {
+        'users': User.query.count(),
+        'products': Product.query.count(),
+        'posts': ForumPost.query.count(),
+        'replies': ForumReply.query.count(),
+        'likes': Like.query.count(),
+        'orders': Order.query.count(),
+        'carts': Cart.query.count(),
+    }
+
+
+def sample_words():
+    """Search terms that exist in generated text."""
+    return list(WORDS)
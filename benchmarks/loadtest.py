@@ -0,0 +1,452 @@
+"""
+Load test for the Flask app.
+
+    python benchmarks/loadtest.py --scale small --requests 200
+    python benchmarks/loadtest.py --mode wsgi --threads 8 --save-baseline main
+    python benchmarks/loadtest.py --mode wsgi --threads 8 --compare main
+    python benchmarks/loadtest.py --overload --server-threads 8 --duration 10
+
+Seeds a throwaway SQLite database with benchmarks/datagen.py, then drives
+the key routes either through Flask's test client (--mode client) or over
+HTTP against a threaded WSGI server (--mode wsgi) with --threads concurrent
+clients. Reports p50/p95/p99 latency, SQL queries per request and process
+RSS per scenario. Results can be saved as a named baseline under
+benchmarks/baselines/ and later compared against it. The scenarios run with
+admission control off (admission.py), since they measure the routes and
+not the limits.
+
+--overload checks admission control instead. Behind server.py's fixed
+thread pool, --spike-threads clients per expensive route hammer /api/chat
+(with a stand-in Gemini client that answers after --chat-latency seconds),
+/search and /order/place. Meanwhile two clients time cheap pages. This
+runs three times: idle, overloaded with admission off, and overloaded with
+it on. Spike clients honour Retry-After.
+"""
+import argparse
+import collections
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+QUERY_HEADER = 'X-Bench-Queries'
+
+
+# -------------------- SCENARIOS --------------------
+# (name, role, method, path(rng, ctx), setup(client, rng, ctx) run untimed before each request and
+# returning the POST form, or None for the default)
+def _word(rng, ctx):
+    return rng.choice(ctx['words'])
+
+
+def _prepare_cart(client, rng, ctx):
+    """Add a product and open checkout. Returns the order form, with the snapshot token checkout handed out."""
+    client.request('POST', f"/cart/add/{rng.randint(1, ctx['products'])}", {'quantity': '1'})
+    client.request('GET', '/checkout')
+    token = re.search(r'name="snapshot" value="(\w*)"', client.text)
+    return {'snapshot': token.group(1) if token else ''}
+
+
+SCENARIOS = [
+    ('forum', 'anon', 'GET', lambda rng, ctx: '/forum', None),
+    ('thread', 'anon', 'GET', lambda rng, ctx: f"/forum/{min(int(rng.paretovariate(1.2)), ctx['posts'])}", None),
+    ('trending', 'anon', 'GET', lambda rng, ctx: '/trending', None),
+    ('api_sync', 'anon', 'GET',
+     lambda rng, ctx: f"/api/v1/products?since={rng.randint(0, ctx['products'])}&fields=name,final_price,stock", None),
+    ('products_search', 'anon', 'GET', lambda rng, ctx: f"/products?q={_word(rng, ctx)}", None),
+    ('search', 'anon', 'GET', lambda rng, ctx: f"/search?q={_word(rng, ctx)}", None),
+    ('cart_add', 'farmer', 'POST', lambda rng, ctx: f"/cart/add/{rng.randint(1, ctx['products'])}", None),
+    ('like_toggle', 'farmer', 'POST', lambda rng, ctx: f"/like/post/{min(int(rng.paretovariate(1.2)), ctx['posts'])}", None),
+    ('order_place', 'farmer', 'POST', lambda rng, ctx: '/order/place', _prepare_cart),
+    ('admin_dashboard', 'admin', 'GET', lambda rng, ctx: '/admin/dashboard', None),
+]
+
+
+# -------------------- CLIENTS --------------------
+class TestClient:
+    """Flask test client wrapper with the same interface as HTTPClient."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data or {})
+        self.text = response.get_data(as_text=True)
+        return response.status_code, int(response.headers.get(QUERY_HEADER, 0))
+
+
+class HTTPClient:
+    """Minimal cookie-keeping HTTP client that does not follow redirects."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect
+        )
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        body = urllib.parse.urlencode(data or {}).encode() if method == 'POST' else None
+        if json_body is not None:
+            body, headers = json.dumps(json_body).encode(), {'Content-Type': 'application/json'}
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self._opener.open(req, timeout=60) as response:
+                self.text = response.read().decode('utf-8', 'replace')
+                self.retry_after = 0
+                return response.status, int(response.headers.get(QUERY_HEADER, 0))
+        except urllib.error.HTTPError as e:
+            self.text = e.read().decode('utf-8', 'replace')
+            self.retry_after = int(e.headers.get('Retry-After', 0))
+            return e.code, int(e.headers.get(QUERY_HEADER, 0))
+
+
+def login(client, role, ctx, rng):
+    from benchmarks.datagen import ADMIN_EMAIL, BENCH_PASSWORD
+
+    if role == 'anon':
+        return
+    email = ADMIN_EMAIL if role == 'admin' else f"farmer{rng.choice(ctx['farmers'])}@bench.local"
+    client.request('POST', '/login', {'email': email, 'password': BENCH_PASSWORD})
+
+
+# -------------------- MEASUREMENT --------------------
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current, off Linux
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def instrument(app):
+    """Count SQL statements per request and report them in a response header."""
+    from flask import g, has_request_context
+    from sqlalchemy import event
+
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.bench_queries = g.get('bench_queries', 0) + 1
+
+    @app.after_request
+    def _report(response):
+        response.headers[QUERY_HEADER] = str(g.get('bench_queries', 0))
+        return response
+
+
+def run_scenario(make_client, scenario, ctx, requests, threads):
+    name, role, method, path_fn, setup = scenario
+    per_thread = max(requests // threads, 1)
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(f"{name}-{index}")
+        client = make_client()
+        login(client, role, ctx, rng)
+        local_lat, local_q, local_err = [], [], 0
+        for _ in range(per_thread):
+            form = setup(client, rng, ctx) if setup else None
+            path = path_fn(rng, ctx)
+            started = time.perf_counter()
+            status, n_queries = client.request(method, path, form or ({'quantity': '1'} if method == 'POST' else None))
+            local_lat.append((time.perf_counter() - started) * 1000)
+            local_q.append(n_queries)
+            local_err += status >= 500
+        with lock:
+            latencies.extend(local_lat)
+            queries.extend(local_q)
+            errors.append(local_err)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_request': statistics.mean(queries) if queries else 0.0,
+        'rss_mb': rss_mb(),
+    }
+
+
+# -------------------- OVERLOAD --------------------
+# (name, method, path(rng, ctx), JSON body); spike clients log in as farmers
+SPIKES = [
+    ('chat', 'POST', lambda rng, ctx: '/api/chat', {'message': 'When should I sow wheat?'}),
+    ('search', 'GET', lambda rng, ctx: f"/search?q={_word(rng, ctx)}", None),
+    ('order_place', 'POST', lambda rng, ctx: '/order/place', None),
+]
+PROBES = [
+    ('trending', lambda rng, ctx: '/trending'),
+    ('thread', lambda rng, ctx: f"/forum/{min(int(rng.paretovariate(1.2)), ctx['posts'])}"),
+    ('api_sync', lambda rng, ctx: f"/api/v1/products?since={rng.randint(0, ctx['products'])}&fields=name,stock"),
+]
+
+
+class SlowGemini:
+    """Stands in for the Gemini client: every answer takes `latency` seconds."""
+
+    def __init__(self, latency):
+        self.models = self
+        self.latency = latency
+
+    def generate_content(self, model, contents):
+        time.sleep(self.latency)
+        return types.SimpleNamespace(text='Sow after the first winter rain.')
+
+
+def run_overload_phase(app, ctx, args, spike):
+    """Serve `app` on a fixed pool of --server-threads, time the probes, optionally under the spikes."""
+    from werkzeug.serving import WSGIRequestHandler
+
+    from server import PooledWSGIServer
+
+    app.extensions['genai_client'] = SlowGemini(args.chat_latency)
+    listener = socket.create_server(('127.0.0.1', 0), backlog=256)
+    port = listener.getsockname()[1]
+    server = PooledWSGIServer('127.0.0.1', port, app, args.server_threads, listener.fileno(), WSGIRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{port}'
+    stop = threading.Event()
+    probe_latencies = []
+    spike_statuses = {name: collections.Counter() for name, *_ in SPIKES}
+    lock = threading.Lock()
+
+    def spiker(name, method, path_fn, body, index):
+        rng = random.Random(f'{name}-{index}')
+        client = HTTPClient(base_url)
+        login(client, 'farmer', ctx, rng)
+        while not stop.is_set():
+            form = _prepare_cart(client, rng, ctx) if name == 'order_place' else None
+            status, _ = client.request(method, path_fn(rng, ctx), form, json_body=body)
+            with lock:
+                spike_statuses[name][status] += 1
+            stop.wait(client.retry_after)
+
+    def prober(index):
+        rng = random.Random(f'probe-{index}')
+        client = HTTPClient(base_url)
+        while not stop.is_set():
+            name, path_fn = rng.choice(PROBES)
+            started = time.perf_counter()
+            client.request('GET', path_fn(rng, ctx))
+            with lock:
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=prober, args=(i,)) for i in range(2)]
+    if spike:
+        threads += [threading.Thread(target=spiker, args=(name, method, path_fn, body, i))
+                    for name, method, path_fn, body in SPIKES for i in range(args.spike_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    server.server_close()
+    listener.close()
+    return probe_latencies, spike_statuses
+
+
+def run_overload(make_app, ctx, args):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    print(f"\n{args.server_threads} server threads, {args.spike_threads} clients per spike route, "
+          f"chat upstream {args.chat_latency}s, {args.duration}s per phase")
+    print(f"{'phase':<24}{'probes':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}   spike responses by status")
+    results = {}
+    for phase, admission, spike in (('idle', True, False), ('overload, admission off', False, True),
+                                    ('overload, admission on', True, True)):
+        app = make_app(admission)
+        latencies, statuses = run_overload_phase(app, ctx, args, spike)
+        results[phase] = {'probes': len(latencies), 'p50_ms': percentile(latencies, 50),
+                          'p95_ms': percentile(latencies, 95), 'p99_ms': percentile(latencies, 99),
+                          'spikes': {name: dict(counts) for name, counts in statuses.items()}}
+        spikes = '  '.join(f"{name} {dict(sorted(counts.items()))}" for name, counts in statuses.items() if counts)
+        r = results[phase]
+        print(f"{phase:<24}{r['probes']:>8}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}   {spikes}")
+        if admission and spike:
+            print(f"  admission stats: {json.dumps(app.extensions['admission'].stats()['classes'])}")
+    return results
+
+
+# -------------------- BASELINES --------------------
+def save_baseline(name, results, meta):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f'{name}.json')
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+    print(f"\nBaseline saved to {path}")
+
+
+def compare(name, results, threshold, meta):
+    """Print deltas against a saved baseline. Returns True if any scenario regressed beyond threshold."""
+    path = os.path.join(BASELINE_DIR, f'{name}.json')
+    with open(path) as f:
+        saved = json.load(f)
+    baseline = saved['results']
+    regressed = False
+    print(f"\nCompared with baseline '{name}' (regression threshold {threshold:.0%}):")
+    if saved.get('meta') != meta:
+        print(f"  warning: baseline was recorded with {saved.get('meta')}, this run is {meta}")
+    print(f"{'scenario':<18}{'p50':>12}{'p95':>12}{'p99':>12}{'queries':>12}")
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            print(f"{scenario:<18}{'(new)':>12}")
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            delta = (current[key] - base[key]) / base[key] if base[key] else 0.0
+            flag = '!' if delta > threshold else ' '
+            regressed |= delta > threshold
+            cells.append(f"{delta:+10.1%}{flag} ")
+        print(f"{scenario:<18}{''.join(cells)}")
+    return regressed
+
+
+# -------------------- MAIN --------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent clients')
+    parser.add_argument('--mode', choices=['client', 'wsgi'], default='client')
+    parser.add_argument('--only', nargs='*', help='scenario names to run')
+    parser.add_argument('--db', help='reuse/keep this SQLite file instead of a temp one')
+    parser.add_argument('--save-baseline', metavar='NAME')
+    parser.add_argument('--compare', metavar='NAME')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    parser.add_argument('--json', action='store_true', help='print raw results as JSON')
+    parser.add_argument('--overload', action='store_true', help='check admission control instead (see above)')
+    parser.add_argument('--server-threads', type=int, default=8, help='--overload: server thread pool size')
+    parser.add_argument('--spike-threads', type=int, default=6, help='--overload: clients per expensive route')
+    parser.add_argument('--chat-latency', type=float, default=1.5, help='--overload: stand-in Gemini latency (s)')
+    parser.add_argument('--duration', type=float, default=10, help='--overload: seconds per phase')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp.name, 'bench.db')
+    fresh = not os.path.exists(db_path)
+    sys.path.insert(0, ROOT)
+
+    from benchmarks import datagen
+    from app import create_app
+    from models import db
+
+    def make_app(admission):
+        return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'BACKGROUND_TASKS': False,
+                           'ADMISSION': admission, 'SERVER_THREADS': args.server_threads})
+
+    app = make_app(False)
+    instrument(app)
+    with app.app_context():
+        if fresh:
+            db.create_all()
+            started = time.perf_counter()
+            counts = datagen.seed(**datagen.SCALES[args.scale])
+            print(f"Seeded {args.scale} dataset in {time.perf_counter() - started:.1f}s: {counts}")
+        from models import User
+        farmers = [u.id for u in User.query.filter_by(role='farmer').with_entities(User.id)]
+        ctx = {'products': datagen.SCALES[args.scale]['products'], 'posts': datagen.SCALES[args.scale]['posts'],
+               'farmers': farmers,
+               'words': datagen.sample_words()}
+
+    if args.overload:
+        results = run_overload(make_app, ctx, args)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        with app.app_context():
+            from trending import trending
+            trending.checkpoint()
+        tmp.cleanup()
+        return
+
+    server = None
+    if args.mode == 'wsgi':
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        make_client = lambda: HTTPClient(base_url)  # noqa: E731
+    else:
+        make_client = lambda: TestClient(app)  # noqa: E731
+
+    results = {}
+    print(f"\n{'scenario':<18}{'reqs':>7}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>8}{'rss MB':>9}")
+    for scenario in SCENARIOS:
+        if args.only and scenario[0] not in args.only:
+            continue
+        r = run_scenario(make_client, scenario, ctx, args.requests, args.threads)
+        results[scenario[0]] = r
+        print(f"{scenario[0]:<18}{r['requests']:>7}{r['errors']:>5}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['queries_per_request']:>8.1f}{r['rss_mb']:>9.1f}")
+
+    if server is not None:
+        server.shutdown()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    meta = {'scale': args.scale, 'mode': args.mode, 'threads': args.threads, 'requests': args.requests}
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, meta)
+    regressed = compare(args.compare, results, args.threshold, meta) if args.compare else False
+    with app.app_context():  # write buffered likes and trending scores before the temp DB goes away
+        from likes import likes
+        from trending import trending
+        likes.flush()
+        trending.checkpoint()
+    tmp.cleanup()
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Chat blueprint backed by Gemini.
+
+google.genai is slow to import and the client needs the configured API key,
+so both are deferred until the first /api/chat request and then shared by
+every request in the process.
+"""
+import threading
+import time
+
+from flask import Blueprint, current_app, jsonify, request
+
+import metrics
+
+bp = Blueprint('chat', __name__)
+_client_lock = threading.Lock()
+
+
+def get_genai_client():
+    client = current_app.extensions.get('genai_client')
+    if client is None:
+        with _client_lock:
+            client = current_app.extensions.get('genai_client')
+            if client is None:
+                from google import genai
+
+                client = genai.Client(api_key=current_app.config['GEMINI_API_KEY'])
+                current_app.extensions['genai_client'] = client
+    return client
+
+
+@bp.route("/api/chat", methods=["POST"])
+def chat():
+    user_input = request.json.get("message")
+    client = get_genai_client()
+    started, outcome = time.perf_counter(), 'error'
+    try:
+        response = client.models.generate_content(
+            model=current_app.config['GEMINI_MODEL'],
+            contents=user_input
+        )
+        outcome = 'ok'
+    finally:
+        metrics.CHAT_UPSTREAM_SECONDS.observe(time.perf_counter() - started, outcome)
+    return jsonify({"reply": response.text})
@@ -0,0 +1,192 @@
+"""Custom `flask` commands, registered on the app by create_app()."""
+import os
+import sys
+
+import click
+
+import api
+import archive
+import directory
+import listings
+import maintenance
+import moderation
+import routing
+from likes import likes
+from trending import trending
+from models import db
+
+
+def register_commands(app):
+    # -------------------- CLI DB INIT --------------------
+    @app.cli.command('db-init')
+    def db_init():
+        with app.app_context():
+            db.create_all()
+            print('✅ Database initialized.')
+
+    # -------------------- DB MIGRATION COMMANDS --------------------
+    @app.cli.command('db-migrate')
+    def db_migrate():
+        """Generate migration scripts."""
+        from flask_migrate import migrate as migrate_cmd, init
+        with app.app_context():
+            migrations_dir = os.path.join(os.getcwd(), 'migrations')
+            if not os.path.exists(migrations_dir):
+                init()
+            migrate_cmd(message="auto migration")
+            print("✅ Migration scripts generated.")
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Apply migrations to the database."""
+        from flask_migrate import upgrade
+        with app.app_context():
+            upgrade()
+            print("✅ Database upgraded successfully.")
+
+    # -------------------- BACKUP & MAINTENANCE --------------------
+    @app.cli.command('db-backup')
+    @click.option('--dest', help='Directory for the copies (default BACKUP_DIR).')
+    @click.option('--pages', type=int, default=maintenance.BACKUP_PAGES, help='Pages copied per step.')
+    @click.option('--pause', type=float, default=maintenance.BACKUP_PAUSE, help='Seconds between steps.')
+    def db_backup(dest, pages, pause):
+        """Consistent online copy of the database (and archive) without blocking the app."""
+        shown = {}
+
+        def progress(schema, done, total):
+            percent = 100 * done // total if total else 100
+            if percent >= shown.get(schema, -10) + 10:
+                shown[schema] = percent
+                print(f"   {schema}: {done}/{total} pages ({percent}%)")
+
+        with app.app_context():
+            report = maintenance.backup(dest, pages=pages, pause=pause, progress=progress)
+            for f in report['files']:
+                print(f"✅ {f['path']} ({f['bytes'] / 2**20:.1f} MB, {f['steps']} steps, {f['ms']:.0f} ms)")
+            if report['pruned']:
+                print(f"🗑️ {report['pruned']} old backups removed.")
+
+    @app.cli.command('db-maintain')
+    @click.option('--full-analyze', is_flag=True, help='ANALYZE everything instead of PRAGMA optimize.')
+    @click.option('--vacuum-pages', type=int, default=maintenance.VACUUM_PAGES, help='Free pages to release.')
+    @click.option('--enable-incremental-vacuum', is_flag=True,
+                  help='Switch to auto_vacuum=INCREMENTAL first (runs a full VACUUM; stop the app).')
+    def db_maintain(full_analyze, vacuum_pages, enable_incremental_vacuum):
+        """Refresh planner statistics, release free pages and checkpoint the WAL."""
+        with app.app_context():
+            if enable_incremental_vacuum:
+                print(f"✅ Incremental vacuum enabled ({maintenance.enable_incremental_vacuum():.0f} ms).")
+            report = maintenance.maintain(full_analyze=full_analyze, vacuum_pages=vacuum_pages)
+            for step in report['steps']:
+                print(f"   {step['schema']:<8} {step['step']:<19} {step['ms']:8.1f} ms  {step['detail']}")
+            print(f"✅ Maintenance done in {report['ms']:.0f} ms.")
+
+    # -------------------- ANALYTICS, DIRECTORY & COUNTERS --------------------
+    @app.cli.command('analytics-refresh')
+    def analytics_refresh():
+        """Fold new orders into the sales summary tables."""
+        import analytics
+        with app.app_context():
+            processed = analytics.refresh_summaries()
+            print(f"✅ Sales summaries refreshed ({processed} new orders).")
+
+    @app.cli.command('experts-reindex')
+    def experts_reindex():
+        """Rebuild the expert search index and recompute every ranking score."""
+        with app.app_context():
+            if not directory.ensure_search_index(rebuild=True):
+                print("⚠️ FTS5 not available, directory search falls back to LIKE.")
+            count = directory.refresh_rankings(full=True)
+            print(f"✅ Expert directory reindexed ({count} experts ranked).")
+
+    @app.cli.command('likes-recount')
+    def likes_recount():
+        """Recompute the likes_count counters from the like table."""
+        with app.app_context():
+            likes.recount()
+            print("✅ Like counters recomputed.")
+
+    @app.cli.command('summaries-backfill')
+    def summaries_backfill():
+        """Fill the listing `summary` column on blogs, products and threads written before it existed."""
+        with app.app_context():
+            updated = listings.backfill_summaries()
+            print(f"✅ {updated} summaries filled in.")
+
+    @app.cli.command('trending-rebuild')
+    @click.option('--hours', type=int, default=24 * 7, help='How far back to replay likes, replies and orders.')
+    def trending_rebuild(hours):
+        """Recompute trending scores from recent activity (e.g. after first deploy)."""
+        with app.app_context():
+            rows = trending.rebuild(hours=hours)
+            print(f"✅ Trending scores rebuilt ({rows} items).")
+
+    @app.cli.command('api-prune-tombstones')
+    @click.option('--days', type=int, default=90, help='Keep delete markers for this many days.')
+    def api_prune_tombstones(days):
+        """Drop old /api/v1 delete markers; clients that haven't synced since must resync."""
+        with app.app_context():
+            removed = api.prune_tombstones(days)
+            print(f"✅ {removed} tombstones pruned.")
+
+    @app.cli.command('consult-route')
+    def consult_route():
+        """Assign pending consultations to verified experts now."""
+        with app.app_context():
+            total = 0
+            while True:
+                assigned = routing.assign_pending()
+                total += assigned
+                if assigned < routing.BATCH_SIZE:
+                    break
+            print(f"✅ {total} consultations assigned.")
+
+    @app.cli.command('archive-run')
+    @click.option('--batch-size', type=int, default=archive.BATCH_SIZE, help='Rows per transaction.')
+    def archive_run(batch_size):
+        """Move old consultations, orders and quiet threads' replies to the archive database now."""
+        with app.app_context():
+            moved = archive.run(budget=None, batch_size=batch_size)
+            print(f"✅ Archived {moved['consultations']} consultations, {moved['orders']} orders and "
+                  f"{moved['replies']} replies.")
+            for kind, counts in archive.stats().items():
+                print(f"   {kind}: {counts['hot']} hot, {counts['archived']} archived")
+
+    @app.cli.command('moderate-delete')
+    @click.argument('kind', type=click.Choice(list(moderation.KINDS)))
+    @click.option('--ids', help='Comma-separated ids.')
+    @click.option('--user', 'user_id', type=int, help='Everything by this user id.')
+    @click.option('--since', help='Created on or after this date (YYYY-MM-DD).')
+    @click.option('--until', help='Created on or before this date (YYYY-MM-DD).')
+    @click.option('--chunk-size', type=int, default=moderation.CHUNK_SIZE, help='Rows per transaction.')
+    def moderate_delete(kind, ids, user_id, since, until, chunk_size):
+        """Bulk-delete blogs, products, threads or replies with their likes, replies and cart rows."""
+        with app.app_context():
+            try:
+                criteria = moderation.parse_criteria(ids=ids, user_id=user_id, since=since, until=until)
+                job = moderation.queue(kind, criteria)
+            except moderation.ModerationError as e:
+                print(f"⚠️ {e}")
+                sys.exit(1)
+            print(f"🧹 Job #{job.id}: {job.total} {kind} to delete.")
+            moderation.run_job(job, budget=None, chunk_size=chunk_size,
+                               progress=lambda j: print(f"   {j.deleted}/{j.total} ({j.progress()}%)"))
+            if job.status == 'failed':
+                print(f"⚠️ Job #{job.id} failed: {job.error}")
+                sys.exit(1)
+            print(f"✅ {job.deleted} {kind} deleted, with {job.dependents} likes/replies/cart rows.")
+
+    # -------------------- PRODUCTION SERVER --------------------
+    @app.cli.command('serve')
+    @click.option('--bind', '-b', help='host:port to listen on.')
+    @click.option('--workers', '-w', type=int, help='Worker processes.')
+    @click.option('--threads', '-t', type=int, help='Threads per worker.')
+    @click.option('--max-requests', type=int, help='Recycle a worker after this many requests (0 = never).')
+    @click.option('--preload', is_flag=True, help='Build the app once in the arbiter and share it with workers.')
+    @click.option('--access-log', is_flag=True, help='Log every request.')
+    def serve(bind, workers, threads, max_requests, preload, access_log):
+        """Run the preforking multi-worker server (see server.py)."""
+        import server
+        options = server.build_options(bind=bind, workers=workers, threads=threads, max_requests=max_requests,
+                                       preload=preload, access_log=access_log)
+        sys.exit(server.serve(options, app=app if preload else None))
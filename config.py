@@ -0,0 +1,80 @@
+import json
+import os
+
+
+class Config:
+    """Default settings; create_app(config) overrides any of them."""
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'devsecretkey')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///agrifarma.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static', 'uploads')
+
+    # Gemini chat (/api/chat); the client is created on the first chat request
+    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', 'add api key here')
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+
+    # response compression and streamed listing pages, see responses.py
+    COMPRESSION = os.environ.get('COMPRESSION', '1') != '0'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # used if `brotli` is installed
+    STREAM_TEMPLATES = os.environ.get('STREAM_TEMPLATES', '0') == '1'
+
+    # compiled templates on disk and rendered listing cards in memory, see templating.py
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(os.getcwd(), 'template_cache'))
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))  # cards per worker; 0 = off
+
+    # Prometheus metrics at /metrics, see metrics.py
+    METRICS = os.environ.get('METRICS', '1') != '0'
+    # addresses/networks allowed to scrape /metrics (comma-separated, '*' for any); loopback only by default
+    METRICS_ALLOW = os.environ.get('METRICS_ALLOW', '127.0.0.1,::1')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, scrapes need "Authorization: Bearer <token>"
+
+    # admission control for /api/chat, /search and checkout, see admission.py
+    ADMISSION = os.environ.get('ADMISSION', '1') != '0'
+    ADMISSION_MAX_BUSY = int(os.environ.get('ADMISSION_MAX_BUSY', 0))  # 0: SERVER_THREADS - 1
+    ADMISSION_RESERVE = int(os.environ.get('ADMISSION_RESERVE', 1))  # busy slots held back per priority level
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2.0))
+    ADMISSION_CLASSES = json.loads(os.environ.get('ADMISSION_CLASSES', '{}'))  # e.g. '{"chat": {"limit": 4}}'
+    # proxies (load balancers) in front of the app that set X-Forwarded-For/-Proto/-Host. Anonymous rate limits
+    # are per client IP, so set this when behind one; 0 trusts no forwarded headers (they can be forged)
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+    # request profiler (?_profile=1 for admins, or a sampled share of traffic), see profiler.py
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.getcwd(), 'profiles'))
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # 0.01 profiles 1% of requests
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+
+    # background jobs, see background.py
+    BACKGROUND_TASKS = os.environ.get('BACKGROUND_TASKS', '1') != '0'
+    BACKGROUND_PRIMARY = True  # server.py clears this on all but one worker
+    EXPERT_RANK_INTERVAL = int(os.environ.get('EXPERT_RANK_INTERVAL', 300))
+    CONSULT_ROUTING_INTERVAL = int(os.environ.get('CONSULT_ROUTING_INTERVAL', 30))
+    TRENDING_CHECKPOINT_INTERVAL = int(os.environ.get('TRENDING_CHECKPOINT_INTERVAL', 30))
+    MODERATION_INTERVAL = int(os.environ.get('MODERATION_INTERVAL', 2))  # bulk delete jobs, see moderation.py
+
+    # hot/cold archival, see archive.py
+    ARCHIVE_DATABASE = os.environ.get('ARCHIVE_DATABASE')  # default: <main db>_archive.db next to the main db
+    ARCHIVE_INTERVAL = int(os.environ.get('ARCHIVE_INTERVAL', 3600))
+    ARCHIVE_CONSULTATION_DAYS = int(os.environ.get('ARCHIVE_CONSULTATION_DAYS', 180))
+    ARCHIVE_ORDER_DAYS = int(os.environ.get('ARCHIVE_ORDER_DAYS', 365))
+    # only orders that reached a final status move (empty: any status)
+    ARCHIVE_ORDER_STATUSES = [s for s in os.environ.get('ARCHIVE_ORDER_STATUSES', 'Paid,Failed').split(',') if s]
+    ARCHIVE_THREAD_DAYS = int(os.environ.get('ARCHIVE_THREAD_DAYS', 365))
+
+    # online backups and SQLite maintenance, see maintenance.py
+    BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(os.getcwd(), 'backups'))
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+    BACKUP_INTERVAL = int(os.environ.get('BACKUP_INTERVAL', 0))  # seconds; 0 = only `flask db-backup`
+    MAINTAIN_INTERVAL = int(os.environ.get('MAINTAIN_INTERVAL', 6 * 3600))
+
+    # production server, see server.py
+    SERVER_BIND = os.environ.get('SERVER_BIND', '127.0.0.1:8000')
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 1000))
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 100))
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+    SERVER_METRICS_DIR = os.environ.get('SERVER_METRICS_DIR')  # per-worker metric files; a temp dir if unset
@@ -0,0 +1,234 @@
+"""
+Expert directory: faceted filters, full-text search and ranking.
+
+Search over bio/specialization/name uses an SQLite FTS5 index kept in sync
+by triggers (plain LIKE matching is used if FTS5 isn't compiled in).
+Ordering uses ExpertRank.score, which refresh_rankings() recomputes in the
+background only for experts whose consultations or profile changed.
+"""
+import calendar
+import math
+import re
+from datetime import datetime
+
+from sqlalchemy import case, func, or_, select, text, union_all
+from sqlalchemy.orm import contains_eager
+
+from models import db, Expert, ExpertRank, ArchivedConsultation, Consultation, AnalyticsState
+
+PER_PAGE = 12
+RANK_CHECKPOINT_KEY = 'expert_rank_refreshed_at'
+EXPERIENCE_BANDS = [(0, 2, '0-2 years'), (3, 5, '3-5 years'), (6, 10, '6-10 years'), (11, None, '10+ years')]
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS expert_fts USING fts5(
+        name, specialization, bio, content='expert', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS expert_fts_ai AFTER INSERT ON expert BEGIN
+        INSERT INTO expert_fts(rowid, name, specialization, bio)
+        VALUES (new.id, new.name, new.specialization, new.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS expert_fts_ad AFTER DELETE ON expert BEGIN
+        INSERT INTO expert_fts(expert_fts, rowid, name, specialization, bio)
+        VALUES ('delete', old.id, old.name, old.specialization, old.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS expert_fts_au AFTER UPDATE ON expert BEGIN
+        INSERT INTO expert_fts(expert_fts, rowid, name, specialization, bio)
+        VALUES ('delete', old.id, old.name, old.specialization, old.bio);
+        INSERT INTO expert_fts(rowid, name, specialization, bio)
+        VALUES (new.id, new.name, new.specialization, new.bio);
+    END""",
+]
+
+_fts_available = None
+
+
+# -------------------- FULL-TEXT INDEX --------------------
+def ensure_search_index(rebuild=False):
+    """Create the FTS5 table and triggers if needed. Returns False when FTS5 is unavailable."""
+    global _fts_available
+    if _fts_available is not None and not rebuild:
+        return _fts_available
+    try:
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='expert_fts'")
+        ).first()
+        for ddl in FTS_DDL:
+            db.session.execute(text(ddl))
+        if rebuild or not exists:
+            db.session.execute(text("INSERT INTO expert_fts(expert_fts) VALUES ('rebuild')"))
+        db.session.commit()
+        _fts_available = True
+    except Exception:
+        db.session.rollback()
+        _fts_available = False
+    return _fts_available
+
+
+def _fts_query(q):
+    """Turn free text into a safe FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r'\w+', q.lower())
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def _search_filter(q):
+    match = _fts_query(q)
+    if not match:
+        return None
+    if ensure_search_index():
+        matches = text("SELECT rowid FROM expert_fts WHERE expert_fts MATCH :match")
+        return Expert.id.in_(matches.bindparams(match=match).columns(rowid=db.Integer))
+    like = f"%{q}%"
+    return or_(Expert.name.ilike(like), Expert.specialization.ilike(like), Expert.bio.ilike(like))
+
+
+# -------------------- SEARCH & FACETS --------------------
+def _experience_band_expr():
+    whens = []
+    for low, high, label in EXPERIENCE_BANDS:
+        years = func.coalesce(Expert.experience_years, 0)
+        cond = years >= low if high is None else years.between(low, high)
+        whens.append((cond, label))
+    return case(*whens, else_=EXPERIENCE_BANDS[0][2])
+
+
+def _apply_filters(query, filters, skip=None):
+    if filters.get('q') and skip != 'q':
+        cond = _search_filter(filters['q'])
+        if cond is not None:
+            query = query.filter(cond)
+    if filters.get('specialization') and skip != 'specialization':
+        query = query.filter(Expert.specialization == filters['specialization'])
+    if filters.get('verified') and skip != 'verified':
+        query = query.filter(Expert.is_verified.is_(True))
+    if filters.get('min_experience') and skip != 'min_experience':
+        query = query.filter(Expert.experience_years >= filters['min_experience'])
+    return query
+
+
+def search(filters, page=1, per_page=PER_PAGE):
+    """
+    Paginated experts matching filters (keys: q, specialization, verified,
+    min_experience), best ranked first.
+    """
+    query = Expert.query.outerjoin(ExpertRank).options(contains_eager(Expert.rank))
+    query = _apply_filters(query, filters)
+    query = query.order_by(
+        func.coalesce(ExpertRank.score, 0).desc(), Expert.is_verified.desc(), Expert.id
+    )
+    return query.paginate(page=page, per_page=per_page, error_out=False)
+
+
+def facets(filters, limit=15):
+    """
+    Counts for each facet value. A facet's own filter is left out when
+    counting it, so picking one specialization still shows the others.
+    """
+    spec_query = _apply_filters(db.session.query(Expert.specialization, func.count(Expert.id)), filters, skip='specialization')
+    specializations = (
+        spec_query.filter(Expert.specialization.isnot(None), Expert.specialization != '')
+        .group_by(Expert.specialization)
+        .order_by(func.count(Expert.id).desc())
+        .limit(limit)
+        .all()
+    )
+    verified = _apply_filters(
+        db.session.query(func.count(Expert.id)).filter(Expert.is_verified.is_(True)), filters, skip='verified'
+    ).scalar()
+    band = _experience_band_expr()
+    bands = dict(
+        _apply_filters(db.session.query(band, func.count(Expert.id)), filters, skip='min_experience')
+        .group_by(band)
+        .all()
+    )
+    return {
+        'specializations': specializations,
+        'verified': verified,
+        'experience': [(low, label, bands.get(label, 0)) for low, _, label in EXPERIENCE_BANDS],
+    }
+
+
+# -------------------- RANKING --------------------
+def rank_score(is_verified, experience_years, resolved_count, avg_response_hours):
+    """
+    Verification dominates, then proven helpfulness (resolved consultations,
+    log-scaled), then experience (capped at 30 years), then response speed.
+    """
+    score = 3.0 if is_verified else 0.0
+    score += 1.5 * math.log1p(resolved_count or 0)
+    score += 2.0 * min(experience_years or 0, 30) / 30
+    if avg_response_hours is not None:
+        score += 1.0 / (1.0 + avg_response_hours / 24.0)
+    return round(score, 4)
+
+
+def _stale_expert_ids(since):
+    """Experts with no rank row, changed profile inputs, or consultation activity since `since`."""
+    stale = {
+        row[0] for row in db.session.query(Expert.id).outerjoin(ExpertRank).filter(
+            or_(
+                ExpertRank.expert_id.is_(None),
+                ExpertRank.is_verified != func.coalesce(Expert.is_verified, False),
+                ExpertRank.experience_years != func.coalesce(Expert.experience_years, 0),
+            )
+        )
+    }
+    if since is not None:
+        stale.update(
+            row[0] for row in db.session.query(Consultation.expert_id).filter(
+                Consultation.expert_id.isnot(None),
+                or_(Consultation.updated_at >= since, Consultation.created_at >= since),
+            ).distinct()
+        )
+    return stale
+
+
+def _resolved(model, expert_ids):
+    """Resolved consultations of the experts with their response time in hours, from one consultation table."""
+    hours = (func.julianday(model.updated_at) - func.julianday(model.created_at)) * 24
+    return select(model.expert_id, hours.label('hours')).where(
+        model.expert_id.in_(expert_ids), model.status == 'Resolved')
+
+
+def refresh_rankings(full=False, batch_size=500):
+    """Recompute ExpertRank for stale experts (or all of them). Returns how many were refreshed."""
+    state = db.session.get(AnalyticsState, RANK_CHECKPOINT_KEY)
+    since = None if full or state is None else datetime.utcfromtimestamp(state.value)
+    started = datetime.utcnow()
+
+    if full:
+        expert_ids = [row[0] for row in db.session.query(Expert.id)]
+    else:
+        expert_ids = sorted(_stale_expert_ids(since))
+
+    for offset in range(0, len(expert_ids), batch_size):
+        batch = expert_ids[offset:offset + batch_size]
+        # archive.py moves resolved consultations out of the hot table; they still count
+        rows = union_all(*(_resolved(model, batch) for model in (Consultation, ArchivedConsultation))).subquery()
+        stats = {
+            expert_id: (count, avg_hours)
+            for expert_id, count, avg_hours in db.session.query(
+                rows.c.expert_id, func.count(), func.avg(rows.c.hours),
+            ).group_by(rows.c.expert_id)
+        }
+        ranks = {r.expert_id: r for r in ExpertRank.query.filter(ExpertRank.expert_id.in_(batch))}
+        for expert in Expert.query.filter(Expert.id.in_(batch)):
+            resolved, avg_hours = stats.get(expert.id, (0, None))
+            rank = ranks.get(expert.id)
+            if rank is None:
+                rank = ExpertRank(expert_id=expert.id)
+                db.session.add(rank)
+            rank.resolved_count = resolved
+            rank.avg_response_hours = avg_hours
+            rank.is_verified = bool(expert.is_verified)
+            rank.experience_years = expert.experience_years or 0
+            rank.score = rank_score(expert.is_verified, expert.experience_years, resolved, avg_hours)
+            rank.refreshed_at = started
+        db.session.commit()
+
+    if state is None:
+        state = AnalyticsState(key=RANK_CHECKPOINT_KEY)
+        db.session.add(state)
+    # next run re-reads anything touched while this one was running
+    state.value = calendar.timegm(started.timetuple()) - 1
+    db.session.commit()
+    return len(expert_ids)
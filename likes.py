@@ -0,0 +1,223 @@
+"""
+Forum likes.
+
+Each (user, post) and (user, reply) pair is unique in the DB, and the like
+count is a counter column on forum_post / forum_reply (likes_count), so
+pages never COUNT(*) the like table.
+
+Toggles don't write straight away: they are buffered per process and
+flushed in one transaction shortly after the first toggle of a burst
+(FLUSH_DELAY) or once FLUSH_MAX toggles are pending. A flush
+applies each toggle with INSERT ... ON CONFLICT DO NOTHING / DELETE ...
+RETURNING and moves the counters by the rows that actually changed, so
+duplicate or racing toggles can't skew them. Until then the response count
+is the counter column plus this process's pending delta, and the delta of
+a flush stays counted until its transaction commits (it goes back into the
+buffer if the flush rolls back).
+
+toggle() also says whether a like is new for trending: not liked in the DB
+when the burst started, and not already counted by this process (the last
+COUNTED_MEMORY likes are remembered), so unliking and re-liking can't pump
+a thread's trending score.
+"""
+import atexit
+import collections
+import logging
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, ForumPost, ForumReply, Like
+
+log = logging.getLogger(__name__)
+
+FLUSH_DELAY = 0.25  # seconds
+FLUSH_MAX = 500
+COUNTED_MEMORY = 100000  # (user, kind, target) likes already reported as new
+
+# kind -> (like column, counted table)
+TARGETS = {
+    'post': ('post_id', ForumPost),
+    'reply': ('reply_id', ForumReply),
+}
+
+
+class LikeService:
+    def __init__(self, flush_delay=FLUSH_DELAY, flush_max=FLUSH_MAX):
+        self.flush_delay = flush_delay
+        self.flush_max = flush_max
+        self._pending = {}  # (user_id, kind, target_id) -> [liked in DB, liked now]
+        self._delta = {}  # (kind, target_id) -> pending change to likes_count
+        self._inflight = {}  # toggles being written by flush()
+        self._inflight_delta = {}  # their change to likes_count, counted until the commit
+        self._counted = collections.OrderedDict()  # likes toggle() reported as new, oldest first
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._app = None
+        self.flushes = 0
+        self.flushed_toggles = 0
+        atexit.register(self._flush_at_exit)
+
+    # -------------------- READS --------------------
+    def liked_ids(self, user_id, kind, ids):
+        """The subset of ids (posts or replies) the user has liked, in one query."""
+        ids = list(ids)
+        if not user_id or not ids:
+            return set()
+        column = getattr(Like, TARGETS[kind][0])
+        liked = set(db.session.execute(select(column).where(Like.user_id == user_id, column.in_(ids))).scalars())
+        wanted = set(ids)
+        with self._lock:
+            for (uid, k, target_id), (_, now) in list(self._inflight.items()) + list(self._pending.items()):
+                if uid == user_id and k == kind and target_id in wanted:
+                    (liked.add if now else liked.discard)(target_id)
+        return liked
+
+    def count(self, kind, target_id, stored):
+        """Like count from the stored likes_count plus toggles not yet committed."""
+        key = (kind, target_id)
+        with self._lock:
+            return (stored or 0) + self._delta.get(key, 0) + self._inflight_delta.get(key, 0)
+
+    # -------------------- WRITES --------------------
+    def toggle(self, user_id, kind, target_id):
+        """Flip the user's like. Returns (liked now, new like that trending should count)."""
+        key = (user_id, kind, target_id)
+        with self._lock:
+            state = self._pending.get(key)
+            if state is None and key in self._inflight:  # mid-flush: its outcome is the DB state
+                now = self._inflight[key][1]
+                state = [now, now]
+        if state is None:
+            column = getattr(Like, TARGETS[kind][0])
+            in_db = db.session.execute(
+                select(Like.id).where(Like.user_id == user_id, column == target_id)
+            ).first() is not None
+            state = [in_db, in_db]
+
+        with self._lock:
+            state = self._pending.setdefault(key, state)
+            state[1] = not state[1]
+            self._delta[(kind, target_id)] = self._delta.get((kind, target_id), 0) + (1 if state[1] else -1)
+            liked = state[1]
+            new = liked and not state[0] and key not in self._counted
+            if new:
+                self._counted[key] = True
+                if len(self._counted) > COUNTED_MEMORY:
+                    self._counted.popitem(last=False)
+            if state[0] == state[1]:  # toggled back, nothing to write
+                del self._pending[key]
+            size = len(self._pending)
+            self._app = current_app._get_current_object()
+            if size and self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self._flush_in_app, args=(self._app,))
+                self._timer.daemon = True
+                self._timer.start()
+
+        if size >= self.flush_max:
+            self.flush()
+        return liked, new
+
+    def flush(self):
+        """Write all pending toggles in one transaction. Returns how many were applied."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                delta, self._delta = self._delta, {}
+                self._inflight, self._inflight_delta = pending, delta
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+            try:
+                changed = self._apply(pending)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                log.exception("like flush failed, requeueing %s toggles", len(pending))
+                self._requeue(pending, delta)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight, self._inflight_delta = {}, {}
+            self.flushes += 1
+            self.flushed_toggles += len(pending)
+            return changed
+
+    def _apply(self, pending):
+        counters = {}
+        changed = 0
+        for (user_id, kind, target_id), (_, liked) in pending.items():
+            column = getattr(Like, TARGETS[kind][0])
+            if liked:
+                stmt = (
+                    sqlite_insert(Like)
+                    .values({'user_id': user_id, column.key: target_id, 'created_at': datetime.utcnow()})
+                    .on_conflict_do_nothing()
+                    .returning(Like.id)
+                )
+            else:
+                stmt = delete(Like).where(Like.user_id == user_id, column == target_id).returning(Like.id)
+            if db.session.execute(stmt).first() is not None:
+                counters[(kind, target_id)] = counters.get((kind, target_id), 0) + (1 if liked else -1)
+                changed += 1
+
+        for kind, (_, model) in TARGETS.items():
+            rows = [{'target': target_id, 'd': d} for (k, target_id), d in counters.items() if k == kind and d]
+            if rows:
+                table = model.__table__
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id == bindparam('target'))
+                    .values(likes_count=table.c.likes_count + bindparam('d')),
+                    rows,
+                )
+        return changed
+
+    def _requeue(self, pending, delta):
+        """Put a failed flush back into the buffer, in the same step that stops counting it as in flight."""
+        with self._lock:
+            self._inflight, self._inflight_delta = {}, {}
+            for key, state in pending.items():
+                self._pending.setdefault(key, state)
+            for key, d in delta.items():
+                self._delta[key] = self._delta.get(key, 0) + d
+
+    def _flush_in_app(self, app):
+        with app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                pass  # logged and requeued; retried on the next toggle or at exit
+            finally:
+                db.session.remove()
+
+    def _flush_at_exit(self):
+        if self._pending and self._app is not None:
+            self._flush_in_app(self._app)
+
+    # -------------------- MAINTENANCE --------------------
+    def recount(self):
+        """Recompute every likes_count from the like table (after bulk imports or deletes)."""
+        self.flush()
+        for kind, (column, model) in TARGETS.items():
+            counts = (
+                select(func.count(Like.id))
+                .where(getattr(Like, column) == model.id)
+                .correlate(model)
+                .scalar_subquery()
+            )
+            db.session.execute(model.__table__.update().values(likes_count=counts))
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._pending), 'flushes': self.flushes, 'flushed_toggles': self.flushed_toggles}
+
+
+likes = LikeService()
@@ -0,0 +1,77 @@
+"""
+Listing-page queries.
+
+Listing pages show a title, a short snippet and a few small fields per
+card, so these queries load only those columns. The large Text columns
+(description/content) stay deferred, and the snippet comes from the stored
+`summary` column that models.make_summary() fills in whenever the text is
+written. Authors come from the same query (one JOIN instead of a lazy load
+per card), and thread cards get their reply counts from a correlated
+subquery instead of one COUNT per card. Every card also gets its row's
+`version` from the sync_change log, the key templating.py caches the
+rendered card under.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, load_only, with_expression
+
+from models import db, make_summary, ArchivedForumReply, Blog, ForumPost, ForumReply, Product, SyncChange, User
+
+PRODUCT_CARD = (Product.id, Product.name, Product.summary, Product.price, Product.discount, Product.stock,
+                Product.image, Product.category, Product.user_id, Product.created_at)
+BLOG_CARD = (Blog.id, Blog.title, Blog.summary, Blog.image, Blog.user_id, Blog.created_at)
+THREAD_CARD = (ForumPost.id, ForumPost.title, ForumPost.summary, ForumPost.user_id, ForumPost.likes_count,
+               ForumPost.created_at)
+
+
+def _with_author(query, model):
+    return query.options(joinedload(model.user).load_only(User.name))
+
+
+def _version(model, kind):
+    """The row's sync_change.seq, which the sync triggers bump on every write."""
+    seq = select(SyncChange.seq).where(SyncChange.kind == kind, SyncChange.item_id == model.id)
+    return with_expression(model.version, seq.correlate(model).scalar_subquery())
+
+
+def products():
+    """Product cards: no description, seller name joined."""
+    return _with_author(Product.query.options(load_only(*PRODUCT_CARD), _version(Product, 'products')), Product)
+
+
+def blogs():
+    """Blog cards: no content, author name joined."""
+    return _with_author(Blog.query.options(load_only(*BLOG_CARD), _version(Blog, 'blogs')), Blog)
+
+
+def threads():
+    """Thread cards: no content, author name joined, reply_count() preloaded."""
+    def count(model):
+        return select(func.count(model.id)).where(model.post_id == ForumPost.id).correlate(ForumPost).scalar_subquery()
+
+    replies = count(ForumReply) + count(ArchivedForumReply)  # replies of quiet threads live in the archive
+    query = ForumPost.query.options(load_only(*THREAD_CARD), with_expression(ForumPost.reply_total, replies),
+                                    _version(ForumPost, 'threads'))
+    return _with_author(query, ForumPost)
+
+
+def titles(model, title_column):
+    """Just id and title, for link lists such as search results."""
+    return model.query.options(load_only(model.id, title_column))
+
+
+def backfill_summaries(batch_size=1000):
+    """Fill `summary` on rows written before the column existed. Returns rows updated."""
+    updated = 0
+    for model, text in ((Blog, Blog.content), (Product, Product.description), (ForumPost, ForumPost.content)):
+        while True:
+            rows = db.session.query(model.id, text).filter(model.summary.is_(None)).limit(batch_size).all()
+            if not rows:
+                break
+            db.session.execute(
+                model.__table__.update().where(model.__table__.c.id == db.bindparam('row_id'))
+                .values(summary=db.bindparam('s')),
+                [{'row_id': row_id, 's': make_summary(value)} for row_id, value in rows],
+            )
+            db.session.commit()
+            updated += len(rows)
+    return updated
@@ -0,0 +1,207 @@
+"""
+Online backups and routine SQLite maintenance.
+
+backup() copies the live database with SQLite's backup API, BACKUP_PAGES
+pages per step. A step holds a read lock only while it runs, and the
+progress callback sleeps BACKUP_PAUSE between steps (the backup API's own
+`sleep` only applies after SQLITE_BUSY), so writers wait for one step at
+most, never for the whole copy. The copy is consistent: if another
+connection writes mid-way, SQLite starts the copy over. Under steady
+writes that could go on forever, so every restart quadruples the step
+size, and after MAX_RESTARTS the copy is taken in one step. The archive
+database (archive.py) is copied next to the main one. Copies go to a temp
+file and are renamed into place, so a half-written backup never looks
+finished.
+
+maintain() keeps the query planner's statistics current and the files
+compact:
+
+- PRAGMA optimize, or a bounded ANALYZE the first time (no sqlite_stat1 yet)
+- PRAGMA incremental_vacuum, when the database uses auto_vacuum=INCREMENTAL
+  (db-maintain --enable-incremental-vacuum switches it on, once, offline)
+- PRAGMA wal_checkpoint(PASSIVE), when the database is in WAL mode
+
+Both run on the background runner on the primary worker (BACKUP_INTERVAL,
+MAINTAIN_INTERVAL) and as `flask db-backup` / `flask db-maintain`. Every
+step is timed, and the last report is kept for /admin/server.
+"""
+import glob
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, ARCHIVE_SCHEMA
+
+BACKUP_PAGES = 256  # pages per backup step (1 MB at the default 4 KB page size)
+BACKUP_PAUSE = 0.005  # seconds between steps, when waiting writers get the lock
+MAX_RESTARTS = 4  # then the rest is copied in one step
+ANALYSIS_LIMIT = 1000  # rows per index ANALYZE samples; bounds the first full ANALYZE
+VACUUM_PAGES = 2000  # free pages released per incremental vacuum
+
+_reports = {}
+
+
+class _Restarted(Exception):
+    """A write from another connection sent the backup back to the first page."""
+
+
+@contextmanager
+def _sqlite_connection():
+    """The pooled driver connection (archive attached), outside any SQLAlchemy transaction."""
+    raw = db.engine.raw_connection()
+    try:
+        yield raw.driver_connection
+    finally:
+        raw.close()
+
+
+def _schemas(conn):
+    return [row[1] for row in conn.execute('PRAGMA database_list') if row[1] in ('main', ARCHIVE_SCHEMA)]
+
+
+# -------------------- BACKUP --------------------
+def backup(dest_dir=None, pages=BACKUP_PAGES, pause=BACKUP_PAUSE, keep=None, progress=None):
+    """Copy the main and archive databases into dest_dir. Returns the report dict."""
+    config = current_app.config
+    dest_dir = dest_dir or config['BACKUP_DIR']
+    keep = config['BACKUP_KEEP'] if keep is None else keep
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    started = time.perf_counter()
+    report = {'started_at': datetime.utcnow().isoformat(timespec='seconds'), 'files': []}
+
+    with _sqlite_connection() as source:
+        for schema in _schemas(source):
+            name = 'agrifarma' if schema == 'main' else f'agrifarma_{schema}'
+            path = os.path.join(dest_dir, f'{name}-{stamp}.db')
+            step_started = time.perf_counter()
+            steps, restarts = _copy(source, schema, path + '.part', pages, pause, progress)
+            os.replace(path + '.part', path)
+            report['files'].append({
+                'schema': schema,
+                'path': path,
+                'bytes': os.path.getsize(path),
+                'steps': steps,
+                'restarts': restarts,
+                'ms': round((time.perf_counter() - step_started) * 1000, 1),
+            })
+
+    report['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    report['pruned'] = _prune_backups(dest_dir, keep)
+    _reports['backup'] = report
+    return report
+
+
+def _copy(source, schema, path, pages, pause, progress):
+    """Back up one schema into `path`, with a bigger step after every restart. Returns (steps, restarts)."""
+    steps = restarts = 0
+    while True:
+        copied = [-1]
+
+        def on_step(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            if total - remaining <= copied[0]:
+                raise _Restarted()
+            copied[0] = total - remaining
+            if progress is not None:
+                progress(schema, total - remaining, total)
+            if remaining:
+                time.sleep(pause)  # the source is unlocked between steps; let waiting writers in
+
+        step = -1 if restarts >= MAX_RESTARTS else pages * 4 ** restarts  # -1: all pages in one step
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target, pages=step, progress=on_step, name=schema)
+            return steps, restarts
+        except _Restarted:
+            restarts += 1
+        finally:
+            target.close()
+
+
+def _prune_backups(dest_dir, keep):
+    """Keep the newest `keep` backups of each database. Returns files removed."""
+    removed = 0
+    for prefix in ('agrifarma-', f'agrifarma_{ARCHIVE_SCHEMA}-'):
+        files = sorted(glob.glob(os.path.join(dest_dir, f'{prefix}*.db')), reverse=True)
+        for path in files[keep:] if keep else []:
+            os.unlink(path)
+            removed += 1
+    return removed
+
+
+def scheduled_backup():
+    return len(backup()['files'])
+
+
+# -------------------- MAINTENANCE --------------------
+def _step(steps, schema, name, func):
+    started = time.perf_counter()
+    detail = func()
+    steps.append({'schema': schema, 'step': name, 'ms': round((time.perf_counter() - started) * 1000, 1),
+                  'detail': detail})
+
+
+def maintain(full_analyze=False, vacuum_pages=VACUUM_PAGES):
+    """Refresh planner statistics, release free pages and checkpoint the WAL. Returns the report dict."""
+    started = time.perf_counter()
+    steps = []
+    with _sqlite_connection() as conn:
+        for schema in _schemas(conn):
+            def analyze(schema=schema):
+                has_stats = conn.execute(
+                    f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+                conn.execute(f'PRAGMA {schema}.analysis_limit = {ANALYSIS_LIMIT}')
+                if full_analyze or not has_stats:
+                    conn.execute(f'ANALYZE {schema}')
+                    return 'analyzed'
+                conn.execute(f'PRAGMA {schema}.optimize')
+                return 'optimized'
+
+            def vacuum(schema=schema):
+                if conn.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0] != 2:
+                    return 'skipped: auto_vacuum is not INCREMENTAL'
+                free = conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+                conn.execute(f'PRAGMA {schema}.incremental_vacuum({int(vacuum_pages)})').fetchall()
+                return f'{min(free, vacuum_pages)} of {free} free pages released'
+
+            def checkpoint(schema=schema):
+                mode = conn.execute(f'PRAGMA {schema}.journal_mode').fetchone()[0]
+                if mode != 'wal':
+                    return f'skipped: journal_mode={mode}'
+                busy, log, done = conn.execute(f'PRAGMA {schema}.wal_checkpoint(PASSIVE)').fetchone()
+                return f'{done} of {log} WAL frames checkpointed' + (' (readers busy)' if busy else '')
+
+            _step(steps, schema, 'analyze', analyze)
+            _step(steps, schema, 'incremental_vacuum', vacuum)
+            _step(steps, schema, 'wal_checkpoint', checkpoint)
+        conn.commit()
+
+    report = {'started_at': datetime.utcnow().isoformat(timespec='seconds'), 'steps': steps,
+              'ms': round((time.perf_counter() - started) * 1000, 1)}
+    _reports['maintain'] = report
+    return report
+
+
+def enable_incremental_vacuum():
+    """Switch every database to auto_vacuum=INCREMENTAL. Runs a full VACUUM, so do it offline. Returns ms."""
+    started = time.perf_counter()
+    with _sqlite_connection() as conn:
+        for schema in _schemas(conn):
+            conn.execute(f'PRAGMA {schema}.auto_vacuum = INCREMENTAL')
+            conn.execute(f'VACUUM {schema}')
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def scheduled_maintain():
+    return len(maintain()['steps'])
+
+
+def stats():
+    """The last backup and maintenance reports of this process."""
+    return dict(_reports)
@@ -0,0 +1,402 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+Every process keeps its values in a ValueFile: an mmap'd file of
+(sample key, float) records. An update is a dict lookup and a
+struct.pack_into under a short per-process lock, with no cross-process
+locking. A scrape reads the files of all processes and adds them up, so
+any worker can answer for the whole server.
+
+Under server.py every worker writes <pid>.db in the arbiter's metrics
+directory. When a worker exits the arbiter folds its counters and
+histograms into archive.db and deletes the file, so totals survive worker
+recycling without the directory growing. Gauges only count live processes.
+Outside server.py (flask run, scripts) the file lives in a private temp
+directory and /metrics covers this process only.
+
+/metrics exposes per-route traffic, so it only answers addresses in
+METRICS_ALLOW (loopback by default) and, with METRICS_TOKEN set, scrapes
+carrying the token.
+"""
+import atexit
+import glob
+import hmac
+import ipaddress
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+_HEADER = struct.Struct('=Q')  # bytes of the file in use
+_KEYLEN = struct.Struct('=I')
+_VALUE = struct.Struct('=d')
+INITIAL_SIZE = 64 * 1024
+ARCHIVE = 'archive.db'
+
+
+# -------------------- STORAGE --------------------
+class ValueFile:
+    """Float values by key in an mmap'd file. Written by one process, readable by any."""
+
+    def __init__(self, path, size=INITIAL_SIZE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self._mem = mmap.mmap(self._file.fileno(), os.fstat(self._file.fileno()).st_size)
+        self._offsets = {}
+        self._used = _HEADER.unpack_from(self._mem)[0] or _HEADER.size
+        for key, _, offset in _records(self._mem, self._used):
+            self._offsets[key] = offset
+
+    def add(self, key, amount):
+        with self._lock:
+            offset = self._offsets.get(key) or self._allocate(key)
+            _VALUE.pack_into(self._mem, offset, _VALUE.unpack_from(self._mem, offset)[0] + amount)
+
+    def add_many(self, pairs):
+        """Several additions under one lock acquisition (histogram observations)."""
+        with self._lock:
+            for key, amount in pairs:
+                offset = self._offsets.get(key) or self._allocate(key)
+                _VALUE.pack_into(self._mem, offset, _VALUE.unpack_from(self._mem, offset)[0] + amount)
+
+    def _allocate(self, key):
+        """Append a zeroed record; readers only see it once the header moves past it. Caller holds the lock."""
+        encoded = key.encode()
+        value_at = self._used + _KEYLEN.size + len(encoded)
+        value_at += -value_at % 8  # 8-byte aligned doubles
+        end = value_at + _VALUE.size
+        if end > len(self._mem):
+            self._grow(end)
+        _KEYLEN.pack_into(self._mem, self._used, len(encoded))
+        self._mem[self._used + _KEYLEN.size:self._used + _KEYLEN.size + len(encoded)] = encoded
+        _VALUE.pack_into(self._mem, value_at, 0.0)
+        self._used = end
+        _HEADER.pack_into(self._mem, 0, end)
+        self._offsets[key] = value_at
+        return value_at
+
+    def _grow(self, needed):
+        size = len(self._mem)
+        while size < needed:
+            size *= 2
+        self._mem.close()
+        self._file.truncate(size)
+        self._mem = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        self._mem.close()
+        self._file.close()
+
+
+def _records(buf, used):
+    """(key, value, value offset) for each record in a ValueFile's bytes."""
+    pos = _HEADER.size
+    while pos < used:
+        length = _KEYLEN.unpack_from(buf, pos)[0]
+        key = bytes(buf[pos + _KEYLEN.size:pos + _KEYLEN.size + length]).decode()
+        value_at = pos + _KEYLEN.size + length
+        value_at += -value_at % 8
+        yield key, _VALUE.unpack_from(buf, value_at)[0], value_at
+        pos = value_at + _VALUE.size
+
+
+def read_values(path):
+    """[(key, value)] from a ValueFile on disk, possibly another process's."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:  # folded into the archive meanwhile
+        return []
+    if len(data) < _HEADER.size:
+        return []
+    used = min(_HEADER.unpack_from(data)[0], len(data))
+    values = []
+    try:
+        for key, value, _ in _records(data, used):
+            values.append((key, value))
+    except (struct.error, UnicodeDecodeError):  # not a ValueFile, or cut short: keep the records before the damage
+        pass
+    return values
+
+
+_dir = None
+_store = None
+_private_dir = None
+_store_lock = threading.Lock()
+
+
+def attach(directory):
+    """Write this process's values to <directory>/<pid>.db (server.py calls this in each worker)."""
+    global _dir, _store
+    with _store_lock:
+        _dir = directory
+        _store = ValueFile(os.path.join(directory, f'{os.getpid()}.db'))
+
+
+def store():
+    global _private_dir
+    if _store is None:
+        if _dir is None or _dir == _private_dir:  # not under server.py
+            _private_dir = tempfile.mkdtemp(prefix='agrifarma-metrics-')
+            atexit.register(_remove_private_dir, _private_dir, os.getpid())
+            attach(_private_dir)
+        else:
+            attach(_dir)
+    return _store
+
+
+def _remove_private_dir(path, owner):
+    if os.getpid() == owner:  # forked children inherit atexit hooks
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _forget_store():
+    global _store
+    _store = None  # a forked child must not write to its parent's file
+
+
+os.register_at_fork(after_in_child=_forget_store)
+
+
+def fold(directory, pid):
+    """Move a dead worker's counters and histograms into the archive. Called by the arbiter after reaping it."""
+    path = os.path.join(directory, f'{pid}.db')
+    values = [(key, value) for key, value in read_values(path) if _family_of(key) not in _gauges]
+    archive = ValueFile(os.path.join(directory, ARCHIVE))
+    try:
+        archive.add_many(values)
+    finally:
+        archive.close()
+    # a scrape between these two lines counts the worker twice; the window is a few microseconds
+    os.unlink(path)
+
+
+# -------------------- METRICS --------------------
+_families = []
+_gauges = set()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _family_of(key):
+    name = key.split('{', 1)[0]
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in _histograms:
+            return name[:-len(suffix)]
+    return name
+
+
+_histograms = set()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._keys = {}
+        _families.append(self)
+
+    def _key(self, values):
+        key = self._keys.get(values)
+        if key is None:
+            key = self._keys[values] = self.name + _labels(self.labels, values)
+        return key
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *values, amount=1):
+        store().add(self._key(values), amount)
+
+
+class Gauge(_Metric):
+    """Summed over live processes only."""
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _gauges.add(self.name)
+
+    def inc(self, *values, amount=1):
+        store().add(self._key(values), amount)
+
+    def dec(self, *values, amount=1):
+        store().add(self._key(values), -amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        _histograms.add(name)
+
+    def _key(self, values):
+        keys = self._keys.get(values)
+        if keys is None:
+            bucket_keys = [
+                self.name + '_bucket' + _labels(self.labels, values, [('le', '+Inf' if b == math.inf else repr(b))])
+                for b in self.buckets
+            ]
+            suffix = _labels(self.labels, values)
+            keys = self._keys[values] = (bucket_keys, self.name + '_sum' + suffix, self.name + '_count' + suffix)
+        return keys
+
+    def observe(self, amount, *values):
+        bucket_keys, sum_key, count_key = self._key(values)
+        # buckets are stored cumulatively, so exposition is a plain sum across processes
+        pairs = [(key, 1 if amount <= bound else 0) for key, bound in zip(bucket_keys, self.buckets)]
+        pairs += [(sum_key, amount), (count_key, 1)]
+        store().add_many(pairs)
+
+
+REQUESTS = Counter('agrifarma_http_requests_total', 'HTTP requests by route, method and status.',
+                   ('route', 'method', 'status'))
+REQUEST_SECONDS = Histogram('agrifarma_http_request_duration_seconds', 'Time to handle a request, by route.',
+                            ('route', 'method'))
+IN_FLIGHT = Gauge('agrifarma_http_requests_in_flight', 'Requests being handled right now.')
+CHAT_UPSTREAM_SECONDS = Histogram('agrifarma_chat_upstream_duration_seconds',
+                                  'Gemini call latency behind /api/chat, by outcome (ok or error).', ('outcome',),
+                                  buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+CACHE_REQUESTS = Counter('agrifarma_cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+                         ('cache', 'result'))
+ADMISSION = Counter('agrifarma_admission_total',
+                    'Admission decisions for expensive endpoints, by class and outcome (see admission.py).',
+                    ('class', 'outcome'))
+
+
+# -------------------- EXPOSITION --------------------
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Sample key -> value summed over every process writing to the metrics directory."""
+    store()
+    totals = {}
+    for path in sorted(glob.glob(os.path.join(_dir, '*.db'))):
+        name = os.path.basename(path)[:-3]
+        if name == ARCHIVE[:-3]:
+            alive = False
+        elif name.isdigit():
+            alive = _pid_alive(int(name))
+        else:
+            continue  # not a worker's file
+        for key, value in read_values(path):
+            if alive or _family_of(key) not in _gauges:
+                totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _format(value):
+    if value == int(value) and abs(value) < 2**53:
+        return str(int(value))
+    return repr(value)
+
+
+def exposition():
+    totals = collect()
+    by_family = {}
+    for key, value in totals.items():
+        by_family.setdefault(_family_of(key), []).append((key, value))
+
+    lines = []
+    for family in sorted(_families, key=lambda f: f.name):
+        lines.append(f'# HELP {family.name} {family.documentation}')
+        lines.append(f'# TYPE {family.name} {family.kind}')
+        lines.extend(f'{key} {_format(value)}' for key, value in by_family.get(family.name, []))
+
+    # derived from CACHE_REQUESTS so it is consistent across workers
+    hits, lookups = {}, {}
+    for key, value in by_family.get(CACHE_REQUESTS.name, []):
+        cache = key.split('cache="', 1)[1].split('"', 1)[0]
+        lookups[cache] = lookups.get(cache, 0) + value
+        if 'result="hit"' in key:
+            hits[cache] = hits.get(cache, 0) + value
+    lines.append('# HELP agrifarma_cache_hit_ratio Hits over lookups since the server started, by cache.')
+    lines.append('# TYPE agrifarma_cache_hit_ratio gauge')
+    for cache, total in sorted(lookups.items()):
+        lines.append(f'agrifarma_cache_hit_ratio{{cache="{cache}"}} {_format(round(hits.get(cache, 0) / total, 4))}')
+    return '\n'.join(lines) + '\n'
+
+
+# -------------------- FLASK --------------------
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    IN_FLIGHT.dec()
+    route = request.endpoint or 'unmatched'  # endpoint names keep the label set small, unlike raw paths
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    REQUESTS.inc(route, request.method, str(status))
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method)
+
+
+def _allowed(address, networks):
+    try:
+        address = ipaddress.ip_address(address or '')
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def metrics_view():
+    networks = current_app.extensions['metrics_allow']
+    if networks is not None and not _allowed(request.remote_addr, networks):
+        return Response('forbidden\n', 403, mimetype='text/plain')
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('unauthorized\n', 401, mimetype='text/plain')
+    return Response(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """Record every request and serve /metrics. Call before other before_request hooks are added."""
+    if not app.config['METRICS']:
+        return
+    allow = [part.strip() for part in app.config['METRICS_ALLOW'].split(',') if part.strip()]
+    # '*' lets any address scrape; otherwise addresses and networks, e.g. "127.0.0.1, 10.0.0.0/8"
+    app.extensions['metrics_allow'] = None if '*' in allow else [ipaddress.ip_network(a, strict=False) for a in allow]
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,9 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
 
+SUMMARY_LENGTH = 150  # longest snippet a listing card shows
+
+
+def make_summary(text, length=SUMMARY_LENGTH):
+    """Whitespace-collapsed start of `text`, cut at a word boundary, for listing cards."""
+    text = ' '.join((text or '').split())
+    if len(text) <= length:
+        return text
+    cut = text[:length + 1]
+    cut = cut.rsplit(' ', 1)[0] if ' ' in cut else cut[:length]
+    return cut.rstrip(' .,;:') + '...'
+
 # -------------------- USER MODEL --------------------
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -42,10 +56,18 @@ class Blog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), index=True, nullable=False)
     content = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(SUMMARY_LENGTH + 3))  # listing snippet, set from content
     image = db.Column(db.String(200), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    version = db.query_expression()  # sync_change.seq, filled in by listing queries for card caching
+
+    @validates('content')
+    def _summarize(self, key, value):
+        self.summary = make_summary(value)
+        return value
+
     def __repr__(self):
         return f"<Blog {self.title}>"
 
@@ -55,6 +77,7 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), index=True, nullable=False)
     description = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(SUMMARY_LENGTH + 3))  # listing snippet, set from description
     price = db.Column(db.Float, default=0.0, nullable=False)
     discount = db.Column(db.Float, default=0.0)
     category = db.Column(db.String(100), nullable=True)
@@ -63,6 +86,13 @@ class Product(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    version = db.query_expression()  # sync_change.seq, filled in by listing queries for card caching
+
+    @validates('description')
+    def _summarize(self, key, value):
+        self.summary = make_summary(value)
+        return value
+
     def final_price(self):
         """Return the price after discount (if any)."""
         if self.discount and self.discount > 0:
@@ -89,7 +119,7 @@ class Product(db.Model):
 # -------------------- CART MODEL --------------------
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -124,7 +154,10 @@ class Order(db.Model):
     order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
 
     def calculate_total(self):
-        return sum(item.total() for item in self.order_items)
+        """Sum of item totals, aggregated in SQL instead of loading order_items."""
+        return db.session.query(
+            db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.price), 0.0)
+        ).filter(OrderItem.order_id == self.id).scalar()
 
     def __repr__(self):
         return f"<Order User:{self.user_id} Total:{self.total_amount} Status:{self.status}>"
@@ -154,7 +187,7 @@ class Expert(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20))
     education = db.Column(db.String(200))
-    specialization = db.Column(db.String(200))
+    specialization = db.Column(db.String(200), index=True)
     experience_years = db.Column(db.Integer, default=0)
     bio = db.Column(db.Text)
     image_filename = db.Column(db.String(200))
@@ -162,28 +195,66 @@ class Expert(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     consultations = db.relationship('Consultation', backref='expert', lazy=True)
+    rank = db.relationship('ExpertRank', uselist=False, lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (db.Index('ix_expert_verified_experience', 'is_verified', 'experience_years'),)
 
     def __repr__(self):
         return f"<Expert {self.name}>"
 
 
+# -------------------- EXPERT RANK MODEL --------------------
+class ExpertRank(db.Model):
+    """Precomputed directory ranking, refreshed in the background by directory.refresh_rankings()."""
+    expert_id = db.Column(db.Integer, db.ForeignKey('expert.id'), primary_key=True)
+    score = db.Column(db.Float, default=0.0, nullable=False, index=True)
+    resolved_count = db.Column(db.Integer, default=0, nullable=False)
+    avg_response_hours = db.Column(db.Float, nullable=True)
+    # inputs the score was computed from, so profile edits mark the row stale
+    is_verified = db.Column(db.Boolean, default=False)
+    experience_years = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ExpertRank Expert:{self.expert_id} Score:{self.score:.2f}>"
+
+
 # -------------------- FORUM POST MODEL --------------------
 class ForumPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), index=True, nullable=False)
     content = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(SUMMARY_LENGTH + 3))  # listing snippet, set from content
     image_filename = db.Column(db.String(100))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    likes_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # maintained by likes.py
+
     replies = db.relationship('ForumReply', backref='post', cascade='all, delete-orphan', lazy=True)
     likes = db.relationship('Like', primaryjoin="Like.post_id==ForumPost.id", viewonly=True, lazy=True)
 
+    # filled in by listing queries (listings.threads) so cards don't COUNT one by one
+    reply_total = db.query_expression()
+    version = db.query_expression()  # sync_change.seq, for card caching
+
+    @validates('content')
+    def _summarize(self, key, value):
+        self.summary = make_summary(value)
+        return value
+
     def reply_count(self):
-        return len(self.replies)
+        if self.reply_total is not None:
+            return self.reply_total
+        # COUNT(*) instead of len(self.replies), which would load every reply; archived replies count too
+        hot = db.session.query(db.func.count(ForumReply.id)).filter(ForumReply.post_id == self.id).scalar()
+        cold = db.session.query(db.func.count(ArchivedForumReply.id)).filter(
+            ArchivedForumReply.post_id == self.id).scalar()
+        return hot + cold
 
     def like_count(self):
-        return Like.query.filter_by(post_id=self.id).count()
+        from likes import likes
+        return likes.count('post', self.id, self.likes_count)
 
     def __repr__(self):
         return f"<ForumPost {self.title}>"
@@ -196,11 +267,16 @@ class ForumReply(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    likes_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # maintained by likes.py
 
     likes = db.relationship('Like', primaryjoin="Like.reply_id==ForumReply.id", viewonly=True, lazy=True)
 
+    # thread pages read replies in (created_at, id) order, see threads.py
+    __table_args__ = (db.Index('ix_forum_reply_post_created', 'post_id', 'created_at', 'id'),)
+
     def like_count(self):
-        return Like.query.filter_by(reply_id=self.id).count()
+        from likes import likes
+        return likes.count('reply', self.id, self.likes_count)
 
     def __repr__(self):
         return f"<ForumReply {self.id}>"
@@ -210,10 +286,16 @@ class ForumReply(db.Model):
 class Like(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'), nullable=True)
-    reply_id = db.Column(db.Integer, db.ForeignKey('forum_reply.id'), nullable=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'), nullable=True, index=True)
+    reply_id = db.Column(db.Integer, db.ForeignKey('forum_reply.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # one like per user per post/reply (NULLs don't collide, so each constraint only binds its own kind)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='uq_like_user_post'),
+        db.UniqueConstraint('user_id', 'reply_id', name='uq_like_user_reply'),
+    )
+
     def __repr__(self):
         return f"<Like user={self.user_id} post={self.post_id} reply={self.reply_id}>"
 
@@ -222,20 +304,223 @@ class Like(db.Model):
 class Consultation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     farmer_name = db.Column(db.String(120), nullable=False)
-    farmer_email = db.Column(db.String(120), nullable=True)
+    farmer_email = db.Column(db.String(120), nullable=True, index=True)
     problem = db.Column(db.Text, nullable=False)
 
     response = db.Column(db.Text, nullable=True)
-    expert_id = db.Column(db.Integer, db.ForeignKey('expert.id'), nullable=True)
+    expert_id = db.Column(db.Integer, db.ForeignKey('expert.id'), nullable=True, index=True)
 
-    status = db.Column(db.String(20), default='Pending')
+    status = db.Column(db.String(20), default='Pending', index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f"<Consultation {self.farmer_name} - {self.status}>"
 
 
+# -------------------- SALES ANALYTICS MODELS --------------------
+class SalesDaily(db.Model):
+    """Materialized sales per product per day, refreshed by analytics.refresh_summaries()."""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    category = db.Column(db.String(100), index=True)
+    seller_id = db.Column(db.Integer, index=True)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    gross_revenue = db.Column(db.Float, default=0.0, nullable=False)  # at list price, before discount
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('day', 'product_id', name='uq_sales_daily_day_product'),)
+
+    def __repr__(self):
+        return f"<SalesDaily {self.day} Product:{self.product_id} Revenue:{self.revenue}>"
+
+
+class OrderStatusChange(db.Model):
+    """Orders whose status changed since the last analytics refresh, with the status they had before.
+
+    Written by a SQLite trigger, so changes made outside the app (an admin
+    marking an order Failed in the DB) are caught too. Only the first change
+    per order is kept until analytics.refresh_summaries() folds it in.
+    """
+    order_id = db.Column(db.Integer, primary_key=True)
+    old_status = db.Column(db.String(50))
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<OrderStatusChange Order:{self.order_id} was {self.old_status}>"
+
+
+_ORDER_STATUS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS order_status_change AFTER UPDATE OF status ON "order"
+WHEN old.status IS NOT new.status BEGIN
+    INSERT OR IGNORE INTO order_status_change (order_id, old_status, changed_at)
+    VALUES (old.id, old.status, CURRENT_TIMESTAMP);
+END
+"""
+event.listen(db.metadata, 'after_create', DDL(_ORDER_STATUS_TRIGGER).execute_if(dialect='sqlite'))
+
+
+class AnalyticsState(db.Model):
+    """Key/value checkpoints for incremental refreshes (e.g. last processed Order.id)."""
+    key = db.Column(db.String(80), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AnalyticsState {self.key}={self.value}>"
+
+
+# -------------------- MODERATION JOBS --------------------
+class ModerationJob(db.Model):
+    """A bulk delete from /admin/moderation, worked through in chunks by moderation.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # blogs | products | threads | replies
+    criteria = db.Column(db.Text, nullable=False)  # JSON: ids, user_id, since, until
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued | running | done | failed
+    total = db.Column(db.Integer, default=0, nullable=False)  # matching rows when queued
+    deleted = db.Column(db.Integer, default=0, nullable=False)
+    dependents = db.Column(db.Integer, default=0, nullable=False)  # likes, replies and cart rows removed with them
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def progress(self):
+        """Percentage done, for the admin page and the JSON status."""
+        if self.status == 'done':
+            return 100
+        return min(99, round(100 * self.deleted / self.total)) if self.total else 0
+
+    def __repr__(self):
+        return f"<ModerationJob {self.id} {self.kind} {self.status} {self.deleted}/{self.total}>"
+
+
+# -------------------- ARCHIVE MODELS --------------------
+ARCHIVE_SCHEMA = 'archive'  # the archive SQLite file, ATTACHed to every connection (see archive.py)
+
+
+def _archive_table(model, *indexes):
+    """The hot table's columns in the archive schema, without foreign keys (their targets stay hot)."""
+    columns = [db.Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+               for c in model.__table__.columns]
+    return db.Table(model.__tablename__, db.metadata, *columns, *indexes, schema=ARCHIVE_SCHEMA)
+
+
+class ArchivedConsultation(db.Model):
+    """Resolved consultations moved out of the hot table by archive.py. Read-only."""
+    __table__ = _archive_table(
+        Consultation,
+        db.Index('ix_archived_consultation_email', 'farmer_email'),
+        db.Index('ix_archived_consultation_expert', 'expert_id'),
+    )
+    expert = db.relationship('Expert', primaryjoin='foreign(ArchivedConsultation.expert_id) == Expert.id',
+                             viewonly=True, lazy=True)
+
+    def __repr__(self):
+        return f"<ArchivedConsultation {self.id} {self.farmer_name}>"
+
+
+class ArchivedOrder(db.Model):
+    """Old orders moved out of the hot table by archive.py, with their items. Read-only."""
+    __table__ = _archive_table(Order, db.Index('ix_archived_order_user', 'user_id'))
+    order_items = db.relationship('ArchivedOrderItem',
+                                  primaryjoin='ArchivedOrder.id == foreign(ArchivedOrderItem.order_id)',
+                                  viewonly=True, lazy=True)
+
+    def calculate_total(self):
+        return sum(item.total() for item in self.order_items)
+
+    def __repr__(self):
+        return f"<ArchivedOrder {self.id} User:{self.user_id} Total:{self.total_amount}>"
+
+
+class ArchivedOrderItem(db.Model):
+    __table__ = _archive_table(OrderItem, db.Index('ix_archived_order_item_order', 'order_id'))
+    product = db.relationship('Product', primaryjoin='foreign(ArchivedOrderItem.product_id) == Product.id',
+                              viewonly=True, lazy=True)
+
+    def total(self):
+        return self.quantity * self.price
+
+    def __repr__(self):
+        return f"<ArchivedOrderItem Order:{self.order_id} Product:{self.product_id} Qty:{self.quantity}>"
+
+
+class ArchivedForumReply(db.Model):
+    """Replies of threads that went quiet, moved out by archive.py. The threads themselves stay hot."""
+    __table__ = _archive_table(
+        ForumReply, db.Index('ix_archived_forum_reply_post_created', 'post_id', 'created_at', 'id'))
+
+    def __repr__(self):
+        return f"<ArchivedForumReply {self.id}>"
+
+
+# -------------------- TRENDING CHECKPOINT --------------------
+class TrendingScore(db.Model):
+    """Checkpointed decayed scores, see trending.py. `score` is scaled to the start of `epoch`."""
+    kind = db.Column(db.String(20), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, default=0.0, nullable=False)
+    epoch = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_trending_kind_epoch_score', 'kind', 'epoch', 'score'),)
+
+    def __repr__(self):
+        return f"<TrendingScore {self.kind}:{self.item_id} {self.score:.2f}@{self.epoch}>"
+
+
+# -------------------- SYNC CHANGE LOG --------------------
+class SyncChange(db.Model):
+    """Latest change per synced row, for the /api/v1 `?since=` feeds (see api.py).
+
+    Written by SQLite triggers rather than ORM events, so bulk and core
+    updates (stock on checkout, likes_count flushes) are recorded too. `seq`
+    increases per kind on every change; a delete leaves the row behind as a
+    tombstone (op='delete').
+    """
+    kind = db.Column(db.String(20), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    op = db.Column(db.String(10), nullable=False)  # upsert | delete
+    seq = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_sync_change_kind_seq', 'kind', 'seq', unique=True),)
+
+    def __repr__(self):
+        return f"<SyncChange {self.kind}:{self.item_id} {self.op}@{self.seq}>"
+
+
+SYNCED_TABLES = {'products': 'product', 'blogs': 'blog', 'threads': 'forum_post', 'experts': 'expert'}
+
+_SYNC_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS sync_{table}_{name} AFTER {event} ON {table} BEGIN
+    INSERT INTO sync_change (kind, item_id, op, seq, changed_at)
+    VALUES ('{kind}', {row}.id, '{op}',
+            (SELECT coalesce(max(seq), 0) + 1 FROM sync_change WHERE kind = '{kind}'), CURRENT_TIMESTAMP)
+    ON CONFLICT (kind, item_id) DO UPDATE SET op = excluded.op, seq = excluded.seq, changed_at = excluded.changed_at;
+END
+"""
+
+# Rows that predate the log get one entry each, so `since=0` returns everything.
+_SYNC_BACKFILL = """
+INSERT INTO sync_change (kind, item_id, op, seq, changed_at)
+SELECT '{kind}', id, 'upsert', row_number() OVER (ORDER BY id), CURRENT_TIMESTAMP FROM {table}
+WHERE NOT EXISTS (SELECT 1 FROM sync_change WHERE kind = '{kind}')
+"""
+
+# On the metadata rather than the table, so the synced tables exist first and
+# every create_all() (db-init on an existing database too) installs missing triggers.
+for _kind, _table in SYNCED_TABLES.items():
+    event.listen(db.metadata, 'after_create',
+                 DDL(_SYNC_BACKFILL.format(kind=_kind, table=_table)).execute_if(dialect='sqlite'))
+    for _event, _row, _op in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'), ('DELETE', 'OLD', 'delete')):
+        event.listen(db.metadata, 'after_create', DDL(_SYNC_TRIGGER.format(
+            table=_table, name=_event.lower(), event=_event, kind=_kind, row=_row, op=_op)).execute_if(dialect='sqlite'))
+
+
 # -------------------- INIT DATABASE --------------------
 def init_db(app):
     with app.app_context():
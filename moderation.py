@@ -0,0 +1,218 @@
+"""
+Bulk moderation: set-based deletes in short, chunked transactions.
+
+queue() records a ModerationJob for the rows picked by an id list and/or an
+author and created_at range. run_pending() (a background task on the
+primary worker) works through queued jobs CHUNK_SIZE rows at a time. Each
+chunk is one transaction of plain `DELETE ... WHERE id IN (...)` statements
+for the rows and everything hanging off them (likes, replies, cart rows,
+trending checkpoints); replies are deleted from the archive too. It
+commits before the next chunk, so other writers get the SQLite write lock
+in between. A run stops after RUN_BUDGET seconds and continues on the
+next tick. Progress is saved on the job after every chunk, so any worker
+can report it.
+
+Chunks are picked by re-running the job's criteria, so a job cut short by a
+restart just carries on.
+"""
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import (db, ArchivedForumReply, Blog, Cart, ForumPost, ForumReply, Like, ModerationJob, Product,
+                    TrendingScore)
+
+CHUNK_SIZE = 500
+CHUNK_PAUSE = 0.02  # seconds between chunks, for writers queued on the lock
+RUN_BUDGET = 2.0  # seconds of deleting per background tick
+MAX_IDS = 10000
+
+KINDS = {'blogs': Blog, 'products': Product, 'threads': ForumPost, 'replies': ForumReply}
+ARCHIVED = {'replies': ArchivedForumReply}  # kinds whose old rows live in the archive too (ids are unique across both)
+
+
+class ModerationError(ValueError):
+    pass
+
+
+# -------------------- CRITERIA --------------------
+def parse_criteria(ids=None, user_id=None, since=None, until=None):
+    """Validated criteria dict from form/JSON/CLI values. `until` is inclusive. Raises ModerationError."""
+    criteria = {}
+    if ids:
+        if isinstance(ids, str):
+            try:
+                ids = [int(part) for part in ids.replace(',', ' ').split()]
+            except ValueError:
+                raise ModerationError('ids must be integers separated by commas or spaces')
+        if len(ids) > MAX_IDS:
+            raise ModerationError(f'at most {MAX_IDS} ids per job, use a user or date filter for more')
+        criteria['ids'] = sorted(set(int(i) for i in ids))
+    if user_id not in (None, ''):
+        try:
+            criteria['user_id'] = int(user_id)
+        except (TypeError, ValueError):
+            raise ModerationError('user_id must be an integer')
+    for key, value in (('since', since), ('until', until)):
+        if value:
+            try:
+                criteria[key] = date.fromisoformat(str(value)).isoformat()
+            except ValueError:
+                raise ModerationError(f'{key} must be a date (YYYY-MM-DD)')
+    if not criteria:
+        raise ModerationError('give ids, a user or a date range; refusing to delete everything')
+    return criteria
+
+
+def matching(kind, criteria):
+    """Query of the ids a job's criteria select, hot and archived."""
+    query = _matching(KINDS[kind], criteria)
+    if kind in ARCHIVED:
+        query = query.union_all(_matching(ARCHIVED[kind], criteria))
+    return query
+
+
+def _matching(model, criteria):
+    query = db.session.query(model.id)
+    if 'ids' in criteria:
+        query = query.filter(model.id.in_(criteria['ids']))
+    if 'user_id' in criteria:
+        query = query.filter(model.user_id == criteria['user_id'])
+    if 'since' in criteria:
+        query = query.filter(model.created_at >= date.fromisoformat(criteria['since']))
+    if 'until' in criteria:
+        query = query.filter(model.created_at < date.fromisoformat(criteria['until']) + timedelta(days=1))
+    return query
+
+
+# -------------------- DELETES --------------------
+def _thread_dependents(ids):
+    replies = select(ForumReply.id).where(ForumReply.post_id.in_(ids))
+    archived = select(ArchivedForumReply.id).where(ArchivedForumReply.post_id.in_(ids))
+    removed = Like.query.filter(or_(Like.post_id.in_(ids), Like.reply_id.in_(replies),
+                                    Like.reply_id.in_(archived))).delete(synchronize_session=False)
+    removed += ForumReply.query.filter(ForumReply.post_id.in_(ids)).delete(synchronize_session=False)
+    removed += ArchivedForumReply.query.filter(ArchivedForumReply.post_id.in_(ids)).delete(
+        synchronize_session=False)
+    TrendingScore.query.filter(TrendingScore.kind == 'thread', TrendingScore.item_id.in_(ids)).delete(
+        synchronize_session=False)
+    return removed
+
+
+def _reply_dependents(ids):
+    return Like.query.filter(Like.reply_id.in_(ids)).delete(synchronize_session=False)
+
+
+def _product_dependents(ids):
+    # order items stay: they are the order history
+    removed = Cart.query.filter(Cart.product_id.in_(ids)).delete(synchronize_session=False)
+    TrendingScore.query.filter(TrendingScore.kind == 'product', TrendingScore.item_id.in_(ids)).delete(
+        synchronize_session=False)
+    return removed
+
+
+DEPENDENTS = {
+    'blogs': lambda ids: 0,
+    'products': _product_dependents,
+    'threads': _thread_dependents,
+    'replies': _reply_dependents,
+}
+
+
+def delete_chunk(kind, ids):
+    """DELETE the rows and their dependents in the current transaction. Returns (rows, dependents)."""
+    dependents = DEPENDENTS[kind](ids)
+    deleted = 0
+    for model in (KINDS[kind], ARCHIVED.get(kind)):
+        if model is not None:
+            deleted += model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    return deleted, dependents
+
+
+def delete_rows(kind, ids):
+    """Delete a few rows with their dependents in one transaction (the single-item admin buttons)."""
+    result = delete_chunk(kind, list(ids))
+    db.session.commit()
+    return result
+
+
+# -------------------- JOBS --------------------
+def queue(kind, criteria, user_id=None):
+    """Record a job for the background runner. Returns the ModerationJob."""
+    if kind not in KINDS:
+        raise ModerationError(f"kind must be one of {', '.join(KINDS)}")
+    job = ModerationJob(kind=kind, criteria=json.dumps(criteria), created_by=user_id,
+                        total=matching(kind, criteria).count())
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_job(job, budget=RUN_BUDGET, chunk_size=CHUNK_SIZE, progress=None):
+    """Delete the job's rows chunk by chunk for up to `budget` seconds (None = until done). Returns the job."""
+    started = time.monotonic()
+    model = KINDS[job.kind]
+    criteria = json.loads(job.criteria)
+    if job.status == 'queued':
+        job.status = 'running'
+        db.session.commit()
+    while True:
+        ids = [row[0] for row in matching(job.kind, criteria).order_by(model.id).limit(chunk_size)]
+        if not ids:
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            break
+        try:
+            deleted, dependents = delete_chunk(job.kind, ids)
+            if not deleted:
+                raise ModerationError(f'rows {ids[0]}..{ids[-1]} matched but could not be deleted')
+            job.deleted += deleted
+            job.dependents += dependents
+            db.session.commit()
+        except (SQLAlchemyError, ModerationError) as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            break
+        if progress is not None:
+            progress(job)
+        if budget is not None and time.monotonic() - started >= budget:
+            break
+        time.sleep(CHUNK_PAUSE)
+    return job
+
+
+def run_pending(budget=RUN_BUDGET):
+    """Work on unfinished jobs, oldest first, for up to `budget` seconds. Returns rows deleted."""
+    started = time.monotonic()
+    deleted = 0
+    jobs = ModerationJob.query.filter(ModerationJob.status.in_(['queued', 'running'])).order_by(ModerationJob.id)
+    for job in jobs.all():
+        before = job.deleted
+        run_job(job, budget=budget - (time.monotonic() - started))
+        deleted += job.deleted - before
+        if time.monotonic() - started >= budget:
+            break
+    return deleted
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'criteria': json.loads(job.criteria),
+        'status': job.status,
+        'total': job.total,
+        'deleted': job.deleted,
+        'dependents': job.dependents,
+        'progress': job.progress(),
+        'error': job.error,
+        'created_at': job.created_at.isoformat(timespec='seconds') if job.created_at else None,
+        'finished_at': job.finished_at.isoformat(timespec='seconds') if job.finished_at else None,
+    }
@@ -0,0 +1,132 @@
+"""
+Cart and order pricing.
+
+Line prices and totals are computed in SQL (discount applied in the query)
+instead of lazy-loading every cart item's product in Python. The result is
+kept as a per-user CartSnapshot, reused while the user's cart version is
+unchanged: the cart rows plus each product's sync_change seq, which the
+SQLite triggers bump on every product write. Any cart mutation or price
+change, in any worker process, therefore gives a new version and a fresh
+snapshot.
+
+The checkout page carries the snapshot's token in its form. place_order
+refuses an order whose token no longer matches, so the customer is never
+charged anything but the prices they confirmed.
+"""
+import collections
+import hashlib
+import threading
+from collections import namedtuple
+
+from sqlalchemy import case, func
+
+import metrics
+from models import db, Cart, Product, SyncChange
+
+MAX_CARTS = 10000  # snapshots kept per process, least recently used dropped first
+
+CartLine = namedtuple('CartLine', 'cart_id product_id name quantity unit_price line_total stock')
+
+
+class CartSnapshot:
+    """Priced contents of one user's cart at a point in time."""
+
+    def __init__(self, user_id, lines, version=None):
+        self.user_id = user_id
+        self.lines = lines
+        self.version = version
+        self.total = round(sum(line.line_total for line in lines), 2)
+        priced = repr([(line.cart_id, line.product_id, line.quantity, line.unit_price) for line in lines])
+        self.token = hashlib.sha1(priced.encode()).hexdigest()[:16]  # what the checkout form confirms
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __repr__(self):
+        return f"<CartSnapshot User:{self.user_id} Lines:{len(self.lines)} Total:{self.total}>"
+
+
+def final_price_expr():
+    """SQL equivalent of Product.final_price()."""
+    return case(
+        (Product.discount > 0, func.round(Product.price * (1 - Product.discount / 100.0), 2)),
+        else_=Product.price,
+    )
+
+
+def cart_version(user_id):
+    """The user's cart rows and their products' sync_change seqs; changes with any cart or product write."""
+    rows = (
+        db.session.query(Cart.id, Cart.product_id, Cart.quantity, SyncChange.seq)
+        .outerjoin(SyncChange, (SyncChange.kind == 'products') & (SyncChange.item_id == Cart.product_id))
+        .filter(Cart.user_id == user_id)
+        .order_by(Cart.id)
+        .all()
+    )
+    return tuple(tuple(row) for row in rows)
+
+
+def price_cart(user_id, version=None):
+    """Price a user's cart with one joined query."""
+    unit_price = final_price_expr().label('unit_price')
+    rows = (
+        db.session.query(
+            Cart.id, Cart.product_id, Product.name, Cart.quantity, unit_price,
+            (Cart.quantity * unit_price).label('line_total'), Product.stock,
+        )
+        .join(Product, Product.id == Cart.product_id)
+        .filter(Cart.user_id == user_id)
+        .order_by(Cart.added_at, Cart.id)
+        .all()
+    )
+    return CartSnapshot(user_id, [CartLine(*row) for row in rows], version)
+
+
+class PricingService:
+    """Thread-safe per-process LRU of CartSnapshots keyed by user id, checked against cart_version()."""
+
+    def __init__(self, size=MAX_CARTS):
+        self.size = size
+        self._snapshots = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cart_snapshot(self, user_id):
+        version = cart_version(user_id)
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            hit = snapshot is not None and snapshot.version == version
+            if hit:
+                self._snapshots.move_to_end(user_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.CACHE_REQUESTS.inc('cart_snapshot', 'hit' if hit else 'miss')
+        if hit:
+            return snapshot
+
+        # priced after the version was read, so a concurrent write only makes the next lookup miss
+        snapshot = price_cart(user_id, version)
+        with self._lock:
+            self._snapshots[user_id] = snapshot
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.size:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def cart_total(self, user_id):
+        return self.cart_snapshot(user_id).total
+
+    def invalidate(self, user_id):
+        """Drop a user's snapshot now (a changed version would replace it on the next lookup anyway)."""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'cached_carts': len(self._snapshots), 'size': self.size, 'hits': self.hits,
+                    'misses': self.misses}
+
+
+pricing = PricingService()
@@ -0,0 +1,215 @@
+"""
+On-demand sampling profiler for single requests.
+
+A request is profiled when an admin asks for it (`?_profile=1` or an
+`X-Profile: 1` header) or when it falls in the PROFILE_SAMPLE_RATE share of
+traffic. While at least one profiled request is running, a sampler thread
+reads the request thread's stack every PROFILE_INTERVAL_MS milliseconds.
+Nothing is sampled otherwise.
+
+Every sample is put in one bucket: `sql` if SQLAlchemy is anywhere on the
+stack (a lazy load inside a template counts as SQL), `jinja` if a template
+or Jinja itself is, `python` for the rest. The bucket is the root frame of
+the collapsed stacks, so a flamegraph splits on it.
+
+Each profile is written to PROFILE_DIR as <name>.folded (collapsed stacks,
+"frame;frame;frame count" per line, for flamegraph.pl or speedscope) and
+<name>.json (request, timings, breakdown). /admin/profiles lists them.
+"""
+import collections
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+CATEGORIES = ('sql', 'jinja', 'python')
+TEMPLATE_SUFFIXES = ('.html', '.jinja', '.j2', '.txt')
+_SQL_PATH = f'{os.sep}sqlalchemy{os.sep}'
+_JINJA_PATH = f'{os.sep}jinja2{os.sep}'
+
+
+# -------------------- SAMPLING --------------------
+class Profile:
+    """Collapsed stacks of one request's thread."""
+
+    def __init__(self, thread_id, reason):
+        self.thread_id = thread_id
+        self.reason = reason
+        self.stacks = collections.Counter()
+        self.breakdown = dict.fromkeys(CATEGORIES, 0)
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+
+    def add(self, frame):
+        labels = []
+        category = 'python'
+        while frame is not None:
+            code = frame.f_code
+            filename = code.co_filename
+            if _SQL_PATH in filename:
+                category = 'sql'
+            elif category == 'python' and (filename.endswith(TEMPLATE_SUFFIXES) or _JINJA_PATH in filename):
+                category = 'jinja'
+            labels.append(_label(frame))
+            if code.co_name == 'wsgi_app' and frame.f_globals.get('__name__') == 'flask.app':
+                break  # the server and thread pool frames below are the same for every request
+            frame = frame.f_back
+        labels.append(category)
+        self.stacks[';'.join(reversed(labels))] += 1
+        self.breakdown[category] += 1
+
+
+def _label(frame):
+    code = frame.f_code
+    if code.co_filename.endswith(TEMPLATE_SUFFIXES):  # compiled template code keeps the template's path
+        return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+
+
+class Sampler:
+    """One daemon thread per process, idle unless a profile is running."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, profile):
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._thread is None or not self._thread.is_alive():  # also after a fork
+                self._thread = threading.Thread(target=self._run, name='agrifarma-profiler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def stop(self, profile):
+        """Stop sampling the profile. Once this returns, no sample is being added to it."""
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:  # held while adding, so stop() waits out a sample in progress
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for profile in self._active.values():
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None:
+                        profile.add(frame)
+                del frames
+            time.sleep(self.interval)
+
+
+sampler = Sampler()
+
+
+# -------------------- FILES --------------------
+def write_profile(directory, profile, meta, keep):
+    """Write <name>.folded and <name>.json, then drop all but the newest `keep` profiles. Returns the name."""
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', meta['endpoint'] or 'unmatched')
+    name = f"{profile.started_at:%Y%m%d-%H%M%S-%f}-{os.getpid()}-{endpoint}"
+    with open(os.path.join(directory, name + '.folded'), 'w') as f:
+        f.writelines(f'{stack} {count}\n' for stack, count in profile.stacks.most_common())
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        json.dump(dict(meta, name=name), f)
+    for old in list_profiles(directory)[keep:]:
+        for suffix in ('.folded', '.json'):
+            try:
+                os.unlink(os.path.join(directory, old['name'] + suffix))
+            except FileNotFoundError:  # another worker pruned it
+                pass
+    return name
+
+
+def list_profiles(directory):
+    """Profile metadata, newest first."""
+    profiles = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p['name'], reverse=True)
+
+
+def profile_path(directory, name):
+    """Path of a profile's .folded file, or None for names that are not ours."""
+    if not re.fullmatch(r'[A-Za-z0-9_.-]+', name):
+        return None
+    path = os.path.join(directory, name + '.folded')
+    return path if os.path.exists(path) else None
+
+
+# -------------------- FLASK --------------------
+def _wanted():
+    """'requested', 'sampled' or None for the current request."""
+    if request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1':
+        if current_user.is_authenticated and current_user.is_admin():
+            return 'requested'
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if rate and random.random() < rate:
+        return 'sampled'
+    return None
+
+
+def _before_request():
+    if request.endpoint == 'static':
+        return
+    reason = _wanted()
+    if reason is not None:
+        g.profile = Profile(threading.get_ident(), reason)
+        sampler.start(g.profile)
+
+
+def _after_request(response):
+    if 'profile' in g:
+        g.profile_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    sampler.stop(profile)
+    samples = sum(profile.breakdown.values())
+    config = current_app.config
+    meta = {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': 500 if exc is not None else g.get('profile_status', 500),
+        'reason': profile.reason,
+        'started_at': profile.started_at.isoformat(timespec='seconds'),
+        'duration_ms': round((time.perf_counter() - profile.started) * 1000, 1),
+        'samples': samples,
+        'interval_ms': config['PROFILE_INTERVAL_MS'],
+        'breakdown': {k: round(100 * v / samples, 1) if samples else 0 for k, v in profile.breakdown.items()},
+    }
+    try:
+        write_profile(config['PROFILE_DIR'], profile, meta, config['PROFILE_KEEP'])
+    except OSError:
+        current_app.logger.exception('could not write request profile')
+
+
+def init_app(app):
+    """Register the profiling hooks. Call after metrics.init_app() so the metrics timer stays outermost."""
+    sampler.interval = app.config['PROFILE_INTERVAL_MS'] / 1000
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
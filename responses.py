@@ -0,0 +1,221 @@
+"""
+Response delivery: compression middleware and streamed page rendering.
+
+Compressor wraps the WSGI app, so it sees streamed responses as well as
+buffered ones. It negotiates brotli (when the optional `brotli` package is
+installed) or gzip from Accept-Encoding and compresses text-like bodies:
+
+- a buffered response (it has a Content-Length) is left alone under
+  COMPRESS_MIN_SIZE bytes and otherwise compressed in one go;
+- a streamed response (no Content-Length, e.g. render_page() with
+  STREAM_TEMPLATES on) is compressed chunk by chunk with a sync flush
+  after each, so every chunk the app yields reaches the browser at once.
+
+render_page() is render_template() for the big listing pages. With
+STREAM_TEMPLATES on it streams the page, starting with a STREAM_BUFFER
+piece, so the <head> and page header are on the wire while the cards are
+still being rendered.
+"""
+import threading
+import zlib
+
+from flask import current_app, render_template, stream_template
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+SKIP_STATUS = (204, 206, 304)
+STREAM_BUFFER = 8192  # characters of template output in the first streamed chunk
+STREAM_BUFFER_MAX = 65536  # later chunks grow to this, fewer writes and compressor flushes
+
+
+# -------------------- CODECS --------------------
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, module, quality):
+        self._c = module.Compressor(quality=quality, mode=module.MODE_TEXT)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+def _load_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+# -------------------- MIDDLEWARE --------------------
+class Compressor:
+    def __init__(self, wsgi_app, min_size=1024, gzip_level=6, brotli_quality=4, use_brotli=True):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli = _load_brotli() if use_brotli else None
+        self._lock = threading.Lock()
+        self._stats = {'responses': 0, 'compressed': 0, 'streamed': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def choose(self, accept_encoding):
+        """'br', 'gzip' or None for an Accept-Encoding header."""
+        accepted = parse_accept_header(accept_encoding)
+        br = accepted.quality('br') if self.brotli else 0
+        gzip = accepted.quality('gzip')
+        if br and br >= gzip:
+            return 'br'
+        return 'gzip' if gzip else None
+
+    def codec(self, encoding):
+        if encoding == 'br':
+            return _Brotli(self.brotli, self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            encoding = None
+        plan = {}
+
+        def intercept(status, headers, exc_info=None):
+            plan['mode'] = mode = self._mode(status, headers, encoding)
+            if mode in ('stream', 'buffer'):
+                headers = [(k, v) for k, v in headers if k.lower() != 'content-length']
+                headers = _weaken_etag(headers)
+                headers.append(('Content-Encoding', encoding))
+            if mode is not None:
+                headers = _add_vary(headers)
+            if mode == 'buffer':  # start_response is sent once the compressed length is known
+                plan['status'], plan['headers'], plan['body'] = status, headers, []
+                return plan['body'].append
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, intercept)
+        mode = plan.get('mode')
+        self._count(responses=1)
+        if mode == 'stream':
+            self._count(compressed=1, streamed=1)
+            return ClosingIterator(self._stream(app_iter, self.codec(encoding)), getattr(app_iter, 'close', None))
+        if mode == 'buffer':
+            try:
+                data = b''.join(plan['body']) + b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            codec = self.codec(encoding)
+            body = codec.compress(data) + codec.finish()
+            self._count(compressed=1, bytes_in=len(data), bytes_out=len(body))
+            start_response(plan['status'], plan['headers'] + [('Content-Length', str(len(body)))])
+            return [body]
+        return app_iter
+
+    def _mode(self, status, headers, encoding):
+        """'stream', 'buffer', 'vary' (not compressed but could be) or None (leave alone)."""
+        code = int(status.split(None, 1)[0])
+        fields = {k.lower(): v for k, v in headers}
+        if code < 200 or code in SKIP_STATUS or 'content-encoding' in fields:
+            return None
+        if not fields.get('content-type', '').startswith(COMPRESSIBLE):
+            return None
+        if 'no-transform' in fields.get('cache-control', ''):
+            return None
+        length = fields.get('content-length')
+        if encoding is None or (length is not None and int(length) < self.min_size):
+            return 'vary'
+        return 'buffer' if length is not None else 'stream'
+
+    def _stream(self, app_iter, codec):
+        sent = received = 0
+        for chunk in app_iter:
+            if chunk:
+                out = codec.compress(chunk) + codec.flush()
+                received += len(chunk)
+                sent += len(out)
+                yield out
+        out = codec.finish()
+        self._count(bytes_in=received, bytes_out=sent + len(out))
+        yield out
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._stats[key] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        stats['brotli'] = self.brotli is not None
+        return stats
+
+
+def _add_vary(headers):
+    for i, (key, value) in enumerate(headers):
+        if key.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[i] = (key, f'{value}, Accept-Encoding')
+            return headers
+    return headers + [('Vary', 'Accept-Encoding')]
+
+
+def _weaken_etag(headers):
+    """A compressed body is a different representation; keep the tag but mark it weak."""
+    return [(k, f'W/{v}' if k.lower() == 'etag' and not v.startswith('W/') else v) for k, v in headers]
+
+
+def init_app(app):
+    """Wrap app.wsgi_app in a Compressor when COMPRESSION is on."""
+    if not app.config['COMPRESSION']:
+        return
+    compressor = Compressor(
+        app.wsgi_app,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        gzip_level=app.config['COMPRESS_LEVEL'],
+        brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'],
+    )
+    app.wsgi_app = compressor
+    app.extensions['compression'] = compressor
+
+
+# -------------------- STREAMED PAGES --------------------
+def render_page(template_name, **context):
+    """render_template(), or a streamed response of the same page when STREAM_TEMPLATES is on."""
+    if not current_app.config['STREAM_TEMPLATES']:
+        return render_template(template_name, **context)
+    stream = stream_template(template_name, **context)
+    # close() must reach the stream_with_context generator even if the body is never read (HEAD)
+    return current_app.response_class(ClosingIterator(_coalesce(stream), stream.close), mimetype='text/html')
+
+
+def _coalesce(chunks, size=STREAM_BUFFER, max_size=STREAM_BUFFER_MAX):
+    """Join Jinja's many small pieces into chunks worth a network write, doubling the chunk size as it goes."""
+    pending, length = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(pending)
+            pending, length = [], 0
+            size = min(size * 2, max_size)
+    if pending:
+        yield ''.join(pending)
@@ -0,0 +1,126 @@
+"""
+Automatic assignment of unassigned consultations to verified experts.
+
+Each pending consultation goes to the experts whose specialization shares
+the most keywords with the problem text; ties (and problems matching no
+one) go to whoever currently has the fewest pending consultations, tracked
+in a min-heap. assign_pending() runs in batches on the background runner.
+"""
+import heapq
+import re
+from collections import Counter, defaultdict
+
+from models import db, Expert, Consultation
+
+BATCH_SIZE = 200
+MAX_PENDING_PER_EXPERT = 25
+STOPWORDS = {
+    'and', 'the', 'for', 'with', 'are', 'was', 'has', 'have', 'from', 'that', 'this', 'not',
+    'but', 'all', 'any', 'can', 'how', 'what', 'why', 'when', 'our', 'your', 'they', 'them',
+    'there', 'their', 'its', 'also', 'very', 'some', 'into', 'please', 'help', 'problem',
+}
+
+
+def keywords(text):
+    """Lower-cased words of 3+ letters, stopwords dropped, trailing plural 's' stripped."""
+    words = set()
+    for word in re.findall(r'[a-z]{3,}', (text or '').lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+class LoadHeap:
+    """Min-heap of (pending count, expert id) with lazy deletion of outdated entries."""
+
+    def __init__(self, loads):
+        self.loads = dict(loads)
+        self._heap = [(load, expert_id) for expert_id, load in self.loads.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, expert_id, amount=1):
+        self.loads[expert_id] += amount
+        heapq.heappush(self._heap, (self.loads[expert_id], expert_id))
+
+    def least_loaded(self, max_load=None):
+        while self._heap:
+            load, expert_id = self._heap[0]
+            if load != self.loads[expert_id]:
+                heapq.heappop(self._heap)  # outdated entry
+                continue
+            if max_load is not None and load >= max_load:
+                return None
+            return expert_id
+        return None
+
+
+def route_batch(pending, experts, loads, max_load=MAX_PENDING_PER_EXPERT):
+    """
+    Pure routing step, shared by assign_pending() and the simulation benchmark.
+
+    pending: [(consultation_id, problem_text)] oldest first
+    experts: [(expert_id, specialization_text)]
+    loads:   {expert_id: current pending count}
+    Returns [(consultation_id, expert_id)]; consultations are left out when
+    every expert is at max_load.
+    """
+    if not experts:
+        return []
+    index = defaultdict(list)
+    for expert_id, specialization in experts:
+        for word in keywords(specialization):
+            index[word].append(expert_id)
+    heap = LoadHeap({expert_id: loads.get(expert_id, 0) for expert_id, _ in experts})
+
+    assignments = []
+    for consultation_id, problem in pending:
+        overlap = Counter()
+        for word in keywords(problem):
+            overlap.update(index.get(word, ()))
+        chosen = None
+        if overlap:
+            best = max(overlap.values())
+            candidates = [
+                expert_id for expert_id, hits in overlap.items()
+                if hits == best and (max_load is None or heap.loads[expert_id] < max_load)
+            ]
+            if candidates:
+                chosen = min(candidates, key=lambda expert_id: (heap.loads[expert_id], expert_id))
+        if chosen is None:
+            chosen = heap.least_loaded(max_load)
+            if chosen is None:
+                break  # everyone is full; the rest wait for the next tick
+        heap.add(chosen)
+        assignments.append((consultation_id, chosen))
+    return assignments
+
+
+def assign_pending(batch_size=BATCH_SIZE, max_load=MAX_PENDING_PER_EXPERT):
+    """Assign the oldest unassigned consultations to verified experts. Returns how many were assigned."""
+    experts = db.session.query(Expert.id, Expert.specialization).filter(Expert.is_verified.is_(True)).all()
+    if not experts:
+        return 0
+    loads = dict(
+        db.session.query(Consultation.expert_id, db.func.count(Consultation.id))
+        .filter(Consultation.expert_id.isnot(None), Consultation.status == 'Pending')
+        .group_by(Consultation.expert_id)
+        .all()
+    )
+    pending = (
+        db.session.query(Consultation.id, Consultation.problem)
+        .filter(Consultation.expert_id.is_(None), Consultation.status == 'Pending')
+        .order_by(Consultation.created_at, Consultation.id)
+        .limit(batch_size)
+        .all()
+    )
+    assignments = route_batch(pending, experts, loads, max_load=max_load)
+    for consultation_id, expert_id in assignments:
+        # guarded so a consultation someone picked up meanwhile is left alone
+        Consultation.query.filter(
+            Consultation.id == consultation_id, Consultation.expert_id.is_(None)
+        ).update({Consultation.expert_id: expert_id}, synchronize_session=False)
+    db.session.commit()
+    return len(assignments)
@@ -0,0 +1,498 @@
+"""
+Preforking multi-process server for production.
+
+    python server.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+    flask --app app serve --workers 4 --preload
+
+The arbiter binds the listening socket and forks --workers processes; each
+worker serves the shared socket from a fixed pool of --threads threads.
+Without --preload every worker imports and builds the app after the fork,
+so a reload picks up new code. With --preload the app is built once in the
+arbiter and shared copy-on-write (faster boot, less memory, but a reload
+only rebuilds the app object, it does not re-import modules).
+
+Workers exit after --max-requests (plus up to --max-requests-jitter so they
+don't all recycle together) and are replaced. Signals to the arbiter:
+
+    HUP        graceful reload: boot a new set of workers, drain the old ones
+    TERM, INT  graceful shutdown (in-flight requests finish)
+    QUIT       immediate shutdown
+    USR1       log per-worker stats
+
+Per-worker stats live in a shared memory scoreboard; worker_stats() reads
+it from any worker (see /admin/server). Each worker also writes its
+Prometheus metrics to a file in --metrics-dir, which /metrics on any worker
+adds up (see metrics.py).
+"""
+import argparse
+import importlib
+import logging
+import mmap
+import os
+import random
+import shutil
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import metrics
+import templating
+from config import Config
+
+log = logging.getLogger('agrifarma.server')
+
+WORKER_BOOT_ERROR = 3
+
+
+# -------------------- SCOREBOARD --------------------
+class Scoreboard:
+    """Fixed slots in anonymous shared memory, one per live worker."""
+
+    # pid, generation, requests, active, errors (5xx), booted_at, last_request_at
+    SLOT = struct.Struct('=iiQQQdd')
+    FIELDS = ('pid', 'generation', 'requests', 'active', 'errors', 'booted_at', 'last_request_at')
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._mem = mmap.mmap(-1, slots * self.SLOT.size)  # MAP_SHARED: visible across fork
+
+    def write(self, slot, *values):
+        self.SLOT.pack_into(self._mem, slot * self.SLOT.size, *values)
+
+    def clear(self, slot):
+        self.write(slot, 0, 0, 0, 0, 0, 0.0, 0.0)
+
+    def free_slot(self):
+        for slot in range(self.slots):
+            if self.SLOT.unpack_from(self._mem, slot * self.SLOT.size)[0] == 0:
+                return slot
+        return None
+
+    def snapshot(self):
+        rows = []
+        for slot in range(self.slots):
+            values = self.SLOT.unpack_from(self._mem, slot * self.SLOT.size)
+            if values[0] > 0:
+                rows.append(dict(zip(self.FIELDS, values), slot=slot))
+        return rows
+
+
+scoreboard = None
+
+
+def worker_stats():
+    """Stats for every live worker, or [] when not running under this server."""
+    return scoreboard.snapshot() if scoreboard is not None else []
+
+
+# -------------------- WORKER --------------------
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    access_log = False
+
+    def run_wsgi(self):
+        # counted here rather than around the app: werkzeug skips app_iter.close() when the client hangs up
+        worker = self.server.app
+        worker.request_started()
+        try:
+            super().run_wsgi()
+        finally:
+            worker.request_finished()
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server on an inherited socket, handling connections on a fixed thread pool.
+
+    A worker only accepts while it has an idle thread, so a busy worker leaves
+    new connections to its siblings instead of queueing them.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd, handler):
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='agrifarma-http')
+        self._idle = threading.Semaphore(threads)
+
+    def get_request(self):
+        self._idle.acquire()
+        try:
+            conn, addr = self.socket.accept()
+        except OSError:  # a sibling worker won the accept
+            self._idle.release()
+            raise
+        conn.setblocking(True)
+        return conn, addr
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._idle.release()
+
+
+class Worker:
+    def __init__(self, options, listener, slot, generation, background, app=None):
+        self.options = options
+        self.listener = listener
+        self.slot = slot
+        self.generation = generation
+        self.background = background
+        self.app = app
+        self.max_requests = 0
+        if options.max_requests > 0:
+            self.max_requests = options.max_requests + random.randint(0, max(options.max_requests_jitter, 0))
+        self.requests = self.active = self.errors = 0
+        self.booted_at = self.last_request_at = 0.0
+        self.server = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._ppid = os.getpid()  # built in the arbiter, which is the worker's parent
+
+    # runs in the child process
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        signal.signal(signal.SIGQUIT, lambda *_: os._exit(0))
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+        app = self.app
+        try:
+            if app is None:
+                app = load_app(self.options.app)
+            self._after_fork(app)
+        except Exception:
+            traceback.print_exc()
+            os._exit(WORKER_BOOT_ERROR)
+
+        host, port = self.listener.getsockname()[:2]
+        RequestHandler.access_log = self.options.access_log
+        RequestHandler.timeout = self.options.keepalive
+        self.server = PooledWSGIServer(host, port, self, self.options.threads, self.listener.fileno(), RequestHandler)
+        self.server.service_actions = self._check_parent
+        self.app = app
+        self.booted_at = time.time()
+        self._publish()
+        if self._stopping:  # told to stop while booting
+            os._exit(0)
+
+        self.server.serve_forever(poll_interval=0.5)
+        self.server.pool.shutdown(wait=True)
+        self.server.server_close()
+        sys.exit(0)  # a normal interpreter exit, so atexit hooks (e.g. the likes buffer) run
+
+    def _after_fork(self, app):
+        from models import db
+
+        # connections opened by the arbiter must not be shared with it
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        # only one worker per generation runs the once-per-deployment jobs, see background.py
+        app.config['BACKGROUND_PRIMARY'] = self.background
+        metrics.attach(self.options.metrics_dir)
+        if hasattr(app, 'jinja_env'):
+            templating.warm(app)  # from TEMPLATE_CACHE_DIR once any worker has compiled them
+
+    def stop(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def _check_parent(self):
+        if os.getppid() != self._ppid:
+            log.warning("worker %s: arbiter went away, exiting", os.getpid())
+            self.stop()
+
+    def _publish(self):
+        if scoreboard is not None and self.slot is not None:
+            scoreboard.write(self.slot, os.getpid(), self.generation, self.requests, self.active, self.errors,
+                             self.booted_at, self.last_request_at)
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.last_request_at = time.time()
+            self._publish()
+            recycle = self.requests == self.max_requests
+        if recycle:
+            log.info("worker %s: served %s requests, recycling", os.getpid(), self.requests)
+            self.stop()
+
+    def request_finished(self):
+        with self._lock:
+            self.active -= 1
+            self._publish()
+
+    def __call__(self, environ, start_response):
+        def _start_response(status, headers, exc_info=None):
+            if status.startswith('5'):
+                with self._lock:
+                    self.errors += 1
+            return start_response(status, headers, exc_info)
+
+        return self.app(environ, _start_response)
+
+
+# -------------------- ARBITER --------------------
+class WorkerProcess:
+    def __init__(self, pid, slot, generation, background):
+        self.pid = pid
+        self.slot = slot
+        self.generation = generation
+        self.background = background
+        self.retire_deadline = None
+
+
+class Arbiter:
+    def __init__(self, options, app=None):
+        self.options = options
+        self.app = app
+        self.listener = None
+        self.generation = 1
+        self.workers = {}
+        self.stopping = False
+        self.exit_code = 0
+        self._signals = []
+
+    def run(self):
+        global scoreboard
+
+        self.listener = bind_socket(self.options.bind)
+        # old and new generations overlap during a reload
+        scoreboard = Scoreboard(self.options.workers * 2)
+        own_metrics_dir = self.options.metrics_dir is None
+        if own_metrics_dir:
+            self.options.metrics_dir = tempfile.mkdtemp(prefix='agrifarma-metrics-')
+        else:
+            os.makedirs(self.options.metrics_dir, exist_ok=True)
+        if self.options.preload and self.app is None:
+            self.app = load_app(self.options.app)
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGQUIT, signal.SIGUSR1):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+
+        host, port = self.listener.getsockname()[:2]
+        log.info("listening on http://%s:%s (%s workers x %s threads, preload=%s)", host, port,
+                 self.options.workers, self.options.threads, self.options.preload)
+
+        while True:
+            self.reap()
+            while self._signals:
+                self.handle_signal(self._signals.pop(0))
+            if self.stopping:
+                if not self.workers:
+                    break
+            else:
+                self.spawn_missing()
+            self.kill_stragglers()
+            time.sleep(0.2)
+
+        self.listener.close()
+        if own_metrics_dir:
+            shutil.rmtree(self.options.metrics_dir, ignore_errors=True)
+        log.info("shut down")
+        return self.exit_code
+
+    def handle_signal(self, signum):
+        if signum == signal.SIGHUP:
+            self.reload()
+        elif signum in (signal.SIGTERM, signal.SIGINT):
+            log.info("graceful shutdown")
+            self.stopping = True
+            self.retire(list(self.workers.values()))
+        elif signum == signal.SIGQUIT:
+            log.info("immediate shutdown")
+            self.stopping = True
+            for worker in self.workers.values():
+                self._kill(worker.pid, signal.SIGKILL)
+        elif signum == signal.SIGUSR1:
+            self.log_stats()
+
+    def reload(self):
+        log.info("reloading: booting generation %s", self.generation + 1)
+        if self.options.preload:
+            try:
+                self.app = load_app(self.options.app)
+            except Exception:
+                log.exception("reload failed, keeping the current workers")
+                return
+        old = list(self.workers.values())
+        self.generation += 1
+        self.spawn_missing()
+        self.retire(old)
+
+    def spawn_missing(self):
+        current = [w for w in self.workers.values() if w.generation == self.generation and w.retire_deadline is None]
+        for _ in range(self.options.workers - len(current)):
+            background = not any(w.background for w in current)
+            current.append(self.spawn(background))
+
+    def spawn(self, background):
+        slot = scoreboard.free_slot()
+        if slot is not None:
+            scoreboard.write(slot, -1, self.generation, 0, 0, 0, 0.0, 0.0)  # reserved until the worker boots
+        worker = Worker(self.options, self.listener, slot, self.generation, background, app=self.app)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker.run()
+            except SystemExit:
+                raise
+            except BaseException:
+                traceback.print_exc()
+                os._exit(1)
+            os._exit(0)
+        process = WorkerProcess(pid, slot, self.generation, background)
+        self.workers[pid] = process
+        log.info("booted worker %s (generation %s%s)", pid, self.generation, ', background jobs' if background else '')
+        return process
+
+    def retire(self, workers):
+        deadline = time.monotonic() + self.options.graceful_timeout
+        for worker in workers:
+            if worker.retire_deadline is None:
+                worker.retire_deadline = deadline
+                self._kill(worker.pid, signal.SIGTERM)
+
+    def kill_stragglers(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.retire_deadline is not None and now > worker.retire_deadline:
+                log.warning("worker %s did not exit within %ss, killing it", worker.pid, self.options.graceful_timeout)
+                self._kill(worker.pid, signal.SIGKILL)
+                worker.retire_deadline = now + 5
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.slot is not None:
+                scoreboard.clear(worker.slot)
+            self.fold_metrics(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code == WORKER_BOOT_ERROR and not self.stopping:
+                log.error("worker %s failed to boot, shutting down", pid)
+                self.exit_code = 1
+                self.stopping = True
+                self.retire(list(self.workers.values()))
+            elif code != 0 and worker.retire_deadline is None:
+                log.warning("worker %s exited with %s", pid, code)
+
+    def fold_metrics(self, pid):
+        try:
+            metrics.fold(self.options.metrics_dir, pid)
+        except FileNotFoundError:  # died before it served anything
+            pass
+        except Exception:
+            log.exception("could not fold the metrics of worker %s", pid)
+
+    def log_stats(self):
+        rows = worker_stats()
+        log.info("%-8s %-4s %9s %7s %7s %9s", 'pid', 'gen', 'requests', 'active', '5xx', 'uptime')
+        for row in rows:
+            uptime = time.time() - row['booted_at'] if row['booted_at'] else 0
+            log.info("%-8s %-4s %9s %7s %7s %8.0fs", row['pid'], row['generation'], row['requests'], row['active'],
+                     row['errors'], uptime)
+
+    @staticmethod
+    def _kill(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+# -------------------- HELPERS --------------------
+def bind_socket(bind):
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.create_server((host, int(port)), family=family, backlog=2048)
+    sock.setblocking(False)  # workers race for accept(); the losers must not block
+    sock.set_inheritable(True)
+    return sock
+
+
+def load_app(spec):
+    """Import 'module:factory' and call the factory (or return the object if it's already an app)."""
+    module_name, _, attr = spec.partition(':')
+    target = getattr(importlib.import_module(module_name), attr or 'create_app')
+    return target() if callable(target) and not hasattr(target, 'wsgi_app') else target
+
+
+def build_options(**overrides):
+    """Server options from Config defaults, with non-None overrides applied."""
+    options = argparse.Namespace(
+        app='app:create_app',
+        bind=Config.SERVER_BIND,
+        workers=Config.SERVER_WORKERS,
+        threads=Config.SERVER_THREADS,
+        max_requests=Config.SERVER_MAX_REQUESTS,
+        max_requests_jitter=Config.SERVER_MAX_REQUESTS_JITTER,
+        graceful_timeout=Config.SERVER_GRACEFUL_TIMEOUT,
+        keepalive=Config.SERVER_KEEPALIVE,
+        preload=False,
+        access_log=False,
+        metrics_dir=Config.SERVER_METRICS_DIR,
+    )
+    for key, value in overrides.items():
+        if value is not None:
+            setattr(options, key, value)
+    return options
+
+
+def serve(options, app=None):
+    if not logging.getLogger().handlers and not log.handlers:
+        logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(process)d] %(message)s')
+    return Arbiter(options, app=app).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run AgriFarma with preforked worker processes.')
+    parser.add_argument('--app', help="'module:factory', default app:create_app")
+    parser.add_argument('--bind', '-b', help=f'host:port (default {Config.SERVER_BIND})')
+    parser.add_argument('--workers', '-w', type=int)
+    parser.add_argument('--threads', '-t', type=int)
+    parser.add_argument('--max-requests', type=int, help='recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int)
+    parser.add_argument('--graceful-timeout', type=int)
+    parser.add_argument('--keepalive', type=int, help='seconds an idle keep-alive connection holds a thread')
+    parser.add_argument('--preload', action='store_true', default=None)
+    parser.add_argument('--access-log', action='store_true', default=None)
+    parser.add_argument('--metrics-dir', help='where workers keep their metric files (default: a temp dir)')
+    args = parser.parse_args(argv)
+    return serve(build_options(**vars(args)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
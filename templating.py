@@ -0,0 +1,129 @@
+"""
+Template caching: compiled templates on disk, rendered cards in memory.
+
+Jinja compiles every template to Python code the first time a worker loads
+it. With TEMPLATE_CACHE_DIR set, the compiled code is written there
+(FileSystemBytecodeCache), so later workers and restarts skip parsing and
+only unmarshal. server.py loads every template while a worker boots, so
+the first request does not pay for it either.
+
+`{% cache part, part, ... %}...{% endcache %}` renders its body once per key
+and reuses the HTML afterwards. The key is the template name and line of
+the tag plus the parts, which must be everything the body depends on: the
+entity id and its version, whatever it shows of other rows (the author's
+name), and per-viewer bits such as whether the viewer is logged in.
+Listing queries fill in `version` (listings.py) from the sync_change log,
+which SQLite triggers bump on every write to the row. An edited row therefore gets a new key, and the old entry simply ages out. A
+None part means the version is unknown, and the body is rendered without
+caching.
+
+Fragments live in a per-process LRU of FRAGMENT_CACHE_SIZE entries
+(0 turns caching off). Lookups are counted in metrics.CACHE_REQUESTS as
+cache="fragment".
+"""
+import collections
+import os
+import threading
+
+from jinja2 import FileSystemBytecodeCache, TemplateError, nodes
+from jinja2.ext import Extension
+
+import metrics
+
+FRAGMENT_CACHE_SIZE = 5000
+
+
+# -------------------- FRAGMENT CACHE --------------------
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, bounded by entry count."""
+
+    def __init__(self, size=FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.CACHE_REQUESTS.inc('fragment', 'miss' if html is None else 'hit')
+        return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'size': self.size, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+class FragmentCacheExtension(Extension):
+    """The `{% cache part, ... %}...{% endcache %}` tag, backed by environment.fragment_cache."""
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [nodes.Const(parser.name), nodes.Const(lineno), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        key = nodes.Tuple(parts, 'load')
+        return nodes.CallBlock(self.call_method('_render', [key]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or None in key:
+            return caller()
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html)
+        return html
+
+
+# -------------------- FLASK --------------------
+def init_app(app):
+    """Set up the bytecode cache and the {% cache %} tag. Call before any template is loaded."""
+    env = app.jinja_env
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    env.add_extension(FragmentCacheExtension)
+    if app.config['FRAGMENT_CACHE_SIZE'] > 0:
+        env.fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_SIZE'])
+    app.extensions['fragment_cache'] = env.fragment_cache
+
+
+def warm(app):
+    """Load every template now instead of on first use. Returns the number loaded."""
+    env = app.jinja_env
+    loaded = 0
+    for name in env.list_templates(extensions=['html']):
+        try:
+            env.get_template(name)
+            loaded += 1
+        except TemplateError:
+            app.logger.exception('could not compile template %s', name)
+    return loaded
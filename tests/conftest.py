@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+PASSWORD = 'pw'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/test.db',
+        'BACKGROUND_TASKS': False,
+        'ADMISSION': False,
+        'TEMPLATE_CACHE_DIR': None,
+        'PROFILE_DIR': str(tmp_path / 'profiles'),
+        'BACKUP_DIR': str(tmp_path / 'backups'),
+    })
+    app.template_folder = ROOT  # the templates live at the repo root
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def make_user(name='Farmer', email='farmer@example.com', role='farmer'):
+    user = User(name=name, email=email, password_hash=generate_password_hash(PASSWORD), role=role)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def login(app):
+    """Log a test client in as `user`."""
+    def login(user):
+        client = app.test_client()
+        client.post('/login', data={'email': user.email, 'password': PASSWORD})
+        return client
+    return login
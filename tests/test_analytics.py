@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics
+from conftest import make_user
+from models import db, Order, OrderItem, Product, SalesDaily
+
+
+@pytest.fixture
+def shop(app):
+    user = make_user()
+    product = Product(name='Seed', description='d', price=10, category='Seeds', stock=100, user_id=user.id)
+    db.session.add(product)
+    db.session.commit()
+
+    def order(price, status='Pending', age_days=0):
+        placed = Order(user_id=user.id, total_amount=price, status=status,
+                       created_at=datetime.utcnow() - timedelta(days=age_days))
+        db.session.add(placed)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=placed.id, product_id=product.id, quantity=1, price=price))
+        db.session.commit()
+        return placed.id
+    return order
+
+
+def _revenue():
+    return db.session.query(db.func.sum(SalesDaily.revenue)).scalar() or 0
+
+
+def _set_status(order_id, status):
+    Order.query.filter_by(id=order_id).update({'status': status})
+    db.session.commit()
+
+
+def test_placed_orders_count_failed_ones_dont(shop):
+    shop(1)
+    shop(2, 'Paid')
+    shop(4, 'Failed')
+    assert analytics.refresh_summaries() == 3
+    assert _revenue() == 3
+
+
+def test_late_settling_orders_are_reflected(shop):
+    pending = shop(100, age_days=10)
+    failed = shop(1000, 'Failed', age_days=10)
+    analytics.refresh_summaries()
+    assert _revenue() == 100
+
+    _set_status(pending, 'Failed')  # days later, the payment never came
+    _set_status(failed, 'Pending')
+    _set_status(failed, 'Paid')  # retried and paid; only the first change is logged
+    analytics.refresh_summaries()
+    assert _revenue() == 1000
+    assert db.session.query(db.func.sum(SalesDaily.order_count)).scalar() == 1
+
+    analytics.refresh_summaries()  # nothing applied twice
+    assert _revenue() == 1000
+
+
+def test_status_change_before_first_refresh_is_not_double_counted(shop):
+    order_id = shop(5, 'Failed')
+    _set_status(order_id, 'Paid')
+    analytics.refresh_summaries()
+    analytics.refresh_summaries()
+    assert _revenue() == 5
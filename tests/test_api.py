@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.mark.parametrize('entry', [
+    {'fields': [{'name': 1}]},
+    {'fields': [['name']]},
+    {'fields': 5},
+    {'ids': [{'id': 1}]},
+    {'ids': [True]},
+    {'ids': 'x'},
+])
+def test_batch_rejects_malformed_entries_per_resource(app, entry):
+    response = app.test_client().post('/api/v1/batch', json={'products': entry, 'blogs': {}})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['products']['status'] == 400
+    assert 'items' in body['blogs']
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+import archive
+import directory
+from models import db, ArchivedConsultation, Consultation, Expert, ExpertRank
+
+
+def test_archiving_resolved_consultations_keeps_the_ranking(app):
+    expert = Expert(name='Dr. Soil', email='soil@example.com', experience_years=5, is_verified=True)
+    db.session.add(expert)
+    db.session.commit()
+    old = datetime.utcnow() - timedelta(days=400)
+    for hours in (2, 4, 30):
+        db.session.add(Consultation(farmer_name='F', problem='p', expert_id=expert.id, status='Resolved',
+                                    created_at=old, updated_at=old + timedelta(hours=hours)))
+    db.session.add(Consultation(farmer_name='F', problem='p', expert_id=expert.id, status='Resolved'))
+    db.session.commit()
+
+    directory.refresh_rankings(full=True)
+    before = db.session.get(ExpertRank, expert.id)
+    before = (before.resolved_count, before.avg_response_hours, before.score)
+
+    assert archive.run(budget=None)['consultations'] == 3
+    assert ArchivedConsultation.query.count() == 3 and Consultation.query.count() == 1
+
+    directory.refresh_rankings(full=True)
+    after = db.session.get(ExpertRank, expert.id)
+    assert before[0] == after.resolved_count == 4
+    assert after.avg_response_hours == before[1]
+    assert after.score == before[2]
@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import make_user
+from likes import LikeService
+from models import db, ForumPost
+
+
+def _post():
+    user = make_user()
+    post = ForumPost(title='Rust on wheat', content='Seen any?', user_id=user.id)
+    db.session.add(post)
+    db.session.commit()
+    return user, post
+
+
+def _stored(post_id):
+    return db.session.query(ForumPost.likes_count).filter_by(id=post_id).scalar()
+
+
+def test_in_flight_likes_stay_counted_until_commit(app, monkeypatch):
+    user, post = _post()
+    likes = LikeService(flush_delay=60)
+    likes.toggle(user.id, 'post', post.id)
+    seen = []
+    commit = db.session.commit
+
+    def observe_commit():
+        seen.append(likes.count('post', post.id, 0))  # stored counter as read before this commit
+        commit()
+    monkeypatch.setattr(db.session, 'commit', observe_commit)
+
+    likes.flush()
+    assert seen == [1]
+    assert likes.count('post', post.id, _stored(post.id)) == 1
+
+
+def test_failed_flush_keeps_the_count_and_requeues(app, monkeypatch):
+    user, post = _post()
+    likes = LikeService(flush_delay=60)
+    likes.toggle(user.id, 'post', post.id)
+
+    def fail():
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(db.session, 'commit', fail)
+    with pytest.raises(RuntimeError):
+        likes.flush()
+    assert likes.count('post', post.id, _stored(post.id)) == 1
+
+    monkeypatch.undo()
+    likes.flush()
+    assert _stored(post.id) == 1
+    assert likes.count('post', post.id, _stored(post.id)) == 1
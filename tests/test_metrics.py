@@ -0,0 +1,27 @@
+import os
+
+import metrics
+
+
+def test_scrape_skips_stray_and_damaged_files(app):
+    client = app.test_client()
+    client.get('/metrics')
+    directory = metrics._dir
+    with open(os.path.join(directory, 'notes.db'), 'wb') as f:
+        f.write(b'not a metrics file')
+    with open(os.path.join(directory, '999999.db'), 'wb') as f:  # a dead worker's file, cut short
+        f.write((64).to_bytes(8, 'little') + (200).to_bytes(4, 'little') + b'agrifarma_')
+
+    try:
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert 'agrifarma_http_requests_total' in response.get_data(as_text=True)
+    finally:
+        os.unlink(os.path.join(directory, 'notes.db'))
+        os.unlink(os.path.join(directory, '999999.db'))
+
+
+def test_scrape_restricted_to_allowed_addresses(app):
+    client = app.test_client()
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 403
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 200
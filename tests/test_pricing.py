@@ -0,0 +1,52 @@
+import re
+
+from conftest import make_user
+from models import db, Order, Product
+
+
+def _checkout_token(client):
+    page = client.get('/checkout').get_data(as_text=True)
+    return re.search(r'name="snapshot" value="(\w+)"', page).group(1)
+
+
+def _cart_with_product(login, price=100, discount=0):
+    user = make_user()
+    product = Product(name='Seed', description='d', price=price, discount=discount, category='Seeds', stock=10,
+                      user_id=user.id)
+    db.session.add(product)
+    db.session.commit()
+    client = login(user)
+    client.post(f'/cart/add/{product.id}', data={'quantity': 2})
+    return client, product
+
+
+def test_order_placed_at_confirmed_prices(app, login):
+    client, product = _cart_with_product(login, price=100, discount=10)
+    response = client.post('/order/place', data={'snapshot': _checkout_token(client)})
+    assert response.status_code == 302 and '/order/' in response.location
+    assert db.session.query(Order.total_amount).scalar() == 180
+
+
+def test_price_change_between_checkout_and_place_order_is_refused(app, login):
+    client, product = _cart_with_product(login, price=100)
+    token = _checkout_token(client)
+
+    Product.query.filter_by(id=product.id).update({'discount': 50})  # e.g. a seller edit in another worker
+    db.session.commit()
+
+    response = client.post('/order/place', data={'snapshot': token}, follow_redirects=True)
+    assert 'Prices or your cart changed' in response.get_data(as_text=True)
+    assert Order.query.count() == 0
+    assert db.session.get(Product, product.id).stock == 10
+
+    response = client.post('/order/place', data={'snapshot': _checkout_token(client)})
+    assert '/order/' in response.location
+    assert db.session.query(Order.total_amount).scalar() == 100
+
+
+def test_cart_change_invalidates_snapshot(app, login):
+    client, product = _cart_with_product(login)
+    token = _checkout_token(client)
+    client.post(f'/cart/add/{product.id}', data={'quantity': 1})
+    assert _checkout_token(client) != token
+    assert client.post('/order/place', data={'snapshot': token}).location.endswith('/checkout')
@@ -0,0 +1,16 @@
+from conftest import make_user
+from models import db, Blog, User
+
+
+def test_cached_blog_card_shows_renamed_author(app):
+    user = make_user(name='Old Name')
+    db.session.add(Blog(title='Sowing maize', content='Plant after the first rains.', user_id=user.id))
+    db.session.commit()
+    client = app.test_client()
+    assert 'Old Name' in client.get('/blog').get_data(as_text=True)
+
+    User.query.filter_by(id=user.id).update({'name': 'New Name'})
+    db.session.commit()
+
+    page = client.get('/blog').get_data(as_text=True)
+    assert 'New Name' in page and 'Old Name' not in page
@@ -0,0 +1,77 @@
+"""
+Forum thread reading.
+
+A thread page shows one page of replies, fetched with a single query that
+joins the author and reads the likes_count counter, instead of loading
+every reply and then lazy-loading each reply's user and likes.
+Further pages are fetched by keyset on (created_at, id), so "load more"
+costs the same on page 50 as on page 1. Replies of threads that went
+quiet live in the archive (see archive.py). Each page reads both tables
+by the same keyset and merges them; archived rows are flagged, as they
+can't be liked.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import literal, select, tuple_, union_all
+
+from likes import likes
+from models import db, ArchivedForumReply, ForumReply, User
+
+REPLIES_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+ReplyRow = namedtuple('ReplyRow', 'id content created_at user_id author_name author_role like_count archived')
+
+
+def encode_cursor(row):
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor string. Raises ValueError if malformed."""
+    created_at, _, reply_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created_at), int(reply_id)
+
+
+def reply_page(post_id, after=None, limit=REPLIES_PER_PAGE):
+    """One page of replies, oldest first, and the cursor for the next page (None on the last page).
+
+    `after` is a cursor from a previous page.
+    """
+    position = decode_cursor(after) if after else None
+
+    def page_of(model, archived):
+        # limited per table so each side is an index range scan, not a sort of the whole thread
+        stmt = select(model.id, model.content, model.created_at, model.user_id, model.likes_count,
+                      literal(archived).label('archived')).where(model.post_id == post_id)
+        if position:
+            stmt = stmt.where(tuple_(model.created_at, model.id) > position)
+        return select(stmt.order_by(model.created_at, model.id).limit(limit + 1).subquery())
+
+    merged = union_all(page_of(ForumReply, False), page_of(ArchivedForumReply, True)).subquery()
+    query = (
+        db.session.query(
+            merged.c.id, merged.c.content, merged.c.created_at, merged.c.user_id,
+            User.name, User.role, merged.c.likes_count, merged.c.archived,
+        )
+        .outerjoin(User, User.id == merged.c.user_id)
+        .order_by(merged.c.created_at, merged.c.id)
+        .limit(limit + 1)
+    )
+    rows = [ReplyRow(*row[:6], likes.count('reply', row.id, row.likes_count), bool(row.archived))
+            for row in query]
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def reply_to_dict(row):
+    return {
+        'id': row.id,
+        'content': row.content,
+        'created_at': row.created_at.isoformat(),
+        'author': {'id': row.user_id, 'name': row.author_name, 'role': row.author_role},
+        'like_count': row.like_count,
+        'archived': row.archived,
+    }
@@ -0,0 +1,275 @@
+"""
+Trending forum threads and products.
+
+Write paths report events with record() (a like, a reply, an order line, a
+product view); each adds a weight to the item's exponentially decayed score
+(half-life HALF_LIFE_HOURS). Reads never touch the like, reply or order
+tables: top() returns the best items from an in-memory top-K heap.
+
+Decay without rescaling every score: scores are stored multiplied by
+2^((t - epoch start) / half-life), so an event only adds to its own item
+and items never need rescaling relative to each other. Epochs are
+EPOCH_HALF_LIVES half-lives long and derived from wall time, so every
+process agrees on them; crossing one multiplies all scores by CARRY.
+
+Each process periodically checkpoints the increments it recorded to the
+trending_score table (an additive upsert, so workers don't overwrite each
+other) and reloads the best CANDIDATES items per kind from it. That merges
+in other workers' events and gives a warm start after a restart.
+"""
+import atexit
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, ForumPost, ForumReply, Like, Order, OrderItem, Product, TrendingScore
+
+log = logging.getLogger(__name__)
+
+HALF_LIFE_HOURS = 24
+EPOCH_HALF_LIVES = 20
+TOP_K = 50
+CANDIDATES = 500  # items per kind reloaded from the checkpoint
+
+HALF_LIFE = HALF_LIFE_HOURS * 3600
+EPOCH_SECONDS = HALF_LIFE * EPOCH_HALF_LIVES
+CARRY = 2.0 ** -EPOCH_HALF_LIVES
+
+MODELS = {'thread': ForumPost, 'product': Product}
+WEIGHTS = {
+    'like': 1.0,
+    'reply': 3.0,
+    'view': 0.2,
+    'order': 5.0,  # per unit
+}
+
+# Adds a delta to the stored score, bringing whichever side is an epoch behind forward first.
+UPSERT_SQL = """
+INSERT INTO trending_score (kind, item_id, score, epoch, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (kind, item_id) DO UPDATE SET
+    score = CASE
+        WHEN trending_score.epoch = excluded.epoch THEN trending_score.score + excluded.score
+        WHEN trending_score.epoch = excluded.epoch - 1 THEN trending_score.score * ? + excluded.score
+        WHEN trending_score.epoch = excluded.epoch + 1 THEN trending_score.score + excluded.score * ?
+        WHEN trending_score.epoch < excluded.epoch THEN excluded.score
+        ELSE trending_score.score
+    END,
+    epoch = max(trending_score.epoch, excluded.epoch),
+    updated_at = excluded.updated_at
+"""
+
+CANDIDATES_SQL = """
+SELECT item_id, score, epoch FROM trending_score
+WHERE kind = ? AND epoch >= ?
+ORDER BY score * CASE WHEN epoch = ? THEN 1.0 ELSE ? END DESC
+LIMIT ?
+"""
+
+
+def epoch_of(ts):
+    return int(ts // EPOCH_SECONDS)
+
+
+class TopK:
+    """The k highest-scoring items of a table whose scores only go up.
+
+    A min-heap of the members with lazy deletion: an updated member gets a
+    new heap entry and its old one is skipped when it reaches the top.
+    """
+
+    def __init__(self, k, scores=None):
+        self.k = k
+        best = heapq.nlargest(k, (scores or {}).items(), key=lambda kv: kv[1])
+        self.members = dict(best)
+        self._heap = [(score, item_id) for item_id, score in best]
+        heapq.heapify(self._heap)
+
+    def offer(self, item_id, score):
+        if item_id in self.members or len(self.members) < self.k:
+            self.members[item_id] = score
+            heapq.heappush(self._heap, (score, item_id))
+            if len(self._heap) > 4 * self.k:
+                self._heap = [(s, i) for i, s in self.members.items()]
+                heapq.heapify(self._heap)
+            return
+        while self.members.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if score > self._heap[0][0]:
+            _, evicted = heapq.heapreplace(self._heap, (score, item_id))
+            del self.members[evicted]
+            self.members[item_id] = score
+
+    def best(self, limit):
+        return sorted(self.members.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+
+class TrendingEngine:
+    def __init__(self, k=TOP_K, candidates=CANDIDATES):
+        self.k = k
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._epoch = epoch_of(time.time())
+        self._scores = {kind: {} for kind in MODELS}  # stored-form scores known to this process
+        self._unsaved = {kind: {} for kind in MODELS}  # increments not yet checkpointed
+        self._top = {kind: TopK(k) for kind in MODELS}
+        self._loaded = False
+        self._app = None
+        self.events = 0
+        self.checkpoints = 0
+        atexit.register(self._checkpoint_at_exit)
+
+    # -------------------- EVENTS --------------------
+    def record(self, kind, item_id, event, amount=1, at=None):
+        """Add an event's weight to an item's score. Cheap: no DB access."""
+        at = time.time() if at is None else at
+        with self._lock:
+            self._roll(at)
+            inc = WEIGHTS[event] * amount * 2.0 ** ((at - self._epoch * EPOCH_SECONDS) / HALF_LIFE)
+            score = self._scores[kind].get(item_id, 0.0) + inc
+            self._scores[kind][item_id] = score
+            self._unsaved[kind][item_id] = self._unsaved[kind].get(item_id, 0.0) + inc
+            self._top[kind].offer(item_id, score)
+            self.events += 1
+        if self._app is None:
+            self._app = current_app._get_current_object()
+
+    def _roll(self, now):
+        """Move stored scores into the current epoch. Caller holds the lock."""
+        epoch = epoch_of(now)
+        if epoch <= self._epoch:
+            return
+        factor = CARRY ** (epoch - self._epoch)
+        for kind in MODELS:
+            self._scores[kind] = {i: s * factor for i, s in self._scores[kind].items()}
+            self._unsaved[kind] = {i: s * factor for i, s in self._unsaved[kind].items()}
+            self._top[kind] = TopK(self.k, self._scores[kind])
+        self._epoch = epoch
+
+    # -------------------- READS --------------------
+    def top(self, kind, limit=10):
+        """[(item_id, decayed score)] best first, at most TOP_K."""
+        if not self._loaded:
+            self.reload()
+        now = time.time()
+        with self._lock:
+            self._roll(now)
+            decay = 2.0 ** (-(now - self._epoch * EPOCH_SECONDS) / HALF_LIFE)
+            return [(item_id, score * decay) for item_id, score in self._top[kind].best(limit)]
+
+    def resolve(self, kind, limit=10):
+        """[(model instance, decayed score)] best first, skipping items deleted since they scored."""
+        ranked = self.top(kind, limit)
+        model = MODELS[kind]
+        found = {obj.id: obj for obj in model.query.filter(model.id.in_([i for i, _ in ranked]))}
+        return [(found[i], score) for i, score in ranked if i in found]
+
+    # -------------------- CHECKPOINTS --------------------
+    def checkpoint(self):
+        """Write this process's increments, then reload the merged candidates. Returns rows written."""
+        with self._checkpoint_lock:
+            with self._lock:
+                self._roll(time.time())
+                epoch = self._epoch
+                unsaved = self._unsaved
+                self._unsaved = {kind: {} for kind in MODELS}
+            now = datetime.utcnow().isoformat(' ')
+            rows = [
+                (kind, item_id, inc, epoch, now, CARRY, CARRY)
+                for kind, incs in unsaved.items() for item_id, inc in incs.items()
+            ]
+            try:
+                if rows:
+                    db.session.connection().exec_driver_sql(UPSERT_SQL, rows)
+                db.session.query(TrendingScore).filter(TrendingScore.epoch < epoch - 1).delete()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for kind, incs in unsaved.items():
+                        for item_id, inc in incs.items():
+                            self._unsaved[kind][item_id] = self._unsaved[kind].get(item_id, 0.0) + inc
+                raise
+            self.checkpoints += 1
+            self.reload()
+            return len(rows)
+
+    def reload(self):
+        """Replace the in-memory tables with the checkpoint's best items plus unsaved increments."""
+        with self._lock:
+            epoch = self._epoch
+        connection = db.session.connection()
+        loaded = {}
+        for kind in MODELS:
+            result = connection.exec_driver_sql(CANDIDATES_SQL, (kind, epoch - 1, epoch, CARRY, self.candidates))
+            loaded[kind] = {item_id: score * (1.0 if row_epoch == epoch else CARRY)
+                            for item_id, score, row_epoch in result}
+        with self._lock:
+            if self._epoch != epoch:  # rolled over while reading
+                for kind in MODELS:
+                    loaded[kind] = {i: s * CARRY ** (self._epoch - epoch) for i, s in loaded[kind].items()}
+            for kind in MODELS:
+                for item_id, inc in self._unsaved[kind].items():
+                    loaded[kind][item_id] = loaded[kind].get(item_id, 0.0) + inc
+                self._scores[kind] = loaded[kind]
+                self._top[kind] = TopK(self.k, loaded[kind])
+            self._loaded = True
+
+    def _checkpoint_at_exit(self):
+        if self._app is not None and any(self._unsaved.values()):
+            with self._app.app_context():
+                try:
+                    self.checkpoint()
+                except Exception:
+                    log.exception("trending checkpoint at exit failed")
+                finally:
+                    db.session.remove()
+
+    # -------------------- MAINTENANCE --------------------
+    def rebuild(self, hours=HALF_LIFE_HOURS * 7):
+        """Recompute scores from the last `hours` of likes, replies and orders (views aren't stored)."""
+        since = datetime.utcnow() - timedelta(hours=hours)
+        with self._lock:
+            self._scores = {kind: {} for kind in MODELS}
+            self._unsaved = {kind: {} for kind in MODELS}
+            self._top = {kind: TopK(self.k) for kind in MODELS}
+        db.session.query(TrendingScore).delete()
+
+        def ts(dt):
+            return (dt - datetime(1970, 1, 1)).total_seconds()
+
+        events = [
+            (db.session.query(Like.post_id, Like.created_at)
+             .filter(Like.post_id.isnot(None), Like.created_at >= since), 'like'),
+            (db.session.query(ForumReply.post_id, Like.created_at).join(Like, Like.reply_id == ForumReply.id)
+             .filter(Like.created_at >= since), 'like'),
+            (db.session.query(ForumReply.post_id, ForumReply.created_at)
+             .filter(ForumReply.created_at >= since), 'reply'),
+        ]
+        for query, event in events:
+            for post_id, created_at in query.yield_per(5000):
+                self.record('thread', post_id, event, at=ts(created_at))
+        orders = (
+            db.session.query(OrderItem.product_id, OrderItem.quantity, Order.created_at)
+            .join(Order, Order.id == OrderItem.order_id)
+            .filter(Order.created_at >= since, Order.status != 'Failed')
+        )
+        for product_id, quantity, created_at in orders.yield_per(5000):
+            self.record('product', product_id, 'order', amount=quantity, at=ts(created_at))
+        return self.checkpoint()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'events': self.events,
+                'checkpoints': self.checkpoints,
+                'tracked': {kind: len(scores) for kind, scores in self._scores.items()},
+                'unsaved': {kind: len(incs) for kind, incs in self._unsaved.items()},
+            }
+
+
+trending = TrendingEngine()
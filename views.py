@@ -0,0 +1,762 @@
+"""
+Main site blueprint: auth, dashboards, blog, products, forum, likes, expert
+directory, consultations, search, cart and orders.
+"""
+import os
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, abort
+from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+
+import archive
+import directory
+import listings
+import threads
+from likes import likes
+from models import db, User, Blog, Product, ForumPost, ForumReply, Expert, Consultation, Cart, Order, OrderItem
+from pricing import pricing
+from responses import render_page
+from trending import trending
+
+bp = Blueprint('main', __name__)
+
+
+# -------------------- HOME --------------------
+@bp.route('/')
+def index():
+    if not current_user.is_authenticated:
+        return redirect(url_for('main.login'))
+
+    if current_user.role == 'admin':
+        return redirect(url_for('admin.admin_dashboard'))
+    elif current_user.role == 'expert':
+        return redirect(url_for('main.expert_view'))
+    else:
+        return redirect(url_for('main.farmer_dashboard'))
+
+
+@bp.route('/home')
+def home():
+    latest_blogs = listings.blogs().order_by(Blog.created_at.desc()).limit(5).all()
+    return render_template('index.html', blogs=latest_blogs,
+                           trending_threads=trending.resolve('thread', 5),
+                           trending_products=trending.resolve('product', 5))
+
+
+@bp.route('/trending')
+def trending_json():
+    """Top threads and products by time-decayed activity, from memory."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), trending.k)
+    return jsonify({
+        'threads': [
+            {'id': post.id, 'title': post.title, 'score': round(score, 3),
+             'url': url_for('main.view_thread', post_id=post.id)}
+            for post, score in trending.resolve('thread', limit)
+        ],
+        'products': [
+            {'id': product.id, 'name': product.name, 'price': product.final_price(), 'score': round(score, 3),
+             'url': url_for('main.view_product', product_id=product.id)}
+            for product, score in trending.resolve('product', limit)
+        ],
+    })
+
+
+# -------------------- AUTH --------------------
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        name = request.form['name']
+        email = request.form['email']
+        password = request.form['password']
+
+        if User.query.filter_by(email=email).first():
+            flash('⚠️ Email already registered', 'warning')
+            return redirect(url_for('main.register'))
+
+        user = User(name=name, email=email, password_hash=generate_password_hash(password), role='farmer')
+        db.session.add(user)
+        db.session.commit()
+        flash('✅ Account created. Please log in.', 'success')
+        return redirect(url_for('main.login'))
+    return render_template('register.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        email = request.form['email']
+        password = request.form['password']
+        user = User.query.filter_by(email=email).first()
+
+        if user and check_password_hash(user.password_hash, password):
+            login_user(user)
+            flash(f'Welcome back, {user.name}!', 'success')
+
+            if user.role == 'admin':
+                return redirect(url_for('admin.admin_dashboard'))
+            elif user.role == 'expert':
+                return redirect(url_for('main.expert_view'))
+            else:
+                return redirect(url_for('main.farmer_dashboard'))
+
+        flash('❌ Invalid credentials', 'danger')
+        return redirect(url_for('main.login'))
+
+    return render_template('login.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('👋 Logged out', 'info')
+    return redirect(url_for('main.login'))
+
+
+# -------------------- PROFILE REDIRECT --------------------
+@bp.route('/profile')
+@login_required
+def profile():
+    if current_user.role == 'admin':
+        return redirect(url_for('admin.admin_dashboard'))
+    elif current_user.role == 'expert':
+        return redirect(url_for('main.expert_view'))
+    else:
+        return redirect(url_for('main.farmer_dashboard'))
+
+# -------------------- DASHBOARDS --------------------
+@bp.route('/dashboard')
+@login_required
+def farmer_dashboard():
+    if current_user.role != 'farmer':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    blogs = Blog.query.filter_by(user_id=current_user.id).all()
+    products = Product.query.filter_by(user_id=current_user.id).all()
+    posts = ForumPost.query.filter_by(user_id=current_user.id).all()
+    
+    # 🟢 Get all consultations for this farmer (by their email)
+    consultations = Consultation.query.filter_by(farmer_email=current_user.email).order_by(
+        Consultation.created_at.desc()
+    ).all()
+
+    return render_template(
+        'dashboard.html',
+        user=current_user,
+        blogs=blogs,
+        products=products,
+        posts=posts,
+        consultations=consultations
+    )
+
+
+
+@bp.route('/expert/<int:expert_id>')
+@bp.route('/expert/dashboard')
+@login_required
+def expert_view(expert_id=None):
+    if expert_id is None:
+        if current_user.role != 'expert':
+            flash('Access denied', 'danger')
+            return redirect(url_for('main.index'))
+
+        expert = Expert.query.filter_by(email=current_user.email).first()
+        if not expert:
+            flash("Expert profile not found. Contact admin.", "danger")
+            return redirect(url_for('main.index'))
+
+        consults = Consultation.query.filter_by(expert_id=expert.id).order_by(Consultation.created_at.desc()).all()
+        forum_posts = ForumPost.query.order_by(ForumPost.created_at.desc()).limit(10).all()
+        return render_template('expert_dashboard.html', expert=expert, consults=consults, posts=forum_posts)
+
+    expert = Expert.query.get_or_404(expert_id)
+    return render_template('expert_profile.html', expert=expert)
+
+
+# -------------------- BLOG --------------------
+
+@bp.route('/blog')
+def blog():
+    """Display all blogs with Add New Blog button if user is logged in."""
+    blogs = listings.blogs().order_by(Blog.created_at.desc()).all()
+    return render_page('blog.html', blogs=blogs)
+
+
+@bp.route('/blog/new', methods=['GET', 'POST'])
+@login_required
+def new_blog():
+    """Create a new blog post."""
+    if request.method == 'POST':
+        title = request.form['title']
+        content = request.form['content']
+        image = request.files.get('image')
+        filename = None
+        if image and image.filename:
+            filename = secure_filename(image.filename)
+            image.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+
+        blog = Blog(
+            title=title,
+            content=content,
+            image=filename,
+            user_id=current_user.id
+        )
+        db.session.add(blog)
+        db.session.commit()
+        flash('📝 Blog posted successfully!', 'success')
+        return redirect(url_for('main.blog'))  # redirect to all blogs
+
+    return render_template('new_blog.html')
+
+
+@bp.route('/blog/<int:blog_id>')
+def view_blog(blog_id):
+    """View a single blog in full detail."""
+    b = Blog.query.get_or_404(blog_id)
+    return render_template('view_blog.html', blog=b)
+
+## -------------------- PRODUCTS --------------------
+@bp.route('/products')
+def products():
+    """Display all products with search and category filter."""
+    q = request.args.get('q', '').strip()
+    category = request.args.get('category', '').strip()
+
+    # 🟢 Query with filters
+    query = listings.products()
+    if q:
+        query = query.filter(
+            (Product.name.ilike(f"%{q}%")) | (Product.description.ilike(f"%{q}%"))
+        )
+    if category:
+        query = query.filter(Product.category.ilike(f"%{category}%"))
+
+    items = query.order_by(Product.created_at.desc()).all()
+    categories = [c for (c,) in db.session.query(Product.category).filter(Product.category != '')
+                  .distinct().order_by(Product.category)]
+
+    return render_page(
+        'products.html',
+        products=items,
+        q=q,
+        selected_category=category,
+        categories=categories
+    )
+
+
+@bp.route('/product/new', methods=['GET', 'POST'])
+@login_required
+def new_product():
+    """Allow authenticated users to add new products."""
+    if request.method == 'POST':
+        try:
+            name = request.form['name'].strip()
+            description = request.form['description'].strip()
+            price = float(request.form['price'] or 0)      # Original price
+            discount = float(request.form.get('discount', 0))
+            stock = int(request.form.get('stock', 0))      # Quantity
+            category = request.form.get('category', '').strip()
+
+            image = request.files.get('image')
+            filename = None
+            if image and image.filename:
+                filename = secure_filename(image.filename)
+                image.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+
+            # ⚠️ Save original price in DB, calculate discounted price dynamically in model
+            product = Product(
+                name=name,
+                description=description,
+                price=price,         # Original price
+                discount=discount,   # Discount %
+                stock=stock,         # Quantity available
+                category=category,
+                image=filename,
+                user_id=current_user.id,
+                created_at=datetime.utcnow()
+            )
+            db.session.add(product)
+            db.session.commit()
+
+            flash(f'🛒 Product "{name}" added successfully!', 'success')
+            return redirect(url_for('main.products'))
+
+        except Exception as e:
+            flash(f'❌ Error adding product: {str(e)}', 'danger')
+            return redirect(url_for('main.new_product'))
+
+    return render_template('new_product.html')
+
+
+@bp.route('/product/<int:product_id>')
+def view_product(product_id):
+    """View a single product with full details."""
+    p = Product.query.get_or_404(product_id)
+    trending.record('product', p.id, 'view')
+
+    # 💰 Calculate discounted price dynamically using model method
+    discounted_price = p.final_price() if hasattr(p, 'final_price') else p.price
+    stock_status = (
+        "🟢 In Stock" if p.stock > 10 else
+        "🟠 Limited Stock" if 1 <= p.stock <= 10 else
+        "🔴 Out of Stock"
+    )
+
+    return render_template(
+        'view_product.html',
+        p=p,
+        discounted_price=discounted_price,
+        stock_status=stock_status
+    )
+
+
+# -------------------- FORUM --------------------
+@bp.route('/forum')
+def forum():
+    q = request.args.get('q', '')
+    if q:
+        posts = listings.threads().filter(
+            ForumPost.title.ilike(f"%{q}%") | ForumPost.content.ilike(f"%{q}%")
+        ).all()
+    else:
+        posts = listings.threads().order_by(ForumPost.created_at.desc()).all()
+    user_id = current_user.id if current_user.is_authenticated else None
+    liked_posts = likes.liked_ids(user_id, 'post', [p.id for p in posts])
+    return render_page('forum.html', posts=posts, q=q, liked_posts=liked_posts)
+
+
+@bp.route('/forum/new', methods=['GET', 'POST'])
+@login_required
+def new_thread():
+    if request.method == 'POST':
+        title = request.form['title']
+        content = request.form['content']
+        image = request.files.get('image')
+        filename = None
+        if image and image.filename != '':
+            filename = secure_filename(image.filename)
+            image.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+
+        post = ForumPost(title=title, content=content, image_filename=filename, user_id=current_user.id)
+        db.session.add(post)
+        db.session.commit()
+        flash('💬 New discussion created!', 'success')
+        return redirect(url_for('main.forum'))
+
+    return render_template('new_thread.html')
+
+
+@bp.route('/forum/<int:post_id>', methods=['GET', 'POST'])
+def view_thread(post_id):
+    post = ForumPost.query.get_or_404(post_id)
+
+    if request.method == 'POST':
+        if not current_user.is_authenticated:
+            flash('Please login to reply.', 'warning')
+            return redirect(url_for('main.login'))
+        content = request.form['content']
+        reply = ForumReply(content=content, user_id=current_user.id, post_id=post.id)
+        db.session.add(reply)
+        db.session.commit()
+        trending.record('thread', post.id, 'reply')
+        flash('💬 Reply posted successfully!', 'success')
+        return redirect(url_for('main.view_thread', post_id=post.id))
+
+    try:
+        replies, next_cursor = threads.reply_page(post.id, after=request.args.get('after'))
+    except ValueError:
+        return redirect(url_for('main.view_thread', post_id=post.id))
+    user_id = current_user.id if current_user.is_authenticated else None
+    return render_template('view_thread.html', post=post, replies=replies, next_cursor=next_cursor,
+                           reply_count=post.reply_count(),
+                           post_liked=post.id in likes.liked_ids(user_id, 'post', [post.id]),
+                           liked_replies=likes.liked_ids(user_id, 'reply', [r.id for r in replies]))
+
+
+@bp.route('/forum/<int:post_id>/replies')
+def thread_replies(post_id):
+    """JSON page of replies after ?after=<cursor>, for "load more"."""
+    post = ForumPost.query.get_or_404(post_id)
+    limit = min(max(request.args.get('limit', threads.REPLIES_PER_PAGE, type=int), 1), threads.MAX_PER_PAGE)
+    try:
+        replies, next_cursor = threads.reply_page(post.id, after=request.args.get('after'), limit=limit)
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    user_id = current_user.id if current_user.is_authenticated else None
+    liked_replies = likes.liked_ids(user_id, 'reply', [r.id for r in replies])
+    return jsonify({
+        'replies': [dict(threads.reply_to_dict(r), liked=r.id in liked_replies) for r in replies],
+        'html': render_template('reply_card.html', replies=replies, liked_replies=liked_replies),
+        'next': next_cursor,
+    })
+
+
+# -------------------- LIKE SYSTEM --------------------
+@bp.route('/like/post/<int:post_id>', methods=['POST'])
+@login_required
+def like_post(post_id):
+    post = ForumPost.query.get_or_404(post_id)
+    liked, new = likes.toggle(current_user.id, 'post', post.id)
+    if new:
+        trending.record('thread', post.id, 'like')
+    return jsonify({'count': post.like_count(), 'liked': liked})
+
+
+@bp.route('/like/reply/<int:reply_id>', methods=['POST'])
+@login_required
+def like_reply(reply_id):
+    reply = ForumReply.query.get_or_404(reply_id)
+    liked, new = likes.toggle(current_user.id, 'reply', reply.id)
+    if new:
+        trending.record('thread', reply.post_id, 'like')
+    return jsonify({'count': reply.like_count(), 'liked': liked})
+
+
+# -------------------- EXPERT DIRECTORY --------------------
+@bp.route('/experts')
+def experts():
+    filters = {
+        'q': request.args.get('q', '').strip(),
+        'specialization': request.args.get('specialization', '').strip(),
+        'verified': request.args.get('verified') == '1',
+        'min_experience': request.args.get('min_experience', 0, type=int),
+    }
+    page = request.args.get('page', 1, type=int)
+    pagination = directory.search(filters, page=page)
+    return render_template(
+        'experts.html',
+        experts=pagination.items,
+        pagination=pagination,
+        facets=directory.facets(filters),
+        filters=filters
+    )
+
+
+# -------------------- CONSULTATION --------------------
+@bp.route('/consult', methods=['GET', 'POST'])
+@login_required
+def consult():
+    if request.method == 'POST':
+        farmer_name = request.form['farmer_name']
+        farmer_email = request.form['farmer_email']
+        problem = request.form['problem']
+        consult = Consultation(farmer_name=farmer_name, farmer_email=farmer_email, problem=problem)
+        db.session.add(consult)
+        db.session.commit()
+        flash('✅ Your query has been sent to our experts!', 'success')
+        return redirect(url_for('main.consult'))
+    my_consults = Consultation.query.options(db.joinedload(Consultation.expert)).filter_by(
+        farmer_email=current_user.email
+    ).order_by(Consultation.created_at.desc()).limit(20).all()
+    return render_template('consult.html', consultations=my_consults)
+# -------------------- CONSULTATION REQUEST --------------------
+@bp.route('/consult/request/<int:expert_id>', methods=['GET', 'POST'])
+@login_required
+def consultation_request(expert_id):
+    expert = Expert.query.get_or_404(expert_id)
+
+    if request.method == 'POST':
+        farmer_name = request.form['farmer_name']
+        farmer_email = request.form['farmer_email']
+        problem = request.form['problem']
+
+        consult = Consultation(
+            farmer_name=farmer_name,
+            farmer_email=farmer_email,
+            expert_id=expert.id,
+            problem=problem
+        )
+        db.session.add(consult)
+        db.session.commit()
+
+        flash(f'✅ Your request has been sent to {expert.name}.', 'success')
+        return redirect(url_for('main.experts'))
+
+    return render_template('consultation_request.html', expert=expert)
+# -------------------- CONSULTATION DETAIL (VIEW + REPLY) --------------------
+@bp.route('/consultation/<int:cid>', methods=['GET', 'POST'])
+@login_required
+def consultation_detail(cid):
+    """
+    Show and handle expert reply for a consultation.
+    """
+    consult = archive.find_consultation(cid) or abort(404)
+    expert = Expert.query.filter_by(email=current_user.email).first()
+
+    # Permission check: only assigned expert or admin can reply
+    if not (current_user.role == 'admin' or current_user.role == 'expert'):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        if archive.is_archived(consult):
+            flash('🗄️ This consultation is archived and can no longer be changed.', 'warning')
+            return redirect(url_for('main.consultation_detail', cid=cid))
+        # ✅ use the correct name from HTML form
+        response_text = request.form.get('response', '').strip()
+        if not response_text:
+            flash('⚠️ Response cannot be empty.', 'warning')
+            return redirect(url_for('main.consultation_detail', cid=cid))
+
+        # ✅ save the response properly
+        consult.response = response_text
+        consult.status = 'Resolved'
+        consult.expert_id = expert.id if expert else None
+
+        from datetime import datetime
+        consult.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        flash('✅ Response sent successfully to the farmer.', 'success')
+        return redirect(url_for('main.consultation_detail', cid=cid))
+
+    return render_template('consultation_detail.html', consult=consult, expert=expert,
+                           archived=archive.is_archived(consult))
+
+
+
+
+# -------------------- EXPERT DASHBOARD (public profile + expert view) --------------------
+@bp.route('/expert/<int:expert_id>/dashboard')
+@login_required
+def expert_dashboard(expert_id):
+    """
+    Expert dashboard showing all consultation requests assigned to this expert.
+    Admins can view any expert dashboard. Experts can view only their own dashboard.
+    """
+    expert = Expert.query.get_or_404(expert_id)
+
+    # Permission: admin OR the expert themself
+    if not (current_user.role == 'admin' or (current_user.role == 'expert' and expert.email == current_user.email)):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+
+    consults = Consultation.query.filter_by(expert_id=expert.id).order_by(Consultation.created_at.desc()).all()
+    return render_template('expert_dashboard.html', expert=expert, consults=consults)
+
+# -------------------- UPDATE CONSULTATION RESPONSE --------------------
+@bp.route('/consultation/update/<int:cid>', methods=['POST'])
+@login_required
+def update_consultation(cid):
+    """
+    Allow experts or admins to respond to a consultation request.
+    """
+    consult = archive.find_consultation(cid) or abort(404)
+    if archive.is_archived(consult):
+        flash('🗄️ This consultation is archived and can no longer be changed.', 'warning')
+        return redirect(url_for('main.consultation_detail', cid=cid))
+
+    # Get the expert assigned (if any)
+    expert = Expert.query.get(consult.expert_id) if consult.expert_id else None
+
+    # Permission check — only assigned expert or admin can update
+    if not (current_user.role == 'admin' or
+            (current_user.role == 'expert' and expert and expert.email == current_user.email)):
+        flash('🚫 Access denied — you are not authorized to respond.', 'danger')
+        return redirect(url_for('main.index'))
+
+    # Get response text
+    response_text = request.form.get('response')
+
+    if not response_text or response_text.strip() == "":
+        flash('⚠️ Response cannot be empty.', 'warning')
+        return redirect(url_for('main.consultation_detail', cid=cid))
+
+    # Update consultation record
+    consult.response = response_text
+    consult.status = 'Resolved'
+    from datetime import datetime
+    consult.updated_at = datetime.utcnow()
+
+    db.session.commit()
+    flash('✅ Response submitted successfully.', 'success')
+
+    return redirect(url_for('main.consultation_detail', cid=cid))
+
+
+# -------------------- GLOBAL SEARCH --------------------
+@bp.route('/search')
+def search():
+    q = request.args.get('q', '').strip()
+    results = {'blogs': [], 'products': [], 'forums': []}
+    if q:
+        results['blogs'] = listings.titles(Blog, Blog.title).filter(
+            Blog.title.ilike(f"%{q}%") | Blog.content.ilike(f"%{q}%")).all()
+        results['products'] = listings.titles(Product, Product.name).filter(
+            Product.name.ilike(f"%{q}%") | Product.description.ilike(f"%{q}%")).all()
+        results['forums'] = listings.titles(ForumPost, ForumPost.title).filter(
+            ForumPost.title.ilike(f"%{q}%") | ForumPost.content.ilike(f"%{q}%")).all()
+    return render_template('search_results.html', q=q, results=results)
+
+
+# -------------------- STATIC FILES --------------------
+@bp.route('/static/<path:filename>')
+def static_files(filename):
+    return send_from_directory('static', filename)
+
+
+# -------------------- CART SYSTEM --------------------
+
+
+@bp.route('/cart')
+@login_required
+def cart():
+    snapshot = pricing.cart_snapshot(current_user.id)
+    return render_template('cart.html', items=snapshot.lines, total=snapshot.total)
+
+
+# -------------------- ADD TO CART --------------------
+@bp.route('/cart/add/<int:product_id>', methods=['POST'])
+@login_required
+def add_to_cart(product_id):
+    product = Product.query.get_or_404(product_id)
+    try:
+        quantity = int(request.form.get('quantity', 1))
+        quantity = max(quantity, 1)
+
+        if quantity > product.stock:
+            flash(f"⚠️ Only {product.stock} items available.", "warning")
+            return redirect(url_for('main.view_product', product_id=product.id))
+
+        cart_item = Cart.query.filter_by(user_id=current_user.id, product_id=product.id).first()
+        if cart_item:
+            new_qty = cart_item.quantity + quantity
+            if new_qty > product.stock:
+                flash(f"⚠️ Cannot add more than {product.stock} items.", "warning")
+                return redirect(url_for('main.view_product', product_id=product.id))
+            cart_item.quantity = new_qty
+        else:
+            cart_item = Cart(user_id=current_user.id, product_id=product.id, quantity=quantity)
+            db.session.add(cart_item)
+
+        db.session.commit()
+        flash(f"✅ {product.name} added to cart.", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error adding to cart: {str(e)}", "danger")
+
+    return redirect(url_for('main.checkout'))
+
+
+# -------------------- UPDATE CART --------------------
+@bp.route('/cart/update/<int:cart_id>', methods=['POST'])
+@login_required
+def update_cart(cart_id):
+    item = Cart.query.get_or_404(cart_id)
+    if item.user_id != current_user.id:
+        flash("🚫 Unauthorized action!", "danger")
+        return redirect(url_for('main.cart'))
+
+    try:
+        quantity = int(request.form.get('quantity', 1))
+        quantity = max(quantity, 1)
+
+        if quantity > item.product.stock:
+            flash(f"⚠️ Only {item.product.stock} items available.", "warning")
+            return redirect(url_for('main.cart'))
+
+        item.quantity = quantity
+        db.session.commit()
+        flash(f"✅ {item.product.name} quantity updated.", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error updating cart: {str(e)}", "danger")
+
+    return redirect(url_for('main.cart'))
+
+
+# -------------------- REMOVE ITEM --------------------
+@bp.route('/cart/remove/<int:cart_id>', methods=['POST'])
+@login_required
+def remove_from_cart(cart_id):
+    item = Cart.query.get_or_404(cart_id)
+    if item.user_id != current_user.id:
+        flash("🚫 Unauthorized action!", "danger")
+        return redirect(url_for('main.cart'))
+
+    try:
+        name = item.product.name
+        db.session.delete(item)
+        db.session.commit()
+        flash(f"🗑️ {name} removed from cart.", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error removing from cart: {str(e)}", "danger")
+
+    return redirect(url_for('main.cart'))
+
+
+# -------------------- CHECKOUT PAGE --------------------
+@bp.route('/checkout')
+@login_required
+def checkout():
+    snapshot = pricing.cart_snapshot(current_user.id)
+    if not snapshot.lines:
+        flash("Your cart is empty!", "info")
+        return redirect(url_for('main.cart'))
+
+    return render_template('checkout.html', items=snapshot.lines, total=snapshot.total, snapshot=snapshot.token)
+
+
+# -------------------- PLACE ORDER --------------------
+@bp.route('/order/place', methods=['POST'])
+@login_required
+def place_order():
+    snapshot = pricing.cart_snapshot(current_user.id)
+    if not snapshot.lines:
+        flash("Your cart is empty!", "info")
+        return redirect(url_for('main.cart'))
+    if request.form.get('snapshot') != snapshot.token:
+        flash("⚠️ Prices or your cart changed since you opened checkout. Please review your order.", "warning")
+        return redirect(url_for('main.checkout'))
+
+    try:
+        # Create Order with the prices the customer confirmed at checkout
+        order = Order(user_id=current_user.id, total_amount=snapshot.total, status='Pending')
+        db.session.add(order)
+        db.session.flush()  # Get order.id before commit
+
+        # Create OrderItems & Update Stock
+        for line in snapshot.lines:
+            reserved = Product.query.filter(
+                Product.id == line.product_id, Product.stock >= line.quantity
+            ).update({Product.stock: Product.stock - line.quantity}, synchronize_session=False)
+            if not reserved:
+                db.session.rollback()
+                flash(f"⚠️ Not enough stock for {line.name}.", "warning")
+                return redirect(url_for('main.cart'))
+
+            db.session.add(OrderItem(
+                order_id=order.id,
+                product_id=line.product_id,
+                quantity=line.quantity,
+                price=line.unit_price
+            ))
+
+        # Clear cart
+        Cart.query.filter(
+            Cart.user_id == current_user.id, Cart.id.in_([line.cart_id for line in snapshot.lines])
+        ).delete(synchronize_session=False)
+
+        db.session.commit()
+        for line in snapshot.lines:
+            trending.record('product', line.product_id, 'order', amount=line.quantity)
+        flash("✅ Order placed successfully!", "success")
+        return redirect(url_for('main.order_details', order_id=order.id))
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error placing order: {str(e)}", "danger")
+        return redirect(url_for('main.cart'))
+
+
+# -------------------- ORDER DETAILS --------------------
+@bp.route('/order/<int:order_id>')
+@login_required
+def order_details(order_id):
+    order = archive.find_order(order_id) or abort(404)
+    if order.user_id != current_user.id:
+        flash("🚫 Unauthorized access!", "danger")
+        return redirect(url_for('main.cart'))
+
+    return render_template('order_details.html', order=order, archived=archive.is_archived(order))